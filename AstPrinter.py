@@ -1,31 +1,135 @@
 #!/usr/bin/env python3
 
 import Expr
+import Stmt
 from Token import Token
 from TokenType import TokenType
 
 class AstPrinter:
 
-    def print(self, expr: Expr.Expr) -> str:
+    def __init__(self) -> None:
+        self.depth: int = 0
+
+    def print(self, expr: Expr.Expr | Stmt.Stmt) -> str:
         return expr.accept(self)
 
+    def printStatements(self, statements: list[Stmt.Stmt]) -> str:
+        return "\n".join(stmt.accept(self) for stmt in statements)
+
     def parenthesize(self, name: str, *exprs):
         return f"""({name} {" ".join(expr.accept(self) for expr in exprs)})"""
 
+    def nest(self, name: str, statements: list[Stmt.Stmt]) -> str:
+        """
+        Statements inside another statement go on their own lines, indented one level further
+        """
+        self.depth += 1
+        lines: list[str] = [f"{'  ' * self.depth}{stmt.accept(self)}" for stmt in statements]
+        self.depth -= 1
+        return "\n".join([f"({name}"] + lines) + ")"
+
+    # Expression visitors
+
+    def visitArrayExpr(self, expr: Expr.Array) -> str:
+        return self.parenthesize("array", *expr.elements)
+
+    def visitAssignExpr(self, expr: Expr.Assign) -> str:
+        return self.parenthesize(f"= {expr.name.lexeme}", expr.value)
+
     def visitBinaryExpr(self, expr: Expr.Binary) -> str:
         return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
 
+    def visitCallExpr(self, expr: Expr.Call) -> str:
+        return self.parenthesize("call", expr.callee, *expr.arguments)
+
+    def visitGetExpr(self, expr: Expr.Get) -> str:
+        return self.parenthesize(f". {expr.name.lexeme}", expr.object)
+
     def visitGroupingExpr(self, expr: Expr.Grouping) -> str:
         return self.parenthesize("group", expr.expression)
 
+    def visitIndexExpr(self, expr: Expr.Index) -> str:
+        return self.parenthesize("[]", expr.object, expr.index)
+
     def visitLiteralExpr(self, expr: Expr.Literal) -> str:
         if expr.value is None:
             return "nil"
         return str(expr.value)
 
+    def visitLogicalExpr(self, expr: Expr.Logical) -> str:
+        return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
+
+    def visitMapExpr(self, expr: Expr.Map) -> str:
+        return self.parenthesize("map", *(entry for pair in zip(expr.keys, expr.values) for entry in pair))
+
+    def visitSetExpr(self, expr: Expr.Set) -> str:
+        return self.parenthesize(f".= {expr.name.lexeme}", expr.object, expr.value)
+
+    def visitSetIndexExpr(self, expr: Expr.SetIndex) -> str:
+        return self.parenthesize("[]=", expr.object, expr.index, expr.value)
+
+    def visitStringExpr(self, expr: Expr.String) -> str:
+        return f"\"{expr.value}\""
+
+    def visitSuperExpr(self, expr: Expr.Super) -> str:
+        return f"super.{expr.method.lexeme}"
+
+    def visitTernaryExpr(self, expr: Expr.Ternary) -> str:
+        return self.parenthesize("?:", expr.condition, expr.trueExpr, expr.falseExpr)
+
+    def visitThisExpr(self, expr: Expr.This) -> str:
+        return "this"
+
     def visitUnaryExpr(self, expr: Expr.Unary) -> str:
         return self.parenthesize(expr.operator.lexeme, expr.right)
 
+    def visitVariableExpr(self, expr: Expr.Variable) -> str:
+        return expr.name.lexeme
+
+    # Statement visitors
+
+    def visitBlockStmt(self, stmt: Stmt.Block) -> str:
+        return self.nest("block", stmt.statements)
+
+    def visitClassStmt(self, stmt: Stmt.Class) -> str:
+        superclass: str = f" < {stmt.superclass.name.lexeme}" if stmt.superclass is not None else ""
+        return self.nest(f"class {stmt.name.lexeme}{superclass}", stmt.methods)
+
+    def visitControlStmt(self, stmt: Stmt.Control) -> str:
+        return f"({stmt.control.lexeme})"
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression) -> str:
+        return self.parenthesize(";", stmt.expression)
+
+    def visitForStmt(self, stmt: Stmt.For) -> str:
+        initializer: str = stmt.initializer.accept(self) if stmt.initializer is not None else "nil"
+        increment: str = stmt.increment.accept(self) if stmt.increment is not None else "nil"
+        return self.nest(f"for {initializer} {stmt.condition.accept(self)} {increment}", [stmt.body])
+
+    def visitFunctionStmt(self, stmt: Stmt.Function) -> str:
+        annotations: str = "".join(f"@{annotation.lexeme} " for annotation in stmt.annotations)
+        return self.nest(f"{annotations}fun {stmt.name.lexeme} ({' '.join(param.lexeme for param in stmt.params)})", stmt.body)
+
+    def visitIfStmt(self, stmt: Stmt.If) -> str:
+        branches: list[Stmt.Stmt] = [stmt.thenBranch] if stmt.elseBranch is None else [stmt.thenBranch, stmt.elseBranch]
+        return self.nest(f"if {stmt.condition.accept(self)}", branches)
+
+    def visitPrintStmt(self, stmt: Stmt.Print) -> str:
+        return self.parenthesize("print", stmt.expression)
+
+    def visitReturnStmt(self, stmt: Stmt.Return) -> str:
+        if stmt.value is None:
+            return "(return)"
+        return self.parenthesize("return", stmt.value)
+
+    def visitVarStmt(self, stmt: Stmt.Var) -> str:
+        if stmt.initializer is None:
+            return f"(var {stmt.name.lexeme})"
+        return self.parenthesize(f"var {stmt.name.lexeme}", stmt.initializer)
+
+    def visitWhileStmt(self, stmt: Stmt.While) -> str:
+        return self.nest(f"while {stmt.condition.accept(self)}", [stmt.body])
+
 if __name__ == "__main__":
     e = Expr.Binary(
         left=Expr.Unary(
@@ -5,7 +5,12 @@ if TYPE_CHECKING:
     from Interpreter import Interpreter
 
 import time
+from array import array
+from ErrorManager import NativeError
+from LoxArray import LoxArray
 from LoxCallable import LoxCallable
+from LoxMap import LoxMap, MapView
+from Rope import STRING
 
 
 class Clock(LoxCallable):
@@ -21,6 +26,8 @@ class Clock(LoxCallable):
 
 class Str(LoxCallable):
 
+    pure: bool = True
+
     def __str__(self) -> str:
         return "<builtin function str>"
 
@@ -29,3 +36,178 @@ class Str(LoxCallable):
 
     def call(self, interpreter: Interpreter, arguments: list[any]) -> str:
         return interpreter.stringify(arguments[0])
+
+# Bulk operations on arrays, each runs its whole loop in Python rather than element by element in Lox
+
+def arrayArgument(value: any) -> LoxArray:
+    if type(value) is not LoxArray:
+        raise NativeError("Argument must be an array")
+    return value
+
+def elementsArgument(value: any) -> list[any] | array | MapView:
+    """
+    The elements of an array, or a view of the keys or values of a map to iterate straight from it
+    """
+    if type(value) is LoxArray:
+        return value.items
+    if type(value) is not MapView:
+        raise NativeError("Argument must be an array")
+    return value
+
+class Len(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function len>"
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> int:
+        value: any = arguments[0]
+        if type(value) is not LoxArray and type(value) is not MapView and not isinstance(value, STRING):
+            raise NativeError("Argument must be an array or a string")
+        return len(value)
+
+class Push(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function push>"
+
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> None:
+        arrayArgument(arguments[0]).push(arguments[1])
+
+class Sum(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function sum>"
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> int | float:
+        items: list[any] | array | MapView = elementsArgument(arguments[0])
+        if type(items) is not array and not all(isinstance(item, (int, float)) for item in items):
+            raise NativeError("Operand must be one of the following types: int, float")
+        return sum(items)
+
+class Map(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function map>"
+
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> LoxArray:
+        function: any = arguments[1]
+        return LoxArray.of([interpreter.callback(function, [item]) for item in elementsArgument(arguments[0])])
+
+class Filter(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function filter>"
+
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> LoxArray:
+        function: any = arguments[1]
+        return LoxArray.of([item for item in elementsArgument(arguments[0]) if interpreter.callback(function, [item])])
+
+class Sort(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function sort>"
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> LoxArray:
+        value: any = arguments[0]
+        if type(value) is MapView:
+            # Sorting makes a new array, of the view's elements
+            return LoxArray.of(list(value)).sorted()
+        return arrayArgument(value).sorted()
+
+class Range(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function range>"
+
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> LoxArray:
+        start, end = arguments
+        if type(start) is not int or type(end) is not int:
+            raise NativeError("Arguments must be integers")
+        try:
+            return LoxArray(array("q", range(start, end)))
+        except OverflowError:
+            return LoxArray(list(range(start, end)))
+
+# Operations on maps
+
+def mapArgument(value: any) -> LoxMap:
+    if type(value) is not LoxMap:
+        raise NativeError("Argument must be a map")
+    return value
+
+class Has(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function has>"
+
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> bool:
+        return mapArgument(arguments[0]).has(arguments[1])
+
+class Keys(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function keys>"
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> MapView:
+        # A view of the map, its keys aren't copied
+        return MapView(mapArgument(arguments[0]), False)
+
+class Values(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function values>"
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> MapView:
+        return MapView(mapArgument(arguments[0]), True)
+
+class Delete(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function delete>"
+
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> bool:
+        return mapArgument(arguments[0]).delete(arguments[1])
+
+class Size(LoxCallable):
+
+    def __str__(self) -> str:
+        return "<builtin function size>"
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> int:
+        return len(mapArgument(arguments[0]))
@@ -0,0 +1,543 @@
+from __future__ import annotations
+import Expr
+import Stmt
+from Chunk import Chunk
+from OpCode import OpCode
+from ErrorManager import ErrorManager
+from LoxClass import PropertyCache
+from Token import Token
+from TokenType import TokenType
+from SymbolTable import SymbolTable
+
+class Prototype:
+    """
+    A compiled function, the VM wraps it in a Closure along with the upvalues it captures
+    """
+
+    def __init__(self, name: str, arity: int) -> None:
+        self.name: str = name
+        self.arity: int = arity
+        self.chunk: Chunk = Chunk()
+        self.upvalueCount: int = 0
+
+    def __str__(self) -> str:
+        return f"<fun {self.name}>"
+
+class Local:
+    """
+    A local variable living in a stack slot of the function's frame
+    """
+
+    def __init__(self, symbol: int | None, depth: int) -> None:
+        self.symbol: int | None = symbol
+        self.depth: int = depth
+        # Set once a closure captures the variable, it then has to be closed over when its scope ends
+        self.captured: bool = False
+
+class Loop:
+    """
+    A loop being compiled, break and continue jump out of it once their targets are known
+    """
+
+    def __init__(self, depth: int, start: int) -> None:
+        # Scope depth outside the loop body, locals deeper than this are discarded by break and continue
+        self.depth: int = depth
+        self.start: int = start
+        self.breaks: list[int] = []
+        # For loops continue forward to the increment, so their jumps are patched once it is compiled
+        self.continues: list[int] | None = None
+
+class FunctionState:
+    """
+    Compilation state of the function currently being compiled, or the top level script
+    """
+
+    def __init__(self, enclosing: FunctionState | None, prototype: Prototype) -> None:
+        self.enclosing: FunctionState | None = enclosing
+        self.prototype: Prototype = prototype
+        # Slot zero holds the closure being called
+        self.locals: list[Local] = [Local(None, 0)]
+        self.upvalues: list[tuple[bool, int]] = []
+        self.scopeDepth: int = 0
+        self.loops: list[Loop] = []
+
+class BytecodeCompiler:
+    """
+    Compiles a resolved AST into bytecode for the VM. Locals are given stack slots the same way as in
+    clox: the compiler tracks them by scope depth, and closures capture upvalues which stay open on the
+    stack until their scope ends.
+    """
+
+    BINARY_OPCODES: dict[TokenType, OpCode] = {
+        TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+        TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+        TokenType.GREATER: OpCode.GREATER,
+        TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+        TokenType.LESS: OpCode.LESS,
+        TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+        TokenType.PLUS: OpCode.ADD,
+        TokenType.MINUS: OpCode.SUBTRACT,
+        TokenType.STAR: OpCode.MULTIPLY,
+        TokenType.SLASH: OpCode.DIVIDE,
+        TokenType.STAR_STAR: OpCode.POWER,
+        TokenType.AMPERSAND: OpCode.BIT_AND,
+        TokenType.BAR: OpCode.BIT_OR,
+        TokenType.CARROT: OpCode.BIT_XOR,
+        TokenType.LESS_LESS: OpCode.SHIFT_LEFT,
+        TokenType.GREATER_GREATER: OpCode.SHIFT_RIGHT,
+    }
+
+    def __init__(self, errorManager: ErrorManager) -> None:
+        self.errorManager: ErrorManager = errorManager
+        self.state: FunctionState | None = None
+        # Line of the token most recently compiled, for instructions which have no token of their own
+        self.line: int = 0
+        # Slot given up front to the variable of each for initializer in a statement on its own as a branch or loop body
+        self.hoisted: dict[Stmt.For, int] = {}
+
+    def compile(self, statements: list[Stmt.Stmt]) -> Prototype:
+        self.state = FunctionState(None, Prototype("script", 0))
+        self.compileStatements(statements)
+        self.emitReturn()
+        prototype: Prototype = self.state.prototype
+        self.state = None
+        return prototype
+
+    def compileStatements(self, statements: list[Stmt.Stmt]) -> None:
+        for stmt in statements:
+            stmt.accept(self)
+
+    def compileExpr(self, expr: Expr.Expr) -> None:
+        expr.accept(self)
+
+    # Emitting
+
+    @property
+    def chunk(self) -> Chunk:
+        return self.state.prototype.chunk
+
+    def emit(self, *units: int, line: int | None = None) -> None:
+        if line is not None:
+            self.line = line
+        for unit in units:
+            self.chunk.write(unit, self.line)
+
+    def emitReturn(self) -> None:
+        self.emit(OpCode.NIL, OpCode.RETURN)
+
+    def emitJump(self, op: OpCode) -> int:
+        """
+        Emit a forward jump with a placeholder offset, returns where to patch the offset
+        """
+        self.emit(op, Chunk.MAX_OPERAND)
+        return len(self.chunk) - 1
+
+    def error(self, message: str) -> None:
+        """
+        Report code which is valid Lox but exceeds a limit of the bytecode format
+        """
+        self.errorManager.hadError = True
+        self.errorManager.report(self.line, "", message)
+
+    def patchJump(self, operand: int) -> None:
+        offset: int = len(self.chunk) - operand - 1
+        if offset > Chunk.MAX_OPERAND:
+            self.error("Too much code to jump over")
+        self.chunk.code[operand] = offset & Chunk.MAX_OPERAND
+
+    def emitLoop(self, start: int) -> None:
+        self.emit(OpCode.LOOP)
+        offset: int = len(self.chunk) - start + 1
+        if offset > Chunk.MAX_OPERAND:
+            self.error("Loop body too large")
+        self.emit(offset & Chunk.MAX_OPERAND)
+
+    def makeConstant(self, value: any) -> int:
+        index: int = self.chunk.addConstant(value)
+        if index > Chunk.MAX_OPERAND:
+            self.error("Too many constants in one function")
+            return 0
+        return index
+
+    def globalConstant(self, name: Token) -> int:
+        self.line = name.line
+        return self.makeConstant((name.symbol, name.lexeme))
+
+    def propertyConstant(self, name: Token) -> int:
+        # Every property access gets its own inline cache
+        self.line = name.line
+        return self.makeConstant((name.lexeme, PropertyCache()))
+
+    # Scopes and variables
+
+    def beginScope(self) -> None:
+        self.state.scopeDepth += 1
+
+    def endScope(self) -> None:
+        self.state.scopeDepth -= 1
+        locals: list[Local] = self.state.locals
+        while locals and locals[-1].depth > self.state.scopeDepth:
+            self.emit(OpCode.CLOSE_UPVALUE if locals[-1].captured else OpCode.POP)
+            locals.pop()
+
+    def discardLocals(self, depth: int) -> None:
+        """
+        Emit the code to leave every scope deeper than depth, without forgetting the locals at compile time
+        """
+        for local in reversed(self.state.locals):
+            if local.depth <= depth:
+                break
+            self.emit(OpCode.CLOSE_UPVALUE if local.captured else OpCode.POP)
+
+    def addLocal(self, name: Token) -> None:
+        if len(self.state.locals) > Chunk.MAX_OPERAND:
+            self.error("Too many local variables in function")
+            return
+        self.state.locals.append(Local(name.symbol, self.state.scopeDepth))
+
+    def hoistForLocals(self, stmt: Stmt.Stmt | None) -> None:
+        """
+        Push a placeholder slot for each variable a for initializer declares in stmt, a branch or loop
+        body which isn't a block. Like in the tree walker the variable belongs to the enclosing scope,
+        but stmt runs any number of times, so its slot is pushed once before it on every path to keep
+        the slots in step with the stack. The slot is nameless until the initializer declares it.
+        """
+        if self.state.scopeDepth == 0:
+            return
+        if type(stmt) is Stmt.For:
+            if type(stmt.initializer) is Stmt.Var and stmt not in self.hoisted:
+                self.emit(OpCode.NIL, line=stmt.initializer.name.line)
+                self.hoisted[stmt] = len(self.state.locals)
+                self.state.locals.append(Local(None, self.state.scopeDepth))
+            self.hoistForLocals(stmt.body)
+        elif type(stmt) is Stmt.If:
+            self.hoistForLocals(stmt.thenBranch)
+            self.hoistForLocals(stmt.elseBranch)
+        elif type(stmt) is Stmt.While:
+            self.hoistForLocals(stmt.body)
+
+    def resolveLocal(self, state: FunctionState, name: Token) -> int | None:
+        for slot in range(len(state.locals)-1, 0, -1):
+            if state.locals[slot].symbol == name.symbol:
+                return slot
+        return None
+
+    def addUpvalue(self, state: FunctionState, isLocal: bool, index: int) -> int:
+        upvalue: tuple[bool, int] = (isLocal, index)
+        if upvalue in state.upvalues:
+            return state.upvalues.index(upvalue)
+        if len(state.upvalues) > Chunk.MAX_OPERAND:
+            self.error("Too many closure variables in function")
+            return 0
+
+        state.upvalues.append(upvalue)
+        state.prototype.upvalueCount = len(state.upvalues)
+        return len(state.upvalues) - 1
+
+    def resolveUpvalue(self, state: FunctionState, name: Token) -> int | None:
+        if state.enclosing is None:
+            return None
+
+        local: int | None = self.resolveLocal(state.enclosing, name)
+        if local is not None:
+            state.enclosing.locals[local].captured = True
+            return self.addUpvalue(state, True, local)
+
+        upvalue: int | None = self.resolveUpvalue(state.enclosing, name)
+        if upvalue is not None:
+            return self.addUpvalue(state, False, upvalue)
+        return None
+
+    def namedVariable(self, name: Token, assign: bool) -> None:
+        slot: int | None = self.resolveLocal(self.state, name)
+        if slot is not None:
+            self.emit(OpCode.SET_LOCAL if assign else OpCode.GET_LOCAL, slot, line=name.line)
+            return
+
+        upvalue: int | None = self.resolveUpvalue(self.state, name)
+        if upvalue is not None:
+            self.emit(OpCode.SET_UPVALUE if assign else OpCode.GET_UPVALUE, upvalue, line=name.line)
+            return
+
+        self.emit(OpCode.SET_GLOBAL if assign else OpCode.GET_GLOBAL, self.globalConstant(name), line=name.line)
+
+    def defineVariable(self, name: Token) -> None:
+        """
+        Bind the value on top of the stack to name, locals just keep it in their slot
+        """
+        if self.state.scopeDepth > 0:
+            self.addLocal(name)
+        else:
+            self.emit(OpCode.DEFINE_GLOBAL, self.globalConstant(name), line=name.line)
+
+    # Expression visitors
+
+    def visitLiteralExpr(self, expr: Expr.Literal) -> None:
+        if expr.value is None:
+            self.emit(OpCode.NIL)
+        elif expr.value is True:
+            self.emit(OpCode.TRUE)
+        elif expr.value is False:
+            self.emit(OpCode.FALSE)
+        else:
+            self.emit(OpCode.CONSTANT, self.makeConstant(expr.value))
+
+    def visitStringExpr(self, expr: Expr.String) -> None:
+        self.emit(OpCode.CONSTANT, self.makeConstant(expr.value))
+
+    def visitGroupingExpr(self, expr: Expr.Grouping) -> None:
+        self.compileExpr(expr.expression)
+
+    def visitVariableExpr(self, expr: Expr.Variable) -> None:
+        self.namedVariable(expr.name, assign=False)
+
+    def visitAssignExpr(self, expr: Expr.Assign) -> None:
+        self.compileExpr(expr.value)
+        self.namedVariable(expr.name, assign=True)
+
+    def visitUnaryExpr(self, expr: Expr.Unary) -> None:
+        self.compileExpr(expr.right)
+        self.emit(OpCode.NOT if expr.operator.type == TokenType.BANG else OpCode.NEGATE, line=expr.operator.line)
+
+    def visitBinaryExpr(self, expr: Expr.Binary) -> None:
+        self.compileExpr(expr.left)
+        self.compileExpr(expr.right)
+        self.emit(BytecodeCompiler.BINARY_OPCODES[expr.operator.type], line=expr.operator.line)
+
+    def visitLogicalExpr(self, expr: Expr.Logical) -> None:
+        self.compileExpr(expr.left)
+        if expr.operator.type == TokenType.AND:
+            end: int = self.emitJump(OpCode.JUMP_IF_FALSE)
+        else:
+            elseJump: int = self.emitJump(OpCode.JUMP_IF_FALSE)
+            end = self.emitJump(OpCode.JUMP)
+            self.patchJump(elseJump)
+        self.emit(OpCode.POP)
+        self.compileExpr(expr.right)
+        self.patchJump(end)
+
+    def visitTernaryExpr(self, expr: Expr.Ternary) -> None:
+        self.compileExpr(expr.condition)
+        falseJump: int = self.emitJump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        self.compileExpr(expr.trueExpr)
+        end: int = self.emitJump(OpCode.JUMP)
+        self.patchJump(falseJump)
+        self.emit(OpCode.POP)
+        self.compileExpr(expr.falseExpr)
+        self.patchJump(end)
+
+    def visitCallExpr(self, expr: Expr.Call) -> None:
+        if type(expr.callee) is Expr.Get:
+            # A method called straight from an instance isn't bound, the instance becomes its first argument
+            self.compileExpr(expr.callee.object)
+            for argument in expr.arguments:
+                self.compileExpr(argument)
+            constant: int = self.propertyConstant(expr.callee.name)
+            self.emit(OpCode.INVOKE, constant, len(expr.arguments), line=expr.paren.line)
+            return
+
+        self.compileExpr(expr.callee)
+        for argument in expr.arguments:
+            self.compileExpr(argument)
+        self.emit(OpCode.CALL, len(expr.arguments), line=expr.paren.line)
+
+    def visitGetExpr(self, expr: Expr.Get) -> None:
+        self.compileExpr(expr.object)
+        self.emit(OpCode.GET_PROPERTY, self.propertyConstant(expr.name))
+
+    def visitSetExpr(self, expr: Expr.Set) -> None:
+        self.compileExpr(expr.object)
+        self.compileExpr(expr.value)
+        self.emit(OpCode.SET_PROPERTY, self.propertyConstant(expr.name))
+
+    def visitThisExpr(self, expr: Expr.This) -> None:
+        # The hidden first parameter of the method
+        self.namedVariable(expr.keyword, assign=False)
+
+    def visitSuperExpr(self, expr: Expr.Super) -> None:
+        self.compileExpr(expr.receiver)
+        self.namedVariable(expr.keyword, assign=False)
+        self.emit(OpCode.GET_SUPER, self.makeConstant(expr.method.lexeme), line=expr.method.line)
+
+    def visitArrayExpr(self, expr: Expr.Array) -> None:
+        for element in expr.elements:
+            self.compileExpr(element)
+        if len(expr.elements) > Chunk.MAX_OPERAND:
+            self.error("Too many elements in array literal")
+        self.emit(OpCode.ARRAY, len(expr.elements) & Chunk.MAX_OPERAND, line=expr.bracket.line)
+
+    def visitMapExpr(self, expr: Expr.Map) -> None:
+        for key, value in zip(expr.keys, expr.values):
+            self.compileExpr(key)
+            self.compileExpr(value)
+        if len(expr.keys) > Chunk.MAX_OPERAND:
+            self.error("Too many entries in map literal")
+        self.emit(OpCode.MAP, len(expr.keys) & Chunk.MAX_OPERAND, line=expr.brace.line)
+
+    def visitIndexExpr(self, expr: Expr.Index) -> None:
+        self.compileExpr(expr.object)
+        self.compileExpr(expr.index)
+        self.emit(OpCode.GET_INDEX, line=expr.bracket.line)
+
+    def visitSetIndexExpr(self, expr: Expr.SetIndex) -> None:
+        self.compileExpr(expr.object)
+        self.compileExpr(expr.index)
+        self.compileExpr(expr.value)
+        self.emit(OpCode.SET_INDEX, line=expr.bracket.line)
+
+    # Statement visitors
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression) -> None:
+        self.compileExpr(stmt.expression)
+        self.emit(OpCode.POP)
+
+    def visitPrintStmt(self, stmt: Stmt.Print) -> None:
+        self.compileExpr(stmt.expression)
+        self.emit(OpCode.PRINT)
+
+    def visitVarStmt(self, stmt: Stmt.Var) -> None:
+        if stmt.initializer is not None:
+            self.compileExpr(stmt.initializer)
+        else:
+            self.emit(OpCode.NIL, line=stmt.name.line)
+        self.defineVariable(stmt.name)
+
+    def visitFunctionStmt(self, stmt: Stmt.Function) -> None:
+        # A local function is in scope inside its own body so it can call itself
+        if self.state.scopeDepth > 0:
+            self.addLocal(stmt.name)
+        self.compileFunction(stmt)
+        if self.state.scopeDepth == 0:
+            self.emit(OpCode.DEFINE_GLOBAL, self.globalConstant(stmt.name))
+
+    def compileFunction(self, stmt: Stmt.Function) -> None:
+        """
+        Compile the body of stmt and emit the code making its closure
+        """
+        self.state = FunctionState(self.state, Prototype(stmt.name.lexeme, len(stmt.params)))
+        self.beginScope()
+        for param in stmt.params:
+            self.addLocal(param)
+        self.compileStatements(stmt.body)
+        self.emitReturn()
+        state: FunctionState = self.state
+        self.state = state.enclosing
+
+        self.emit(OpCode.CLOSURE, self.makeConstant(state.prototype), line=stmt.name.line)
+        for isLocal, index in state.upvalues:
+            self.emit(int(isLocal), index)
+
+    def visitClassStmt(self, stmt: Stmt.Class) -> None:
+        self.emit(OpCode.CLASS, self.makeConstant(stmt.name.lexeme), line=stmt.name.line)
+        self.defineVariable(stmt.name)
+
+        if stmt.superclass is not None:
+            # The superclass stays on the stack as the local super, in a scope around the methods
+            self.compileExpr(stmt.superclass)
+            self.beginScope()
+            self.addLocal(Token(TokenType.SUPER, "super", None, stmt.superclass.name.line, SymbolTable.SUPER))
+            self.namedVariable(stmt.name, assign=False)
+            self.emit(OpCode.INHERIT, line=stmt.superclass.name.line)
+
+        self.namedVariable(stmt.name, assign=False)
+        for method in stmt.methods:
+            self.compileFunction(method)
+            self.emit(OpCode.METHOD, self.makeConstant(method.name.lexeme))
+        self.emit(OpCode.POP)
+
+        if stmt.superclass is not None:
+            self.endScope()
+
+    def visitBlockStmt(self, stmt: Stmt.Block) -> None:
+        self.beginScope()
+        self.compileStatements(stmt.statements)
+        self.endScope()
+
+    def visitControlStmt(self, stmt: Stmt.Control) -> None:
+        loop: Loop = self.state.loops[-1]
+        self.discardLocals(loop.depth)
+        if stmt.control.type == TokenType.BREAK:
+            loop.breaks.append(self.emitJump(OpCode.JUMP))
+        elif loop.continues is not None:
+            loop.continues.append(self.emitJump(OpCode.JUMP))
+        else:
+            self.emitLoop(loop.start)
+
+    def visitReturnStmt(self, stmt: Stmt.Return) -> None:
+        if stmt.value is not None:
+            self.compileExpr(stmt.value)
+        else:
+            self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN, line=stmt.keyword.line)
+
+    def visitIfStmt(self, stmt: Stmt.If) -> None:
+        self.hoistForLocals(stmt.thenBranch)
+        self.hoistForLocals(stmt.elseBranch)
+        self.compileExpr(stmt.condition)
+        thenJump: int = self.emitJump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        stmt.thenBranch.accept(self)
+        elseJump: int = self.emitJump(OpCode.JUMP)
+        self.patchJump(thenJump)
+        self.emit(OpCode.POP)
+        if stmt.elseBranch is not None:
+            stmt.elseBranch.accept(self)
+        self.patchJump(elseJump)
+
+    def visitWhileStmt(self, stmt: Stmt.While) -> None:
+        self.hoistForLocals(stmt.body)
+        loop: Loop = Loop(self.state.scopeDepth, len(self.chunk))
+
+        self.compileExpr(stmt.condition)
+        exitJump: int = self.emitJump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+
+        self.state.loops.append(loop)
+        stmt.body.accept(self)
+        self.state.loops.pop()
+
+        self.emitLoop(loop.start)
+        self.endLoop(loop, exitJump)
+
+    def visitForStmt(self, stmt: Stmt.For) -> None:
+        self.hoistForLocals(stmt.body)
+        # The initializer declares its variable in the enclosing scope, like the tree walker
+        slot: int | None = self.hoisted.get(stmt)
+        if slot is not None:
+            # Its slot was pushed before the statement this for is the body or branch of
+            if stmt.initializer.initializer is not None:
+                self.compileExpr(stmt.initializer.initializer)
+            else:
+                self.emit(OpCode.NIL)
+            self.emit(OpCode.SET_LOCAL, slot, OpCode.POP, line=stmt.initializer.name.line)
+            self.state.locals[slot].symbol = stmt.initializer.name.symbol
+        elif stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+        loop: Loop = Loop(self.state.scopeDepth, len(self.chunk))
+        loop.continues = []
+
+        self.compileExpr(stmt.condition)
+        exitJump: int = self.emitJump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+
+        self.state.loops.append(loop)
+        stmt.body.accept(self)
+        self.state.loops.pop()
+
+        for jump in loop.continues:
+            self.patchJump(jump)
+        if stmt.increment is not None:
+            self.compileExpr(stmt.increment)
+            self.emit(OpCode.POP)
+
+        self.emitLoop(loop.start)
+        self.endLoop(loop, exitJump)
+
+    def endLoop(self, loop: Loop, exitJump: int) -> None:
+        self.patchJump(exitJump)
+        # The condition is still on the stack when the loop exits through it, but not after a break
+        self.emit(OpCode.POP)
+        for jump in loop.breaks:
+            self.patchJump(jump)
@@ -0,0 +1,31 @@
+from array import array
+
+class Chunk:
+    """
+    Bytecode for a single function. Opcodes and their operands are 16 bit code units, with a parallel
+    array holding the source line of every unit for runtime errors.
+    """
+
+    MAX_OPERAND: int = 0xFFFF
+
+    def __init__(self) -> None:
+        self.code: array = array("H")
+        self.lines: array = array("I")
+        self.constants: list[any] = []
+        # Constants are deduplicated by type as well as value so that 1, 1.0 and true stay distinct
+        self.constantIndices: dict[tuple[type, any], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.code)
+
+    def write(self, unit: int, line: int) -> None:
+        self.code.append(unit)
+        self.lines.append(line)
+
+    def addConstant(self, value: any) -> int:
+        key: tuple[type, any] = (type(value), value)
+        index: int | None = self.constantIndices.get(key)
+        if index is None:
+            index = self.constantIndices[key] = len(self.constants)
+            self.constants.append(value)
+        return index
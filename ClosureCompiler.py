@@ -0,0 +1,617 @@
+from __future__ import annotations
+import operator
+from typing import Callable
+import Expr
+import Stmt
+from LoxCallable import LoxCallable
+from LoxFunction import CallPlan
+from LoxArray import LoxArray
+from LoxMap import LoxMap
+from LoxClass import LoxClass, LoxInstance, PropertyCache
+from Rope import STRING, concatenate, typeName
+from ExecutionFlow import Signal
+from ErrorManager import *
+from Token import Token
+from TokenType import TokenType
+from Environment import Access, Cell, Environment, GlobalEnvironment
+from Interpreter import Interpreter
+
+# Compiled expressions evaluate to a value, compiled statements return a Signal or None to fall through
+Frame = Environment | GlobalEnvironment
+Code = Callable[[Frame], any]
+
+NUMBER: tuple[type, ...] = (int, float)
+INTEGER: tuple[type, ...] = (int,)
+ANY: tuple[type, ...] = (object,)
+
+class CompiledFunction(LoxCallable):
+
+    def __init__(self, compiler: ClosureCompiler, declaration: Stmt.Function, body: list[Code], upvalues: tuple[Cell, ...]) -> None:
+        self.compiler: ClosureCompiler = compiler
+        self.declaration: Stmt.Function = declaration
+        self.body: list[Code] = body
+        self.upvalues: tuple[Cell, ...] = upvalues
+        self.plan: CallPlan = compiler.interpreter.callPlan(declaration)
+
+    def __str__(self) -> str:
+        return f"<fun {self.declaration.name.lexeme}>"
+
+    def arity(self) -> int:
+        return self.plan.arity
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> any:
+        frame: Environment = self.plan.frame(arguments, self.upvalues)
+
+        for stmt in self.body:
+            # Break and continue can't escape a function so any signal is a return
+            if stmt(frame) is not None:
+                return self.compiler.returnValue
+        return None
+
+class ClosureCompiler:
+    """
+    Alternative to walking the AST with the Interpreter. The resolved AST is compiled once into a tree
+    of Python closures, each specialized for its node (for example a comparison of a local with a
+    constant), and running the program only calls those closures. The globals, resolution tables,
+    output and error reporting of the Interpreter are shared.
+    """
+
+    # Operator and the types both of its operands must have
+    OPERATIONS: dict[TokenType, tuple[Callable[[any, any], any], tuple[type, ...]]] = {
+        TokenType.MINUS: (operator.sub, NUMBER),
+        TokenType.SLASH: (operator.truediv, NUMBER),
+        TokenType.STAR: (operator.mul, NUMBER),
+        TokenType.STAR_STAR: (operator.pow, INTEGER),
+        TokenType.AMPERSAND: (operator.and_, INTEGER),
+        TokenType.BAR: (operator.or_, INTEGER),
+        TokenType.CARROT: (operator.xor, INTEGER),
+        TokenType.LESS_LESS: (operator.lshift, INTEGER),
+        TokenType.GREATER_GREATER: (operator.rshift, INTEGER),
+        TokenType.GREATER: (operator.gt, NUMBER),
+        TokenType.GREATER_EQUAL: (operator.ge, NUMBER),
+        TokenType.LESS: (operator.lt, NUMBER),
+        TokenType.LESS_EQUAL: (operator.le, NUMBER),
+        TokenType.BANG_EQUAL: (lambda a, b: bool(a != b), ANY),
+        TokenType.EQUAL_EQUAL: (lambda a, b: bool(a == b), ANY),
+    }
+
+    def __init__(self, interpreter: Interpreter) -> None:
+        self.interpreter: Interpreter = interpreter
+        self.errorManager: ErrorManager = interpreter.errorManager
+        self.globals: GlobalEnvironment = interpreter.globals
+        # Set by a return statement just before it signals Signal.RETURN
+        self.returnValue: any = None
+
+    def compile(self, node: Expr.Expr | Stmt.Stmt | list[Stmt.Stmt]) -> Code | list[Code]:
+        if isinstance(node, list):
+            return [stmt.accept(self) for stmt in node]
+        return node.accept(self)
+
+    def interpret(self, statements: list[Stmt.Stmt]) -> None:
+        code: list[Code] = self.compile(statements)
+        try:
+            for stmt in code:
+                stmt(self.globals)
+        except RuntimeError as error:
+            self.interpreter.runtimeError(error)
+
+    # Helpers
+
+    def localSlot(self, expr: Expr.Expr) -> int | None:
+        """
+        Slot of expr if it reads a plain local from the innermost frame
+        """
+        if isinstance(expr, Expr.Variable):
+            local: tuple[Access, int, int] | None = self.interpreter.locals.get(expr)
+            if local is not None and local[0] == Access.LOCAL and local[1] == 0:
+                return local[2]
+        return None
+
+    def constant(self, expr: Expr.Expr) -> tuple[any] | None:
+        if isinstance(expr, (Expr.Literal, Expr.String)):
+            return (expr.value,)
+        if isinstance(expr, Expr.Grouping):
+            return self.constant(expr.expression)
+        return None
+
+    def failure(self, token: Token, types: tuple[type, ...]) -> Callable[[any, any], None]:
+        """
+        Raise the same error as the Interpreter when the operands of token don't have the right types
+        """
+        if token.type == TokenType.PLUS:
+            def fail(left: any, right: any) -> None:
+                raise RuntimeError(token, f"Cannot add types of {typeName(left)} and {typeName(right)}")
+        else:
+            def fail(left: any, right: any) -> None:
+                self.interpreter.checkTypeOfOperands(token, types, [left, right])
+        return fail
+
+    def capture(self, upvalues: tuple[tuple[Access, int, int], ...]) -> Callable[[Frame], tuple[Cell, ...]]:
+        if not upvalues:
+            return lambda frame: ()
+
+        def capture(frame: Frame) -> tuple[Cell, ...]:
+            cells: list[Cell] = []
+            for access, depth, slot in upvalues:
+                if access == Access.CELL:
+                    cells.append(frame.getAt(depth, slot))
+                else:
+                    cells.append(frame.upvalues[slot])
+            return tuple(cells)
+        return capture
+
+    def store(self, stmt: Stmt.Var | Stmt.Function | Stmt.Class) -> Callable[[Frame, any], None]:
+        """
+        Code to bind the variable a Var, Function or Class declares
+        """
+        declaration: tuple[int, bool] | None = self.interpreter.slots.get(stmt)
+        if declaration is None:
+            values: dict[int, any] = self.globals.values
+            symbol: int = stmt.name.symbol
+            def storeGlobal(frame: Frame, value: any) -> None:
+                values[symbol] = value
+            return storeGlobal
+
+        slot, captured = declaration
+        if captured:
+            def storeCell(frame: Frame, value: any) -> None:
+                frame.values[slot] = Cell(value)
+            return storeCell
+
+        def storeLocal(frame: Frame, value: any) -> None:
+            frame.values[slot] = value
+        return storeLocal
+
+    # Expression visitors
+
+    def visitLiteralExpr(self, expr: Expr.Literal) -> Code:
+        value: any = expr.value
+        return lambda frame: value
+
+    def visitStringExpr(self, expr: Expr.String) -> Code:
+        value: str = expr.value
+        return lambda frame: value
+
+    def visitGroupingExpr(self, expr: Expr.Grouping) -> Code:
+        return self.compile(expr.expression)
+
+    def visitVariableExpr(self, expr: Expr.Variable) -> Code:
+        return self.variable(expr, expr.name)
+
+    def variable(self, expr: Expr.Variable | Expr.This | Expr.Super, name: Token) -> Code:
+        local: tuple[Access, int, int] | None = self.interpreter.locals.get(expr)
+        if local is None:
+            symbol: int = name.symbol
+            values: dict[int, any] = self.globals.values
+            globals: GlobalEnvironment = self.globals
+            def readGlobal(frame: Frame) -> any:
+                if symbol in values:
+                    return values[symbol]
+                return globals.get(name)
+            return readGlobal
+
+        access, depth, slot = local
+        if access == Access.UPVALUE:
+            return lambda frame: frame.upvalues[slot].value
+        if access == Access.CELL:
+            return lambda frame: frame.getAt(depth, slot).value
+        if depth == 0:
+            return lambda frame: frame.values[slot]
+        if depth == 1:
+            return lambda frame: frame.enclosing.values[slot]
+        return lambda frame: frame.getAt(depth, slot)
+
+    def visitAssignExpr(self, expr: Expr.Assign) -> Code:
+        value: Code = self.compile(expr.value)
+        local: tuple[Access, int, int] | None = self.interpreter.locals.get(expr)
+        if local is None:
+            name: Token = expr.name
+            symbol: int = name.symbol
+            values: dict[int, any] = self.globals.values
+            globals: GlobalEnvironment = self.globals
+            def assignGlobal(frame: Frame) -> any:
+                result: any = value(frame)
+                if symbol in values:
+                    values[symbol] = result
+                else:
+                    globals.assign(name, result)
+                return result
+            return assignGlobal
+
+        access, depth, slot = local
+        if access == Access.UPVALUE:
+            def assignUpvalue(frame: Frame) -> any:
+                result: any = value(frame)
+                frame.upvalues[slot].value = result
+                return result
+            return assignUpvalue
+        if access == Access.CELL:
+            def assignCell(frame: Frame) -> any:
+                result: any = value(frame)
+                frame.getAt(depth, slot).value = result
+                return result
+            return assignCell
+        if depth == 0:
+            def assignLocal(frame: Frame) -> any:
+                result: any = value(frame)
+                frame.values[slot] = result
+                return result
+            return assignLocal
+        def assignAt(frame: Frame) -> any:
+            result: any = value(frame)
+            frame.assignAt(depth, slot, result)
+            return result
+        return assignAt
+
+    def visitUnaryExpr(self, expr: Expr.Unary) -> Code:
+        right: Code = self.compile(expr.right)
+        token: Token = expr.operator
+
+        if token.type == TokenType.BANG:
+            return lambda frame: not right(frame)
+
+        def negate(frame: Frame) -> any:
+            value: any = right(frame)
+            if isinstance(value, NUMBER):
+                return -value
+            self.interpreter.checkTypeOfOperands(token, NUMBER, [value])
+        return negate
+
+    def visitLogicalExpr(self, expr: Expr.Logical) -> Code:
+        left: Code = self.compile(expr.left)
+        right: Code = self.compile(expr.right)
+
+        if expr.operator.type == TokenType.OR:
+            def logicalOr(frame: Frame) -> any:
+                value: any = left(frame)
+                return value if value else right(frame)
+            return logicalOr
+
+        def logicalAnd(frame: Frame) -> any:
+            value: any = left(frame)
+            return right(frame) if value else value
+        return logicalAnd
+
+    def visitTernaryExpr(self, expr: Expr.Ternary) -> Code:
+        condition: Code = self.compile(expr.condition)
+        trueExpr: Code = self.compile(expr.trueExpr)
+        falseExpr: Code = self.compile(expr.falseExpr)
+        return lambda frame: trueExpr(frame) if condition(frame) else falseExpr(frame)
+
+    def visitBinaryExpr(self, expr: Expr.Binary) -> Code:
+        token: Token = expr.operator
+        leftSlot: int | None = self.localSlot(expr.left)
+        rightSlot: int | None = self.localSlot(expr.right)
+        rightConstant: tuple[any] | None = self.constant(expr.right)
+
+        op: Callable[[any, any], any]
+        types: tuple[type, ...]
+        if token.type == TokenType.PLUS:
+            op = operator.add
+            # Addition needs both operands to be numbers or both strings, which can only be
+            # specialized once one of them is known
+            if rightConstant is not None and isinstance(rightConstant[0], NUMBER):
+                types = NUMBER
+            elif rightConstant is not None and isinstance(rightConstant[0], str):
+                op = concatenate
+                types = STRING
+            else:
+                types = None
+        else:
+            op, types = ClosureCompiler.OPERATIONS[token.type]
+        fail: Callable[[any, any], None] = self.failure(token, types or NUMBER)
+
+        if types is not None and rightConstant is not None and isinstance(rightConstant[0], types):
+            constant: any = rightConstant[0]
+            if leftSlot is not None:
+                def localConstant(frame: Frame) -> any:
+                    left: any = frame.values[leftSlot]
+                    if isinstance(left, types):
+                        return op(left, constant)
+                    fail(left, constant)
+                return localConstant
+
+            leftCode: Code = self.compile(expr.left)
+            def exprConstant(frame: Frame) -> any:
+                left: any = leftCode(frame)
+                if isinstance(left, types):
+                    return op(left, constant)
+                fail(left, constant)
+            return exprConstant
+
+        if leftSlot is not None and rightSlot is not None:
+            if types is None:
+                def addLocals(frame: Frame) -> any:
+                    values: list[any] = frame.values
+                    left: any = values[leftSlot]
+                    right: any = values[rightSlot]
+                    if type(left) is int and type(right) is int:
+                        return left + right
+                    return self.add(token, left, right)
+                return addLocals
+
+            def localLocal(frame: Frame) -> any:
+                values: list[any] = frame.values
+                left: any = values[leftSlot]
+                right: any = values[rightSlot]
+                if isinstance(left, types) and isinstance(right, types):
+                    return op(left, right)
+                fail(left, right)
+            return localLocal
+
+        leftCode: Code = self.compile(expr.left)
+        rightCode: Code = self.compile(expr.right)
+        if types is None:
+            return lambda frame: self.add(token, leftCode(frame), rightCode(frame))
+
+        def binary(frame: Frame) -> any:
+            left: any = leftCode(frame)
+            right: any = rightCode(frame)
+            if isinstance(left, types) and isinstance(right, types):
+                return op(left, right)
+            fail(left, right)
+        return binary
+
+    def add(self, token: Token, left: any, right: any) -> any:
+        if isinstance(left, NUMBER) and isinstance(right, NUMBER):
+            return left + right
+        if isinstance(left, STRING) and isinstance(right, STRING):
+            return concatenate(left, right)
+        raise RuntimeError(token, f"Cannot add types of {typeName(left)} and {typeName(right)}")
+
+    def visitCallExpr(self, expr: Expr.Call) -> Code:
+        arguments: list[Code] = [self.compile(argument) for argument in expr.arguments]
+        paren: Token = expr.paren
+        interpreter: Interpreter = self.interpreter
+
+        if type(expr.callee) is Expr.Get:
+            object: Code = self.compile(expr.callee.object)
+            cache: PropertyCache = PropertyCache()
+            invocation: Callable[[Expr.Call, PropertyCache, any, list[any]], tuple[LoxCallable, list[any]]] = interpreter.invocation
+
+            def invoke(frame: Frame) -> any:
+                # A method gets the instance as its first argument rather than being bound to it
+                function, values = invocation(expr, cache, object(frame), [argument(frame) for argument in arguments])
+                try:
+                    return function.call(interpreter, values)
+                except NativeError as error:
+                    raise RuntimeError(paren, error.message)
+                except RecursionError:
+                    raise RuntimeError(paren, "Stack overflow")
+            return invoke
+
+        callee: Code = self.compile(expr.callee)
+
+        def call(frame: Frame) -> any:
+            function: any = callee(frame)
+            values: list[any] = [argument(frame) for argument in arguments]
+
+            if not isinstance(function, LoxCallable):
+                raise RuntimeError(paren, "Did not find function or class")
+            elif len(values) != function.arity():
+                raise RuntimeError(paren, f"Expected {function.arity()} arguments but got {len(values)}")
+            try:
+                return function.call(interpreter, values)
+            except NativeError as error:
+                raise RuntimeError(paren, error.message)
+            except RecursionError:
+                # Calls nest Python calls and tail calls aren't eliminated, so deep recursion runs out
+                # of Python stack. Raised again further out if even this runs out, until one succeeds.
+                raise RuntimeError(paren, "Stack overflow")
+        return call
+
+    def visitArrayExpr(self, expr: Expr.Array) -> Code:
+        elements: list[Code] = [self.compile(element) for element in expr.elements]
+        return lambda frame: LoxArray.of([element(frame) for element in elements])
+
+    def visitMapExpr(self, expr: Expr.Map) -> Code:
+        entries: list[Code] = [self.compile(entry) for pair in zip(expr.keys, expr.values) for entry in pair]
+        brace: Token = expr.brace
+        makeMap: Callable[[Token, list[any]], LoxMap] = self.interpreter.makeMap
+        return lambda frame: makeMap(brace, [entry(frame) for entry in entries])
+
+    def visitIndexExpr(self, expr: Expr.Index) -> Code:
+        object: Code = self.compile(expr.object)
+        index: Code = self.compile(expr.index)
+        bracket: Token = expr.bracket
+        getElement: Callable[[Token, any, any], any] = self.interpreter.getElement
+
+        def readIndex(frame: Frame) -> any:
+            array: any = object(frame)
+            position: any = index(frame)
+            if type(array) is LoxArray and type(position) is int and 0 <= position < len(array.items):
+                return array.items[position]
+            return getElement(bracket, array, position)
+        return readIndex
+
+    def visitSetIndexExpr(self, expr: Expr.SetIndex) -> Code:
+        object: Code = self.compile(expr.object)
+        index: Code = self.compile(expr.index)
+        value: Code = self.compile(expr.value)
+        bracket: Token = expr.bracket
+        setElement: Callable[[Token, any, any, any], any] = self.interpreter.setElement
+        return lambda frame: setElement(bracket, object(frame), index(frame), value(frame))
+
+    def visitGetExpr(self, expr: Expr.Get) -> Code:
+        object: Code = self.compile(expr.object)
+        cache: PropertyCache = PropertyCache()
+        readProperty: Callable[[Expr.Get, PropertyCache, any], any] = self.interpreter.readProperty
+
+        def get(frame: Frame) -> any:
+            instance: any = object(frame)
+            if type(instance) is LoxInstance and instance.shape is cache.shape and cache.method is None:
+                return instance.values[cache.slot]
+            return readProperty(expr, cache, instance)
+        return get
+
+    def visitSetExpr(self, expr: Expr.Set) -> Code:
+        object: Code = self.compile(expr.object)
+        value: Code = self.compile(expr.value)
+        cache: PropertyCache = PropertyCache()
+        writeProperty: Callable[[Expr.Set, PropertyCache, any, any], any] = self.interpreter.writeProperty
+
+        def set(frame: Frame) -> any:
+            instance: any = object(frame)
+            result: any = value(frame)
+            if type(instance) is LoxInstance and instance.shape is cache.shape and cache.next is None:
+                instance.values[cache.slot] = result
+                return result
+            return writeProperty(expr, cache, instance, result)
+        return set
+
+    def visitThisExpr(self, expr: Expr.This) -> Code:
+        return self.variable(expr, expr.keyword)
+
+    def visitSuperExpr(self, expr: Expr.Super) -> Code:
+        superclass: Code = self.variable(expr, expr.keyword)
+        receiver: Code = self.compile(expr.receiver)
+        lookUpSuper: Callable[[Expr.Super, LoxClass, any], any] = self.interpreter.lookUpSuper
+        return lambda frame: lookUpSuper(expr, superclass(frame), receiver(frame))
+
+    # Statement visitors
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression) -> Code:
+        expression: Code = self.compile(stmt.expression)
+        def expressionStmt(frame: Frame) -> None:
+            expression(frame)
+        return expressionStmt
+
+    def visitPrintStmt(self, stmt: Stmt.Print) -> Code:
+        expression: Code = self.compile(stmt.expression)
+        stringify: Callable[[any], str] = self.interpreter.stringify
+        write: Callable[[str], None] = self.interpreter.output.write
+        def printStmt(frame: Frame) -> None:
+            write(stringify(expression(frame)))
+        return printStmt
+
+    def visitVarStmt(self, stmt: Stmt.Var) -> Code:
+        store: Callable[[Frame, any], None] = self.store(stmt)
+        if stmt.initializer is None:
+            return lambda frame: store(frame, None)
+
+        initializer: Code = self.compile(stmt.initializer)
+        return lambda frame: store(frame, initializer(frame))
+
+    def visitFunctionStmt(self, stmt: Stmt.Function) -> Code:
+        body: list[Code] = self.compile(stmt.body)
+        capture: Callable[[Frame], tuple[Cell, ...]] = self.capture(self.interpreter.upvalues[stmt])
+        declaration: tuple[int, bool] | None = self.interpreter.slots.get(stmt)
+
+        if declaration is not None and declaration[1]:
+            slot: int = declaration[0]
+            def declareCaptured(frame: Frame) -> None:
+                # The function may capture itself, so its cell has to exist before the upvalues are gathered
+                cell: Cell = Cell()
+                frame.values[slot] = cell
+                cell.value = CompiledFunction(self, stmt, body, capture(frame))
+            return declareCaptured
+
+        store: Callable[[Frame, any], None] = self.store(stmt)
+        return lambda frame: store(frame, CompiledFunction(self, stmt, body, capture(frame)))
+
+    def visitClassStmt(self, stmt: Stmt.Class) -> Code:
+        name: str = stmt.name.lexeme
+        methods: list[tuple[Stmt.Function, list[Code], Callable[[Frame], tuple[Cell, ...]]]] = [
+            (method, self.compile(method.body), self.capture(self.interpreter.upvalues[method])) for method in stmt.methods
+        ]
+        superclass: Code | None = self.compile(stmt.superclass) if stmt.superclass is not None else None
+        declaration: tuple[int, bool] | None = self.interpreter.slots.get(stmt)
+        store: Callable[[Frame, any], None] = self.store(stmt)
+
+        def classStmt(frame: Frame) -> None:
+            base: any = None
+            scope: Frame = frame
+            if superclass is not None:
+                base = superclass(frame)
+                if type(base) is not LoxClass:
+                    raise RuntimeError(stmt.superclass.name, "Superclass must be a class")
+                # The frame of the scope holding super, which the methods capture
+                scope = Environment(frame, [Cell(base)], frame.upvalues)
+
+            cell: Cell | None = None
+            if declaration is not None and declaration[1]:
+                # Methods may capture the class, so its cell has to exist before the upvalues are gathered
+                cell = Cell()
+                frame.values[declaration[0]] = cell
+            klass: LoxClass = LoxClass(name, base, {method.name.lexeme: CompiledFunction(self, method, body, capture(scope)) for method, body, capture in methods})
+            if cell is not None:
+                cell.value = klass
+            else:
+                store(frame, klass)
+        return classStmt
+
+    def visitBlockStmt(self, stmt: Stmt.Block) -> Code:
+        statements: list[Code] = self.compile(stmt.statements)
+        size: int | None = self.interpreter.frameSizes.get(stmt)
+        if size is None:
+            # The block declares nothing, so it runs in the frame of the enclosing block
+            def scopeless(frame: Frame) -> Signal | None:
+                for statement in statements:
+                    signal: Signal | None = statement(frame)
+                    if signal is not None:
+                        return signal
+                return None
+            return scopeless
+
+        def block(frame: Frame) -> Signal | None:
+            inner: Environment = Environment(frame, [None] * size, frame.upvalues)
+            for statement in statements:
+                signal: Signal | None = statement(inner)
+                if signal is not None:
+                    return signal
+            return None
+        return block
+
+    def visitControlStmt(self, stmt: Stmt.Control) -> Code:
+        signal: Signal = Signal.BREAK if stmt.control.type == TokenType.BREAK else Signal.CONTINUE
+        return lambda frame: signal
+
+    def visitReturnStmt(self, stmt: Stmt.Return) -> Code:
+        value: Code | None = self.compile(stmt.value) if stmt.value is not None else None
+
+        def returnStmt(frame: Frame) -> Signal:
+            self.returnValue = value(frame) if value is not None else None
+            return Signal.RETURN
+        return returnStmt
+
+    def visitIfStmt(self, stmt: Stmt.If) -> Code:
+        condition: Code = self.compile(stmt.condition)
+        thenBranch: Code = self.compile(stmt.thenBranch)
+        if stmt.elseBranch is None:
+            return lambda frame: thenBranch(frame) if condition(frame) else None
+
+        elseBranch: Code = self.compile(stmt.elseBranch)
+        return lambda frame: thenBranch(frame) if condition(frame) else elseBranch(frame)
+
+    def visitWhileStmt(self, stmt: Stmt.While) -> Code:
+        condition: Code = self.compile(stmt.condition)
+        body: Code = self.compile(stmt.body)
+
+        def whileStmt(frame: Frame) -> Signal | None:
+            while condition(frame):
+                signal: Signal | None = body(frame)
+                if signal is Signal.BREAK:
+                    break
+                elif signal is Signal.RETURN:
+                    return signal
+            return None
+        return whileStmt
+
+    def visitForStmt(self, stmt: Stmt.For) -> Code:
+        initializer: Code | None = self.compile(stmt.initializer) if stmt.initializer is not None else None
+        condition: Code = self.compile(stmt.condition)
+        increment: Code = self.compile(stmt.increment) if stmt.increment is not None else (lambda frame: None)
+        body: Code = self.compile(stmt.body)
+
+        def forStmt(frame: Frame) -> Signal | None:
+            if initializer is not None:
+                initializer(frame)
+            while condition(frame):
+                signal: Signal | None = body(frame)
+                if signal is Signal.BREAK:
+                    break
+                elif signal is Signal.RETURN:
+                    return signal
+                increment(frame)
+            return None
+        return forStmt
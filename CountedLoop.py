@@ -0,0 +1,107 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from Interpreter import Interpreter
+
+import Expr
+import Stmt
+from Environment import Access, Environment
+from TokenType import TokenType
+
+class CountedLoop:
+    """
+    A for statement of the form `for (var i = start; i < bound; i = i + step) body` which can run on a
+    range instead of evaluating the condition and increment every iteration. The variable has to be
+    an uncaptured local the body never assigns, the bound a literal or an uncaptured local the body
+    never assigns, and the step a constant in the direction of the comparison. Any of <, <=, > and >=
+    work.
+    """
+
+    # Comparison, the direction the step has to go in, and what to add to the bound for the end of the range
+    COMPARISONS: dict[TokenType, tuple[int, int]] = {
+        TokenType.LESS: (1, 0),
+        TokenType.LESS_EQUAL: (1, 1),
+        TokenType.GREATER: (-1, 0),
+        TokenType.GREATER_EQUAL: (-1, -1),
+    }
+
+    def __init__(self, slot: int, bound: Expr.Literal | tuple[int, int], step: int, adjust: int) -> None:
+        # Slot of the loop variable in the environment the loop runs in
+        self.slot: int = slot
+        # The bound as a literal, or the (depth, slot) of the local holding it
+        self.bound: Expr.Literal | tuple[int, int] = bound
+        self.step: int = step
+        self.adjust: int = adjust
+
+    def range(self, environment: Environment) -> range | None:
+        """
+        The values the loop variable takes, None if the start or bound aren't integers and the loop
+        has to take the general path
+        """
+        start: any = environment.values[self.slot]
+        bound: any = self.bound.value if isinstance(self.bound, Expr.Literal) else environment.getAt(*self.bound)
+        if type(start) is not int or type(bound) is not int:
+            return None
+        return range(start, bound + self.adjust, self.step)
+
+    @staticmethod
+    def recognize(interpreter: Interpreter, stmt: Stmt.For) -> CountedLoop | None:
+        if not isinstance(stmt.initializer, Stmt.Var):
+            return None
+        declaration: tuple[int, bool] | None = interpreter.slots.get(stmt.initializer)
+        if declaration is None or declaration[1]:
+            # Globals and captured variables can be changed by calls in the body
+            return None
+        slot: int = declaration[0]
+        variable: Expr.Variable | None = None
+
+        def isVariable(expr: Expr.Expr) -> bool:
+            return isinstance(expr, Expr.Variable) and interpreter.locals.get(expr) == (Access.LOCAL, 0, slot)
+
+        condition: Expr.Expr = stmt.condition
+        if not (isinstance(condition, Expr.Binary) and condition.operator.type in CountedLoop.COMPARISONS and isVariable(condition.left)):
+            return None
+        direction, adjust = CountedLoop.COMPARISONS[condition.operator.type]
+        names: set[int] = {stmt.initializer.name.symbol}
+
+        bound: Expr.Literal | tuple[int, int]
+        if isinstance(condition.right, Expr.Literal):
+            bound = condition.right
+        elif isinstance(condition.right, Expr.Variable):
+            local: tuple[Access, int, int] | None = interpreter.locals.get(condition.right)
+            if local is None or local[0] != Access.LOCAL:
+                return None
+            bound = local[1:]
+            names.add(condition.right.name.symbol)
+        else:
+            return None
+
+        # The increment has to be i = i + step or i = i - step
+        increment: Expr.Expr | None = stmt.increment
+        if not (isinstance(increment, Expr.Assign) and interpreter.locals.get(increment) == (Access.LOCAL, 0, slot)):
+            return None
+        value: Expr.Expr = increment.value
+        if not (isinstance(value, Expr.Binary) and isVariable(value.left) and value.operator.type in (TokenType.PLUS, TokenType.MINUS)):
+            return None
+        if not (isinstance(value.right, Expr.Literal) and type(value.right.value) is int):
+            return None
+        step: int = value.right.value if value.operator.type == TokenType.PLUS else -value.right.value
+        if step * direction <= 0:
+            return None
+
+        if CountedLoop.assigns(stmt.body, names):
+            return None
+        return CountedLoop(slot, bound, step, adjust)
+
+    @staticmethod
+    def assigns(node: any, names: set[int]) -> bool:
+        """
+        Whether node assigns to any variable with one of the names, shadowing aside
+        """
+        if isinstance(node, Expr.Assign) and node.name.symbol in names:
+            return True
+        if isinstance(node, list):
+            return any(CountedLoop.assigns(child, names) for child in node)
+        if isinstance(node, (Expr.Expr, Stmt.Stmt)):
+            return any(CountedLoop.assigns(child, names) for child in vars(node).values())
+        return False
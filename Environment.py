@@ -1,16 +1,48 @@
 from __future__ import annotations
+from enum import Enum, auto
 from ErrorManager import *
 from Token import Token
 
+class Access(Enum):
+    """
+    How the Resolver decided a local variable reference reaches its value
+    """
+    # Plain value in a slot of a frame
+    LOCAL = auto()
+    # Slot of a frame which holds a Cell because a closure captured the variable
+    CELL = auto()
+    # Cell the enclosing function captured, found in the upvalues of the frame
+    UPVALUE = auto()
+
+class Cell:
+    """
+    Box for a local variable shared between its frame and the closures which capture it
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: any = None) -> None:
+        self.value: any = value
+
 class Environment:
+    """
+    A local scope. The Resolver gives every variable declared in the scope a slot, so the values
+    live in a fixed size list and are read and written by index rather than by name. Frames only
+    link to the frames of enclosing blocks in the same function, variables of enclosing functions
+    are reached through the cells in upvalues.
+    """
+
+    # A frame is made for every call and every block which declares something, so keep them small
+    __slots__ = ("values", "enclosing", "upvalues")
 
-    def __init__(self, errorManager: ErrorManager, enclosing: Environment|None) -> None:
-        self.errorManager = errorManager
-        self.values: dict[str, any] = {}
+    def __init__(self, enclosing: Environment|GlobalEnvironment|None, values: list[any], upvalues: tuple[Cell, ...] = ()) -> None:
+        # One value for each slot, the frame takes over the list
+        self.values: list[any] = values
         self.enclosing = enclosing
+        self.upvalues: tuple[Cell, ...] = upvalues
 
-    def define(self, name: str, value: any) -> None:
-        self.values[name] = value
+    def define(self, slot: int, value: any) -> None:
+        self.values[slot] = value
 
     def ancestor(self, distance: int) -> Environment:
         environment: Environment = self
@@ -18,27 +50,42 @@ class Environment:
             environment = environment.enclosing
         return environment
 
-    def get(self, name: Token) -> any:
-        if name.lexeme in self.values:
-            # If the variable is found in this environment
-            return self.values[name.lexeme]
+    def getAt(self, distance: int, slot: int) -> any:
+        environment: Environment = self
+        for _ in range(distance):
+            environment = environment.enclosing
+        return environment.values[slot]
+
+    def assignAt(self, distance: int, slot: int, value: any) -> None:
+        environment: Environment = self
+        for _ in range(distance):
+            environment = environment.enclosing
+        environment.values[slot] = value
 
-        if self.enclosing is not None:
-            # If this environment is enclosed by another, try the enclosing one
-            return self.enclosing.get(name)
+class GlobalEnvironment:
+    """
+    The global scope. Globals are late bound and can be redefined, so they are still looked up by
+    their symbol.
+    """
 
-        raise RuntimeError(name, f"Undefined variable: {name.lexeme}")
+    __slots__ = ("values", "upvalues")
+
+    def __init__(self) -> None:
+        self.values: dict[int, any] = {}
+        # Code at the top level is not inside a function so has nothing captured
+        self.upvalues: tuple[Cell, ...] = ()
 
-    def getAt(self, name: str, distance: int) -> any:
-        return self.ancestor(distance).values[name]
+    def define(self, symbol: int, value: any) -> None:
+        self.values[symbol] = value
+
+    def get(self, name: Token) -> any:
+        if name.symbol in self.values:
+            return self.values[name.symbol]
+
+        raise RuntimeError(name, f"Undefined variable: {name.lexeme}")
 
     def assign(self, name: Token, value: any) -> None:
-        if name.lexeme in self.values:
-            self.values[name.lexeme] = value
-        elif self.enclosing is not None:
-            self.enclosing.assign(name, value)
+        if name.symbol in self.values:
+            self.values[name.symbol] = value
         else:
             raise RuntimeError(name, f"Undefined variable: {name.lexeme}")
-
-    def assignAt(self, name: Token, distance: int, value: any) -> None:
-        self.ancestor(distance).values[name.lexeme] = value
@@ -18,6 +18,16 @@ class RuntimeError(Exception):
         self.message: str = message
         super().__init__(self.message)
 
+class NativeError(Exception):
+    """
+    Exception raised by a builtin or an array operation, which have no token of their own. The engine
+    running the call or index reports it as a RuntimeError there.
+    """
+
+    def __init__(self, message: str) -> None:
+        self.message: str = message
+        super().__init__(self.message)
+
 
 class ErrorManager:
     """
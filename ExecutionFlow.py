@@ -2,19 +2,15 @@
 Various classes to control exectuion flow
 """
 
-from Token import Token
+from enum import Enum, auto
 
-class Break(Exception):
-
-    def __init__(self, token: Token) -> None:
-        self.token: Token = token
-
-class Continue(Exception):
-
-    def __init__(self, token: Token) -> None:
-        self.token: Token = token
-
-class Return(Exception):
-
-    def __init__(self, value: any) -> None:
-        self.value: any = value
+class Signal(Enum):
+    """
+    How a statement finished when it didn't fall through to the next one. Statements return it up
+    to the loop or function which handles it, a returned value is kept aside by the engine.
+    """
+    BREAK = auto()
+    CONTINUE = auto()
+    RETURN = auto()
+    # A return of a call to a Lox function, which the caller's trampoline makes in place of the current call
+    TAIL_CALL = auto()
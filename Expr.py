@@ -6,6 +6,14 @@ from Token import Token
 class Expr:
     pass
 
+class Array(Expr):
+    def __init__(self, bracket: Token, elements: list[Expr]):
+        self.bracket: Token = bracket
+        self.elements: list[Expr] = elements
+
+    def accept(self, visitor: any) -> any:
+        return visitor.visitArrayExpr(self)
+
 class Assign(Expr):
     def __init__(self, name: Token, value: Expr):
         self.name: Token = name
@@ -32,6 +40,14 @@ class Call(Expr):
     def accept(self, visitor: any) -> any:
         return visitor.visitCallExpr(self)
 
+class Get(Expr):
+    def __init__(self, object: Expr, name: Token):
+        self.object: Expr = object
+        self.name: Token = name
+
+    def accept(self, visitor: any) -> any:
+        return visitor.visitGetExpr(self)
+
 class Grouping(Expr):
     def __init__(self, expression: Expr):
         self.expression: Expr = expression
@@ -39,6 +55,15 @@ class Grouping(Expr):
     def accept(self, visitor: any) -> any:
         return visitor.visitGroupingExpr(self)
 
+class Index(Expr):
+    def __init__(self, object: Expr, bracket: Token, index: Expr):
+        self.object: Expr = object
+        self.bracket: Token = bracket
+        self.index: Expr = index
+
+    def accept(self, visitor: any) -> any:
+        return visitor.visitIndexExpr(self)
+
 class Literal(Expr):
     def __init__(self, value: any):
         self.value: any = value
@@ -55,6 +80,34 @@ class Logical(Expr):
     def accept(self, visitor: any) -> any:
         return visitor.visitLogicalExpr(self)
 
+class Map(Expr):
+    def __init__(self, brace: Token, keys: list[Expr], values: list[Expr]):
+        self.brace: Token = brace
+        self.keys: list[Expr] = keys
+        self.values: list[Expr] = values
+
+    def accept(self, visitor: any) -> any:
+        return visitor.visitMapExpr(self)
+
+class Set(Expr):
+    def __init__(self, object: Expr, name: Token, value: Expr):
+        self.object: Expr = object
+        self.name: Token = name
+        self.value: Expr = value
+
+    def accept(self, visitor: any) -> any:
+        return visitor.visitSetExpr(self)
+
+class SetIndex(Expr):
+    def __init__(self, object: Expr, bracket: Token, index: Expr, value: Expr):
+        self.object: Expr = object
+        self.bracket: Token = bracket
+        self.index: Expr = index
+        self.value: Expr = value
+
+    def accept(self, visitor: any) -> any:
+        return visitor.visitSetIndexExpr(self)
+
 class String(Expr):
     def __init__(self, value: str):
         self.value: str = value
@@ -62,6 +115,15 @@ class String(Expr):
     def accept(self, visitor: any) -> any:
         return visitor.visitStringExpr(self)
 
+class Super(Expr):
+    def __init__(self, keyword: Token, method: Token, receiver: Expr):
+        self.keyword: Token = keyword
+        self.method: Token = method
+        self.receiver: Expr = receiver
+
+    def accept(self, visitor: any) -> any:
+        return visitor.visitSuperExpr(self)
+
 class Ternary(Expr):
     def __init__(self, condition: Expr, trueExpr: Expr, falseExpr: Expr):
         self.condition: Expr = condition
@@ -71,6 +133,13 @@ class Ternary(Expr):
     def accept(self, visitor: any) -> any:
         return visitor.visitTernaryExpr(self)
 
+class This(Expr):
+    def __init__(self, keyword: Token):
+        self.keyword: Token = keyword
+
+    def accept(self, visitor: any) -> any:
+        return visitor.visitThisExpr(self)
+
 class Unary(Expr):
     def __init__(self, operator: Token, right: Expr):
         self.operator: Token = operator
@@ -0,0 +1,156 @@
+import re
+from typing import Iterator
+from TokenType import TokenType
+from Token import Token
+from Scanner import Scanner
+from TokenBuffer import TokenBuffer
+
+class FastScanner(Scanner):
+    """
+    Scanner which matches a whole token at a time with a single compiled pattern instead of
+    dispatching on every character. Produces the same tokens and errors as Scanner.
+    """
+
+    TOKEN_PATTERN: re.Pattern = re.compile(r"""
+          (?P<SKIP>[ \t\r\n]+)
+        | (?P<IDENTIFIER>[A-Za-z][A-Za-z0-9_]*)
+        | (?P<OPERATOR>!=|==|<=|<<|>=|>>|\*\*|[(){}\[\],.\-+;&|^?:@!=<>*])
+        | (?P<BASENUMBER>0[box][0-9]+)
+        | (?P<NUMBER>[0-9]+(?:\.[0-9]+)?)
+        | (?P<STRING>"[^"]*"?)
+        | (?P<COMMENT>//[^\n]*)
+        | (?P<BLOCKCOMMENT>/\*(?:[^*](?!/))*(?P<BLOCKEND>.{1,2})?)
+        | (?P<SLASH>/)
+        | (?P<ERROR>.)
+    """, re.VERBOSE | re.DOTALL)
+
+    OPERATORS: dict[str, TokenType] = {
+        "(":  TokenType.LEFT_PAREN,
+        ")":  TokenType.RIGHT_PAREN,
+        "{":  TokenType.LEFT_BRACE,
+        "}":  TokenType.RIGHT_BRACE,
+        "[":  TokenType.LEFT_BRACKET,
+        "]":  TokenType.RIGHT_BRACKET,
+        ",":  TokenType.COMMA,
+        ".":  TokenType.DOT,
+        "-":  TokenType.MINUS,
+        "+":  TokenType.PLUS,
+        ";":  TokenType.SEMICOLON,
+        "&":  TokenType.AMPERSAND,
+        "|":  TokenType.BAR,
+        "^":  TokenType.CARROT,
+        "?":  TokenType.QUESTION,
+        ":":  TokenType.COLON,
+        "@":  TokenType.AT,
+        "!":  TokenType.BANG,
+        "!=": TokenType.BANG_EQUAL,
+        "=":  TokenType.EQUAL,
+        "==": TokenType.EQUAL_EQUAL,
+        "<":  TokenType.LESS,
+        "<=": TokenType.LESS_EQUAL,
+        "<<": TokenType.LESS_LESS,
+        ">":  TokenType.GREATER,
+        ">=": TokenType.GREATER_EQUAL,
+        ">>": TokenType.GREATER_GREATER,
+        "*":  TokenType.STAR,
+        "**": TokenType.STAR_STAR,
+    }
+
+    # Characters past the end of a match needed to be sure it is complete, e.g. "1" + ".5" or "0" + "x1"
+    LOOKAHEAD: int = 2
+
+    def scanBuffer(self, buffer: str, final: bool) -> Iterator[tuple[TokenType, int, int, any, int]]:
+        """
+        Yield (type, start, end, literal, line) for the tokens in buffer starting at self.start, for
+        identifiers the literal is their interned symbol. Unless this is the final buffer of the
+        input, stop in front of the first match which could still change once more input is appended.
+        """
+        operators: dict[str, TokenType] = FastScanner.OPERATORS
+        keywords: dict[str, TokenType] = Scanner.KEYWORDS
+        intern = self.symbols.intern
+        limit: int = len(buffer) - FastScanner.LOOKAHEAD
+        line: int = self.line
+        self.current = len(buffer)
+
+        for m in FastScanner.TOKEN_PATTERN.finditer(buffer, self.start):
+            if not final and m.end() > limit:
+                self.current = m.start()
+                break
+
+            kind: str = m.lastgroup
+            text: str = m.group()
+
+            if kind == "SKIP":
+                line += text.count("\n")
+            elif kind == "IDENTIFIER":
+                keyword: TokenType | None = keywords.get(text)
+                if keyword is None:
+                    yield TokenType.IDENTIFIER, m.start(), m.end(), intern(text), line
+                else:
+                    yield keyword, m.start(), m.end(), None, line
+            elif kind == "OPERATOR":
+                yield operators[text], m.start(), m.end(), None, line
+            elif kind == "NUMBER":
+                yield TokenType.NUMBER, m.start(), m.end(), float(text) if "." in text else int(text, 10), line
+            elif kind == "BASENUMBER":
+                yield TokenType.NUMBER, m.start(), m.end(), int(text, 0), line
+            elif kind == "STRING":
+                line += text.count("\n")
+                if len(text) < 2 or text[-1] != "\"":
+                    self.errorManager.scanError(line, "Unterminated string.")
+                else:
+                    yield TokenType.STRING, m.start(), m.end(), text[1:-1], line
+            elif kind == "COMMENT":
+                continue
+            elif kind == "BLOCKCOMMENT":
+                # Like Scanner.blockcomment the closing pair of characters is not checked for newlines
+                end: str | None = m.group("BLOCKEND")
+                if end is None:
+                    line += text.count("\n")
+                    self.errorManager.scanError(line, "Unterminated block comment.")
+                else:
+                    line += text.count("\n", 0, len(text) - len(end))
+            elif kind == "SLASH":
+                yield TokenType.SLASH, m.start(), m.end(), None, line
+            else:
+                self.errorManager.scanError(line, "Unexpexted character.")
+
+        self.start = self.current
+        self.line = line
+
+    @staticmethod
+    def makeToken(type_: TokenType, lexeme: str, literal: any, line: int) -> Token:
+        if type_ == TokenType.IDENTIFIER:
+            # scanBuffer passes the symbol of an identifier in place of its literal
+            return Token(type_, lexeme, None, line, literal)
+        return Token(type_, lexeme, literal, line, Scanner.KEYWORD_SYMBOLS.get(type_))
+
+    def iterTokens(self) -> Iterator[Token]:
+        if not self.source.isascii():
+            # The character classes in TOKEN_PATTERN only cover ASCII, str.isalpha() and
+            # str.isnumeric() accept a lot more so defer to the character at a time scanner
+            yield from super().scanTokens()
+            return
+
+        source: str = self.source
+        for type_, start, end, literal, line in self.scanBuffer(source, final=True):
+            yield FastScanner.makeToken(type_, source[start:end], literal, line)
+        yield Token(TokenType.EOF, "", None, self.line)
+
+    def scanTokens(self) -> list[Token]:
+        self.tokens = list(self.iterTokens())
+        return self.tokens
+
+    def scanTokenBuffer(self) -> TokenBuffer | list[Token]:
+        """
+        Scan the source into a compact TokenBuffer rather than a Token object per token
+        """
+        if not self.source.isascii():
+            # See iterTokens, the character at a time scanner does not track token offsets
+            return self.scanTokens()
+
+        buffer: TokenBuffer = TokenBuffer(self.source)
+        for type_, start, end, literal, line in self.scanBuffer(self.source, final=True):
+            buffer.append(type_, start, end, literal, line)
+        buffer.append(TokenType.EOF, len(self.source), len(self.source), None, self.line)
+        return buffer
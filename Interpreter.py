@@ -1,25 +1,122 @@
+import itertools
+import operator
+import weakref
+from typing import Callable
 import Expr
 import Stmt
 import Builtins
 from LoxCallable import LoxCallable
-from LoxFunction import LoxFunction
+from LoxFunction import CallPlan, LoxFunction, MemoizedFunction, MemoStats
+from LoxArray import LoxArray, getIndex, setIndex
+from LoxMap import LoxMap
+from LoxClass import LoxClass, PropertyCache, findMethod, getProperty, setProperty, superMethod
+from CountedLoop import CountedLoop
 from ExecutionFlow import *
 from ErrorManager import *
 from Token import Token
 from TokenType import TokenType
-from Environment import Environment
+from Environment import Access, Cell, Environment, GlobalEnvironment
+from SymbolTable import SymbolTable
+from Output import Output
+from Rope import STRING, concatenate, typeName
 
 class Interpreter:
 
-    def __init__(self, errorManager: ErrorManager) -> None:
+    # Side tables filled in by the Resolver and Purity, which a ScriptCache saves along with the AST
+    RESOLUTION_TABLES: tuple[str, ...] = ("locals", "slots", "frameSizes", "upvalues", "parameterCells", "tailCalls", "pureFunctions")
+
+    # Operators on numbers, and those which only take integers
+    NUMBER_OPERATORS: dict[TokenType, Callable[[any, any], any]] = {
+        TokenType.PLUS: operator.add,
+        TokenType.MINUS: operator.sub,
+        TokenType.SLASH: operator.truediv,
+        TokenType.STAR: operator.mul,
+        TokenType.GREATER: operator.gt,
+        TokenType.GREATER_EQUAL: operator.ge,
+        TokenType.LESS: operator.lt,
+        TokenType.LESS_EQUAL: operator.le,
+        TokenType.BANG_EQUAL: operator.ne,
+        TokenType.EQUAL_EQUAL: operator.eq,
+    }
+    INTEGER_OPERATORS: dict[TokenType, Callable[[any, any], any]] = {
+        TokenType.STAR_STAR: operator.pow,
+        TokenType.AMPERSAND: operator.and_,
+        TokenType.BAR: operator.or_,
+        TokenType.CARROT: operator.xor,
+        TokenType.LESS_LESS: operator.lshift,
+        TokenType.GREATER_GREATER: operator.rshift,
+    }
+
+    # Handler a Binary node is quickened to by its operator and the type of both operands, each one
+    # does exactly what the generic path does for operands of that type without checking them
+    QUICK_BINARY: dict[tuple[TokenType, type], Callable[[any, any], any]] = {
+        **{(type_, int): handler for type_, handler in (NUMBER_OPERATORS | INTEGER_OPERATORS).items()},
+        **{(type_, float): handler for type_, handler in NUMBER_OPERATORS.items()},
+        (TokenType.PLUS, str): concatenate,
+        (TokenType.BANG_EQUAL, str): operator.ne,
+        (TokenType.EQUAL_EQUAL, str): operator.eq,
+    }
+
+    # Quickened entry of a node which has deoptimized, it stays on the generic path
+    GENERIC: tuple[None, None] = (None, None)
+
+    def __init__(self, errorManager: ErrorManager, symbols: SymbolTable) -> None:
         self.errorManager: ErrorManager = errorManager
-        self.globals: Environment = Environment(self.errorManager, None)
-        self.environment = self.globals
-        self.locals: dict[Expr.Expr, int] = {}
+        self.symbols: SymbolTable = symbols
+        self.globals: GlobalEnvironment = GlobalEnvironment()
+        self.environment: Environment|GlobalEnvironment = self.globals
+        # Where print statements write, embedders can swap in their own
+        self.output: Output = Output()
+        # (access, depth, slot) of every local variable reference, for upvalues the slot is the index in the upvalues
+        self.locals: dict[Expr.Expr, tuple[Access, int, int]] = {}
+        # (slot, captured) that a local Var or Function declaration stores into
+        self.slots: dict[Stmt.Stmt, tuple[int, bool]] = {}
+        # Number of slots in the frame for each Function and each Block which declares something, other blocks get no frame
+        self.frameSizes: dict[Stmt.Stmt, int] = {}
+        # (access, depth, slot) of the cells each Function captures when it is declared
+        self.upvalues: dict[Stmt.Function, tuple[tuple[Access, int, int], ...]] = {}
+        # Slots of the parameters of each Function which closures capture
+        self.parameterCells: dict[Stmt.Function, tuple[int, ...]] = {}
+        # The call each return statement in tail position returns
+        self.tailCalls: dict[Stmt.Return, Expr.Call] = {}
+        # Functions without side effects, which can be memoized
+        self.pureFunctions: dict[Stmt.Function, bool] = {}
+        # (operand type, handler) of each Binary and Unary node specialized to the one type of operand it has seen
+        self.quickened: dict[Expr.Expr, tuple[type, Callable]] = {}
+        # For statements which can run as counted loops, None for those which can't, filled in as they first run
+        self.countedLoops: dict[Stmt.For, CountedLoop | None] = {}
+        # How to set up the frame for calls of each Function, filled in as they are first declared
+        self.callPlans: dict[Stmt.Function, CallPlan] = {}
+        # Inline cache of each Get, Set and property Call callee, filled in as they first run
+        self.propertyCaches: dict[Expr.Expr, PropertyCache] = {}
+        # Set by a return statement just before it signals Signal.RETURN
+        self.returnValue: any = None
+
+        # Memoize every pure function rather than only those annotated with @memo
+        self.memoize: bool = False
+        # Most results each memoized closure keeps
+        self.memoSize: int = 1024
+        self.memoStats: dict[Stmt.Function, MemoStats] = {}
+        # Live closures of each memoized Function, whose results are dropped if it stops being pure
+        self.memoized: dict[Stmt.Function, weakref.WeakSet[MemoizedFunction]] = {}
+        # (function, arguments) set by a tail call just before it signals Signal.TAIL_CALL
+        self.tailCall: tuple[LoxFunction, list[any]] | None = None
 
         # Add builtin functions
-        self.globals.define("clock", Builtins.Clock())
-        self.globals.define("str", Builtins.Str())
+        self.globals.define(self.symbols.intern("clock"), Builtins.Clock())
+        self.globals.define(self.symbols.intern("str"), Builtins.Str())
+        self.globals.define(self.symbols.intern("len"), Builtins.Len())
+        self.globals.define(self.symbols.intern("push"), Builtins.Push())
+        self.globals.define(self.symbols.intern("sum"), Builtins.Sum())
+        self.globals.define(self.symbols.intern("map"), Builtins.Map())
+        self.globals.define(self.symbols.intern("filter"), Builtins.Filter())
+        self.globals.define(self.symbols.intern("sort"), Builtins.Sort())
+        self.globals.define(self.symbols.intern("range"), Builtins.Range())
+        self.globals.define(self.symbols.intern("has"), Builtins.Has())
+        self.globals.define(self.symbols.intern("keys"), Builtins.Keys())
+        self.globals.define(self.symbols.intern("values"), Builtins.Values())
+        self.globals.define(self.symbols.intern("delete"), Builtins.Delete())
+        self.globals.define(self.symbols.intern("size"), Builtins.Size())
 
     def evaluate(self, expr: Expr.Expr) -> any:
         return expr.accept(self)
@@ -38,16 +135,74 @@ class Interpreter:
                 raise RuntimeError(operator, f"Operand must be one of the following types: {', '.join(str(t.__name__) for t in types)}")
         return
 
-    def resolve(self, expr: Expr.Expr, depth: int) -> None:
-        self.locals[expr] = depth
+    def resolve(self, expr: Expr.Expr, access: Access, depth: int, slot: int) -> None:
+        self.locals[expr] = (access, depth, slot)
 
-    def lookUpVariable(self, expr: Expr.Variable) -> any:
-        distance: int|None = self.locals.get(expr, None)
-        if distance is not None:
-            return self.environment.getAt(expr.name.lexeme, distance)
+    def resolveDeclaration(self, stmt: Stmt.Var | Stmt.Function, slot: int, captured: bool) -> None:
+        self.slots[stmt] = (slot, captured)
+
+    def resolveUpvalues(self, function: Stmt.Function, upvalues: tuple[tuple[Access, int, int], ...]) -> None:
+        self.upvalues[function] = upvalues
+
+    def resolveParameterCells(self, function: Stmt.Function, slots: tuple[int, ...]) -> None:
+        self.parameterCells[function] = slots
+
+    def resolveTailCall(self, stmt: Stmt.Return, call: Expr.Call) -> None:
+        self.tailCalls[stmt] = call
+
+    def resolvePure(self, function: Stmt.Function) -> None:
+        self.pureFunctions[function] = True
+
+    def forgetPure(self, function: Stmt.Function) -> None:
+        """
+        Stops memoizing a function a later REPL line made impure, by assigning to something it reads
+        """
+        self.pureFunctions.pop(function, None)
+        for closure in self.memoized.pop(function, ()):
+            closure.forget()
+
+    def resolveFrame(self, node: Stmt.Block | Stmt.Function, size: int) -> None:
+        self.frameSizes[node] = size
+
+    def resolutionSizes(self) -> dict[str, int]:
+        return {name: len(getattr(self, name)) for name in Interpreter.RESOLUTION_TABLES}
+
+    def resolutionSince(self, sizes: dict[str, int]) -> dict[str, dict]:
+        """
+        Entries added to the resolution tables since resolutionSizes() returned sizes
+        """
+        return {name: dict(itertools.islice(getattr(self, name).items(), sizes[name], None)) for name in Interpreter.RESOLUTION_TABLES}
+
+    def loadResolution(self, resolution: dict[str, dict]) -> None:
+        for name, table in resolution.items():
+            getattr(self, name).update(table)
+
+    def declare(self, stmt: Stmt.Var | Stmt.Function | Stmt.Class, value: any) -> None:
+        declaration: tuple[int, bool]|None = self.slots.get(stmt)
+        if declaration is None:
+            self.globals.define(stmt.name.symbol, value)
+        elif declaration[1]:
+            self.environment.define(declaration[0], Cell(value))
         else:
+            self.environment.define(declaration[0], value)
+
+    def capture(self, access: Access, depth: int, slot: int) -> Cell:
+        if access == Access.CELL:
+            return self.environment.getAt(depth, slot)
+        return self.environment.upvalues[slot]
+
+    def lookUpVariable(self, expr: Expr.Variable | Expr.This | Expr.Super) -> any:
+        local: tuple[Access, int, int]|None = self.locals.get(expr)
+        if local is None:
             return self.globals.get(expr.name)
 
+        access, depth, slot = local
+        if access == Access.LOCAL:
+            return self.environment.getAt(depth, slot)
+        elif access == Access.CELL:
+            return self.environment.getAt(depth, slot).value
+        return self.environment.upvalues[slot].value
+
     # Expression visitors
 
     def visitLiteralExpr(self, expr: Expr.Literal) -> any:
@@ -65,11 +220,26 @@ class Interpreter:
     def visitUnaryExpr(self, expr: Expr.Unary) -> any:
         right: any = self.evaluate(expr.right)
 
-        match expr.operator.type:
+        quickened: tuple[type, Callable] | None = self.quickened.get(expr)
+        if quickened is not None:
+            operandType, handler = quickened
+            if type(right) is operandType:
+                return handler(right)
+            if operandType is not None:
+                self.quickened[expr] = Interpreter.GENERIC
+
+        value: any = self.unaryOperation(expr.operator, right)
+        if quickened is None and expr.operator.type == TokenType.MINUS:
+            # Only negation is worth specializing, and it succeeded so right is a number
+            self.quickened[expr] = (type(right), operator.neg)
+        return value
+
+    def unaryOperation(self, operator: Token, right: any) -> any:
+        match operator.type:
             case TokenType.BANG:
                 return not self.isTruthy(right)
             case TokenType.MINUS:
-                self.checkTypeOfOperands(expr.operator, types=(int,float), operands=[right])
+                self.checkTypeOfOperands(operator, types=(int,float), operands=[right])
                 return -right
 
         raise Exception("Unreachable")
@@ -96,14 +266,31 @@ class Interpreter:
         left: any = self.evaluate(expr.left)
         right: any = self.evaluate(expr.right)
 
+        quickened: tuple[type, Callable] | None = self.quickened.get(expr)
+        if quickened is not None:
+            operandType, handler = quickened
+            if type(left) is operandType and type(right) is operandType:
+                return handler(left, right)
+            if operandType is not None:
+                # Deoptimize, a node which has seen more than one type of operand stays generic
+                self.quickened[expr] = Interpreter.GENERIC
+
+        value: any = self.binaryOperation(expr.operator, left, right)
+        if quickened is None and type(left) is type(right):
+            handler: Callable[[any, any], any] | None = Interpreter.QUICK_BINARY.get((expr.operator.type, type(left)))
+            if handler is not None:
+                self.quickened[expr] = (type(left), handler)
+        return value
+
+    def binaryOperation(self, operator: Token, left: any, right: any) -> any:
         # Operand checks
-        match expr.operator.type:
+        match operator.type:
             case TokenType.MINUS | TokenType.SLASH | TokenType.STAR | TokenType.GREATER | TokenType.GREATER_EQUAL | TokenType.LESS | TokenType.LESS_EQUAL:
-                self.checkTypeOfOperands(expr.operator, types=(int,float), operands=[left, right])
+                self.checkTypeOfOperands(operator, types=(int,float), operands=[left, right])
             case TokenType.AMPERSAND | TokenType.BAR | TokenType.CARROT | TokenType.STAR_STAR | TokenType.LESS_LESS | TokenType.GREATER_GREATER:
-                self.checkTypeOfOperands(expr.operator, types=(int,), operands=[left, right])
+                self.checkTypeOfOperands(operator, types=(int,), operands=[left, right])
 
-        match expr.operator.type:
+        match operator.type:
             # Arithmetic
             case TokenType.MINUS:
                 return left - right
@@ -114,9 +301,11 @@ class Interpreter:
             case TokenType.STAR_STAR:
                 return left ** right
             case TokenType.PLUS:
-                if (isinstance(left, (float, int)) and isinstance(right, (float, int))) or (isinstance(left, str) and isinstance(right, str)):
+                if isinstance(left, (float, int)) and isinstance(right, (float, int)):
                     return left + right
-                raise RuntimeError(expr.operator, f"Cannot add types of {type(left).__name__} and {type(right).__name__}")
+                if isinstance(left, STRING) and isinstance(right, STRING):
+                    return concatenate(left, right)
+                raise RuntimeError(operator, f"Cannot add types of {typeName(left)} and {typeName(right)}")
 
             # Bitwise
             case TokenType.AMPERSAND:
@@ -146,111 +335,362 @@ class Interpreter:
             case TokenType.EQUAL_EQUAL:
                 return bool(left == right)
 
-        raise Exception(f"Unreachable, operator: {expr.operator}")
+        raise Exception(f"Unreachable, operator: {operator}")
 
     def visitCallExpr(self, expr: Expr.Call) -> any:
+        callee, arguments = self.evaluateCall(expr)
+        try:
+            return callee.call(self, arguments)
+        except NativeError as error:
+            raise RuntimeError(expr.paren, error.message)
+        except RecursionError:
+            # Calls other than tail calls nest Python calls, so deep recursion runs out of Python stack.
+            # Raised again further out if even this runs out, until one succeeds.
+            raise RuntimeError(expr.paren, "Stack overflow")
+
+    def evaluateCall(self, expr: Expr.Call) -> tuple[LoxCallable, list[any]]:
+        """
+        The callee of expr and the arguments to call it with, once they are checked
+        """
+        if type(expr.callee) is Expr.Get:
+            object: any = self.evaluate(expr.callee.object)
+            return self.invocation(expr, self.propertyCache(expr.callee), object, [self.evaluate(arg) for arg in expr.arguments])
         callee: any = self.evaluate(expr.callee)
         arguments: list[any] = [self.evaluate(arg) for arg in expr.arguments]
+        self.checkCall(expr, callee, len(arguments))
+        return callee, arguments
+
+    def invocation(self, expr: Expr.Call, cache: PropertyCache, object: any, arguments: list[any]) -> tuple[LoxCallable, list[any]]:
+        """
+        The callee and arguments of expr, which calls a property of object. A method is called
+        without binding it to object, which is passed as its first argument instead.
+        """
+        name: Token = expr.callee.name
+        try:
+            method: any = findMethod(object, name.lexeme, cache)
+        except NativeError as error:
+            raise RuntimeError(name, error.message)
+        if method is None:
+            callee: any = object.values[cache.slot]
+            self.checkCall(expr, callee, len(arguments))
+            return callee, arguments
+        if len(arguments) != method.arity() - 1:
+            raise RuntimeError(expr.paren, f"Expected {method.arity() - 1} arguments but got {len(arguments)}")
+        arguments.insert(0, object)
+        return method, arguments
+
+    def propertyCache(self, expr: Expr.Expr) -> PropertyCache:
+        cache: PropertyCache | None = self.propertyCaches.get(expr)
+        if cache is None:
+            cache = self.propertyCaches[expr] = PropertyCache()
+        return cache
+
+    def visitGetExpr(self, expr: Expr.Get) -> any:
+        return self.readProperty(expr, self.propertyCache(expr), self.evaluate(expr.object))
+
+    def readProperty(self, expr: Expr.Get, cache: PropertyCache, object: any) -> any:
+        try:
+            return getProperty(object, expr.name.lexeme, cache)
+        except NativeError as error:
+            raise RuntimeError(expr.name, error.message)
+
+    def visitSetExpr(self, expr: Expr.Set) -> any:
+        object: any = self.evaluate(expr.object)
+        return self.writeProperty(expr, self.propertyCache(expr), object, self.evaluate(expr.value))
+
+    def writeProperty(self, expr: Expr.Set, cache: PropertyCache, object: any, value: any) -> any:
+        try:
+            return setProperty(object, expr.name.lexeme, value, cache)
+        except NativeError as error:
+            raise RuntimeError(expr.name, error.message)
+
+    def visitThisExpr(self, expr: Expr.This) -> any:
+        return self.lookUpVariable(expr)
+
+    def visitSuperExpr(self, expr: Expr.Super) -> any:
+        return self.lookUpSuper(expr, self.lookUpVariable(expr), self.evaluate(expr.receiver))
 
+    def lookUpSuper(self, expr: Expr.Super, superclass: LoxClass, receiver: any) -> any:
+        try:
+            return superMethod(superclass, receiver, expr.method.lexeme)
+        except NativeError as error:
+            raise RuntimeError(expr.method, error.message)
+
+    def callNative(self, expr: Expr.Call, callee: LoxCallable, arguments: list[any]) -> any:
+        """
+        Call anything but a Lox function, reporting the errors of builtins at expr
+        """
+        try:
+            return callee.call(self, arguments)
+        except NativeError as error:
+            raise RuntimeError(expr.paren, error.message)
+
+    def callback(self, callee: any, arguments: list[any]) -> any:
+        """
+        Call a Lox value from a builtin, such as the function given to map
+        """
         if not isinstance(callee, LoxCallable):
-            raise RuntimeError(expr.paren, "Did not find function or class")
+            raise NativeError("Did not find function or class")
         elif len(arguments) != callee.arity():
-            raise RuntimeError(expr.paren, f"Expected {callee.arity()} arguments but got {len(arguments)}")
+            raise NativeError(f"Expected {callee.arity()} arguments but got {len(arguments)}")
         return callee.call(self, arguments)
 
+    def visitArrayExpr(self, expr: Expr.Array) -> any:
+        return LoxArray.of([self.evaluate(element) for element in expr.elements])
+
+    def visitMapExpr(self, expr: Expr.Map) -> any:
+        pairs: list[any] = []
+        for key, value in zip(expr.keys, expr.values):
+            pairs.append(self.evaluate(key))
+            pairs.append(self.evaluate(value))
+        return self.makeMap(expr.brace, pairs)
+
+    def makeMap(self, brace: Token, pairs: list[any]) -> LoxMap:
+        try:
+            return LoxMap.of(pairs)
+        except NativeError as error:
+            raise RuntimeError(brace, error.message)
+
+    def visitIndexExpr(self, expr: Expr.Index) -> any:
+        return self.getElement(expr.bracket, self.evaluate(expr.object), self.evaluate(expr.index))
+
+    def getElement(self, bracket: Token, object: any, index: any) -> any:
+        try:
+            return getIndex(object, index)
+        except NativeError as error:
+            raise RuntimeError(bracket, error.message)
+
+    def visitSetIndexExpr(self, expr: Expr.SetIndex) -> any:
+        object: any = self.evaluate(expr.object)
+        index: any = self.evaluate(expr.index)
+        return self.setElement(expr.bracket, object, index, self.evaluate(expr.value))
+
+    def setElement(self, bracket: Token, object: any, index: any, value: any) -> any:
+        try:
+            return setIndex(object, index, value)
+        except NativeError as error:
+            raise RuntimeError(bracket, error.message)
+
+    def checkCall(self, expr: Expr.Call, callee: any, argumentCount: int) -> None:
+        if not isinstance(callee, LoxCallable):
+            raise RuntimeError(expr.paren, "Did not find function or class")
+        elif argumentCount != callee.arity():
+            raise RuntimeError(expr.paren, f"Expected {callee.arity()} arguments but got {argumentCount}")
+
     def visitAssignExpr(self, expr: Expr.Assign) -> any:
-        value: any = self.evaluate(expr.value)
-        distance: int|None = self.locals.get(expr, None)
-        if distance is not None:
-            self.environment.assignAt(expr.name, distance, value)
-        else:
+        return self.assignVariable(expr, self.evaluate(expr.value))
+
+    def assignVariable(self, expr: Expr.Assign, value: any) -> any:
+        local: tuple[Access, int, int]|None = self.locals.get(expr)
+        if local is None:
             self.globals.assign(expr.name, value)
+            return value
+
+        access, depth, slot = local
+        if access == Access.LOCAL:
+            self.environment.assignAt(depth, slot, value)
+        elif access == Access.CELL:
+            self.environment.getAt(depth, slot).value = value
+        else:
+            self.environment.upvalues[slot].value = value
         return value
 
-    # Statement visitors
+    # Statement visitors, these return the Signal of a statement which doesn't fall through
 
-    def execute(self, stmt: Stmt.Stmt) -> None:
-        stmt.accept(self)
+    def execute(self, stmt: Stmt.Stmt) -> Signal | None:
+        return stmt.accept(self)
 
-    def executeBlock(self, statements: list[Stmt.Stmt], environment: Environment) -> None:
+    def executeBlock(self, statements: list[Stmt.Stmt], environment: Environment) -> Signal | None:
+        # A RuntimeError ends the script, interpret puts the environment back for the REPL
         previous: Environment = self.environment
-        try:
-            self.environment = environment
-            for stmt in statements:
-                self.execute(stmt)
-        finally:
-            self.environment = previous
-
-    def visitBlockStmt(self, stmt: Stmt.Block) -> None:
-        self.executeBlock(stmt.statements, Environment(self.errorManager, self.environment))
+        self.environment = environment
+        for stmt in statements:
+            signal: Signal | None = stmt.accept(self)
+            if signal is not None:
+                self.environment = previous
+                return signal
+        self.environment = previous
+        return None
 
-    def visitControlStmt(self, stmt: Stmt.Control) -> None:
+    def visitBlockStmt(self, stmt: Stmt.Block) -> Signal | None:
+        size: int | None = self.frameSizes.get(stmt)
+        if size is None:
+            # The block declares nothing, so it runs in the enclosing environment
+            for inner in stmt.statements:
+                signal: Signal | None = inner.accept(self)
+                if signal is not None:
+                    return signal
+            return None
+        return self.executeBlock(stmt.statements, Environment(self.environment, [None] * size, self.environment.upvalues))
+
+    def visitControlStmt(self, stmt: Stmt.Control) -> Signal | None:
         if stmt.control.type == TokenType.BREAK:
-            raise Break(stmt.control)
+            return Signal.BREAK
         elif stmt.control.type == TokenType.CONTINUE:
-            raise Continue(stmt.control)
+            return Signal.CONTINUE
         else:
             raise Exception("Unreachable")
 
-    def visitReturnStmt(self, stmt: Stmt.Return) -> None:
-        value: any = None
-        if stmt.value is not None:
-            value = self.evaluate(stmt.value)
-        raise Return(value)
-
-    def visitPrintStmt(self, stmt: Stmt.Print) -> None:
+    def visitReturnStmt(self, stmt: Stmt.Return) -> Signal | None:
+        call: Expr.Call | None = self.tailCalls.get(stmt)
+        if call is not None:
+            callee, arguments = self.evaluateCall(call)
+            if isinstance(callee, LoxFunction):
+                # Leave the call to the trampoline in LoxFunction.call, once this frame is gone
+                self.tailCall = (callee, arguments)
+                return Signal.TAIL_CALL
+            self.returnValue = self.callNative(call, callee, arguments)
+        elif stmt.value is not None:
+            self.returnValue = self.evaluate(stmt.value)
+        return Signal.RETURN
+
+    def visitPrintStmt(self, stmt: Stmt.Print) -> Signal | None:
         value: any = self.evaluate(stmt.expression)
-        print(self.stringify(value))
+        self.output.write(self.stringify(value))
+        return None
 
-    def visitExpressionStmt(self, stmt: Stmt.Expression) -> None:
+    def visitExpressionStmt(self, stmt: Stmt.Expression) -> Signal | None:
         self.evaluate(stmt.expression)
+        return None
 
-    def visitForStmt(self, stmt: Stmt.For) -> None:
+    def visitForStmt(self, stmt: Stmt.For) -> Signal | None:
         if stmt.initializer is not None:
             self.execute(stmt.initializer)
 
-        while self.isTruthy(self.evaluate(stmt.condition)):
-            try:
-                self.execute(stmt.body)
-            except Break:
-                break
-            except Continue:
-                if stmt.increment is not None:
-                    self.execute(stmt.increment)
-                continue
+        if stmt not in self.countedLoops:
+            self.countedLoops[stmt] = CountedLoop.recognize(self, stmt)
+        counted: CountedLoop | None = self.countedLoops[stmt]
+        if counted is not None:
+            values: range | None = counted.range(self.environment)
+            if values is not None:
+                return self.executeCountedLoop(stmt, counted.slot, values)
 
+        while self.isTruthy(self.evaluate(stmt.condition)):
+            signal: Signal | None = stmt.body.accept(self)
+            if signal is not None:
+                if signal is Signal.BREAK:
+                    break
+                elif signal is not Signal.CONTINUE:
+                    # Returning leaves the function
+                    return signal
+
+            # Continuing still runs the increment
             if stmt.increment is not None:
-                self.execute(stmt.increment)
+                self.evaluate(stmt.increment)
+        return None
+
+    def executeCountedLoop(self, stmt: Stmt.For, slot: int, values: range) -> Signal | None:
+        """
+        Run the body with the loop variable set to each value in turn, without evaluating the condition or increment
+        """
+        frame: list[any] = self.environment.values
+        body: Stmt.Stmt = stmt.body
+        for value in values:
+            frame[slot] = value
+            signal: Signal | None = body.accept(self)
+            if signal is not None:
+                if signal is Signal.BREAK:
+                    return None
+                elif signal is not Signal.CONTINUE:
+                    return signal
+
+        # Leave the variable at the first value which failed the condition, like the general path does
+        frame[slot] = values.start + len(values) * values.step
+        return None
+
+    def visitFunctionStmt(self, stmt: Stmt.Function) -> Signal | None:
+        declaration: tuple[int, bool]|None = self.slots.get(stmt)
+        if declaration is not None and declaration[1]:
+            # The function may capture itself, so its cell has to exist before the upvalues are gathered
+            cell: Cell = Cell()
+            self.environment.define(declaration[0], cell)
+            cell.value = self.makeFunction(stmt)
+        else:
+            self.declare(stmt, self.makeFunction(stmt))
+        return None
 
-    def visitFunctionStmt(self, stmt: Stmt.Function) -> None:
-        function: LoxFunction = LoxFunction(stmt, self.environment)
-        self.environment.define(stmt.name.lexeme, function)
+    def visitClassStmt(self, stmt: Stmt.Class) -> Signal | None:
+        self.defineClass(stmt, self.evaluate(stmt.superclass) if stmt.superclass is not None else None)
         return None
 
-    def visitIfStmt(self, stmt: Stmt.If) -> None:
+    def defineClass(self, stmt: Stmt.Class, superclass: any) -> None:
+        if stmt.superclass is not None and type(superclass) is not LoxClass:
+            raise RuntimeError(stmt.superclass.name, "Superclass must be a class")
+
+        cell: Cell | None = None
+        declaration: tuple[int, bool]|None = self.slots.get(stmt)
+        if declaration is not None and declaration[1]:
+            # Methods may capture the class, so its cell has to exist before the upvalues are gathered
+            cell = Cell()
+            self.environment.define(declaration[0], cell)
+
+        enclosing: Environment | GlobalEnvironment = self.environment
+        if superclass is not None:
+            # The frame of the scope holding super, which the methods capture
+            self.environment = Environment(enclosing, [Cell(superclass)], enclosing.upvalues)
+        methods: dict[str, LoxFunction] = {method.name.lexeme: self.makeFunction(method) for method in stmt.methods}
+        self.environment = enclosing
+
+        klass: LoxClass = LoxClass(stmt.name.lexeme, superclass, methods)
+        if cell is not None:
+            cell.value = klass
+        else:
+            self.declare(stmt, klass)
+
+    def makeFunction(self, stmt: Stmt.Function) -> LoxFunction:
+        plan: CallPlan = self.callPlan(stmt)
+        upvalues: tuple[Cell, ...] = tuple(self.capture(*upvalue) for upvalue in plan.captures) if plan.captures else ()
+        if stmt in self.pureFunctions:
+            annotations: set[str] = {annotation.lexeme for annotation in stmt.annotations}
+            if "memo" in annotations or (self.memoize and "nomemo" not in annotations):
+                closure: MemoizedFunction = MemoizedFunction(stmt, plan, upvalues, self.memoSize, self.memoStats.setdefault(stmt, MemoStats()))
+                self.memoized.setdefault(stmt, weakref.WeakSet()).add(closure)
+                return closure
+        return LoxFunction(stmt, plan, upvalues)
+
+    def callPlan(self, stmt: Stmt.Function) -> CallPlan:
+        plan: CallPlan | None = self.callPlans.get(stmt)
+        if plan is None:
+            plan = CallPlan(len(stmt.params), self.frameSizes[stmt], self.parameterCells[stmt], self.upvalues[stmt])
+            self.callPlans[stmt] = plan
+        return plan
+
+    def visitIfStmt(self, stmt: Stmt.If) -> Signal | None:
         if self.isTruthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.thenBranch)
+            return self.execute(stmt.thenBranch)
         elif stmt.elseBranch is not None:
-            self.execute(stmt.elseBranch)
+            return self.execute(stmt.elseBranch)
+        return None
 
-    def visitVarStmt(self, stmt: Stmt.Var) -> None:
+    def visitVarStmt(self, stmt: Stmt.Var) -> Signal | None:
         value: any = None
         if stmt.initializer is not None:
             value = self.evaluate(stmt.initializer)
-        self.environment.define(stmt.name.lexeme, value)
+        self.declare(stmt, value)
+        return None
 
-    def visitWhileStmt(self, stmt: Stmt.While) -> None:
+    def visitWhileStmt(self, stmt: Stmt.While) -> Signal | None:
         while self.isTruthy(self.evaluate(stmt.condition)):
-            try:
-                self.execute(stmt.body)
-            except Break:
-                break
-            except Continue:
-                continue
+            signal: Signal | None = stmt.body.accept(self)
+            if signal is not None:
+                if signal is Signal.BREAK:
+                    break
+                elif signal is not Signal.CONTINUE:
+                    # Returning leaves the function
+                    return signal
+        return None
 
     def interpret(self, statements: list[Stmt.Stmt]) -> None:
         try:
             for stmt in statements:
                 self.execute(stmt)
         except RuntimeError as error:
-            self.errorManager.runtimeError(error)
+            self.environment = self.globals
+            self.returnValue = None
+            self.tailCall = None
+            self.runtimeError(error)
+
+    def runtimeError(self, error: RuntimeError) -> None:
+        # What the script printed before the error has to show up before it
+        self.output.flush()
+        self.errorManager.runtimeError(error)
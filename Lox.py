@@ -3,71 +3,185 @@
 import argparse
 import readline # Use GNU readline features for the REPL
 import sys
+from typing import Iterable, TextIO
 
 import Expr
 import Stmt
 from ErrorManager import *
+from SymbolTable import SymbolTable
 from Token import Token
-from Scanner import Scanner
+from FastScanner import FastScanner
+from StreamScanner import StreamScanner
 from Parser import Parser
 from Interpreter import Interpreter
+from ClosureCompiler import ClosureCompiler
+from VM import VM
+from Transpiler import Transpiler
+from StackEvaluator import StackEvaluator
 from Resolver import Resolver
+from Optimizer import Optimizer
+from Purity import Purity
+from AstPrinter import AstPrinter
+from Output import FlushPolicy, Output
+from ScriptCache import CachedScript, ScriptCache
 
 class Lox:
 
-    def __init__(self):
+    ENGINES: tuple[str, ...] = ("tree", "stack", "closure", "vm", "python")
+
+    def __init__(self, cache: ScriptCache | None = None, engine: str = "tree", emitPython: str | None = None, optimize: bool = True, dumpAst: bool = False, maxDepth: int | None = None, output: Output | None = None):
         self.errorManager = ErrorManager()
-        self.interpreter = Interpreter(self.errorManager)
+
+        # Identifiers are interned once for the whole session so REPL lines and files agree on ids
+        self.symbols = SymbolTable()
+        # The Interpreter always holds the globals and the Resolver's side tables, other engines share them
+        self.interpreter = Interpreter(self.errorManager, self.symbols)
+        if output is not None:
+            self.interpreter.output = output
+        self.engine: Interpreter | StackEvaluator | ClosureCompiler | VM | Transpiler = self.interpreter
+        if engine == "stack":
+            self.engine = StackEvaluator(self.interpreter, maxDepth)
+        elif engine == "closure":
+            self.engine = ClosureCompiler(self.interpreter)
+        elif engine == "vm":
+            self.engine = VM(self.interpreter)
+        elif engine == "python":
+            self.engine = Transpiler(self.interpreter, emitPython)
+        self.cache: ScriptCache | None = cache
+        self.optimizer: Optimizer | None = Optimizer(self.interpreter) if optimize else None
+        self.dumpAst: bool = dumpAst
+        # Purity sees every REPL line, a later line can assign to a global an earlier function reads
+        self.purity: Purity = Purity(self.errorManager, self.interpreter)
 
     def run(self, source: str) -> None:
-        # Scan / lex the source input into a list of tokens
-        scanner: Scanner = Scanner(self.errorManager, source)
-        tokens: list[Token] = scanner.scanTokens()
+        # Scan / lex the source input into a compact token buffer, the source is already in memory
+        # so lexemes and line numbers are only pulled out of it for the tokens which need them
+        scanner: FastScanner = FastScanner(self.errorManager, source, self.symbols)
+        self.runTokens(scanner.scanTokenBuffer())
+
+    def runTokens(self, tokens: Iterable[Token]) -> None:
+        statements: list[Stmt.Stmt] | None = self.compile(tokens)
+        if statements is None:
+            return
+
+        # Run the interpreter
+        self.execute(statements)
 
-        # Convert the list of tokens into an AST
+    def compile(self, tokens: Iterable[Token]) -> list[Stmt.Stmt] | None:
+        # Convert the tokens into an AST, the parser pulls them from the scanner as it goes
         parser: Parser = Parser(self.errorManager, tokens)
         statements: list[Stmt.Stmt] = parser.parse()
 
         if self.errorManager.hadError:
-            return
+            return None
 
         # Pass over the AST and resolve refrences to variables
         resolver: Resolver = Resolver(self.errorManager, self.interpreter)
         resolver.resolve(statements)
 
+        # Find the functions without side effects, which can be memoized
+        self.purity.analyze(statements)
+
         if self.errorManager.hadError:
+            return None
+
+        return statements
+
+    def runCached(self, source: str) -> None:
+        script: CachedScript | None = self.cache.load(source, self.symbols)
+        if script is not None:
+            # Skip straight to the interpreter with the AST and resolution from a previous run
+            self.interpreter.loadResolution(script.resolution)
+            self.execute(script.statements)
             return
 
-        # Run the interpreter
-        self.interpreter.interpret(statements)
+        sizes: dict[str, int] = self.interpreter.resolutionSizes()
+        scanner: FastScanner = FastScanner(self.errorManager, source, self.symbols)
+        statements: list[Stmt.Stmt] | None = self.compile(scanner.iterTokens())
+        if statements is None:
+            return
+
+        self.cache.store(source, self.symbols, statements, self.interpreter.resolutionSince(sizes))
+        self.execute(statements)
+
+    def execute(self, statements: list[Stmt.Stmt]) -> None:
+        # Optimizing after the cache means it holds the plain AST, which serves runs with and without --no-optimize
+        if self.optimizer is not None:
+            statements = self.optimizer.optimize(statements)
+        if self.dumpAst:
+            print(AstPrinter().printStatements(statements), file=sys.stderr)
+
+        try:
+            self.engine.interpret(statements)
+        finally:
+            self.interpreter.output.flush()
 
     def runPrompt(self) -> None:
         try:
             while True:
+                # Nothing printed may still be waiting in the buffer when the prompt shows
+                self.interpreter.output.flush()
                 line = input("> ")
                 self.run(line)
                 self.errorManager.hadError = False
         except (KeyboardInterrupt, EOFError):
             return
 
-    def runFile(self, file: argparse.FileType) -> None:
-        source: str = file.read()
-        self.run(source)
+    def runFile(self, file: TextIO) -> None:
+        if self.cache is not None:
+            # The whole source is needed up front to look it up in the cache
+            self.runCached(file.read())
+        else:
+            # Stream the file through the scanner in chunks rather than reading it all up front
+            scanner: StreamScanner = StreamScanner(self.errorManager, file, self.symbols)
+            self.runTokens(scanner.iterTokens())
 
         if self.errorManager.hadError:
             sys.exit(1)
 
 def main(args) -> int:
-    lox = Lox()
-    if args.file:
-        lox.runFile(args.file)
-    else:
-        lox.runPrompt()
+    cache: ScriptCache | None = None
+    if args.cache_dir:
+        cache = ScriptCache(args.cache_dir, args.cache_size << 20)
+
+    # Emitting the generated Python means transpiling, so it implies the python engine
+    engine: str = "python" if args.emit_python else args.engine
+    policy: FlushPolicy | None = FlushPolicy[args.flush.upper()] if args.flush else None
+    output: Output = Output(bufferSize=args.output_buffer, policy=policy)
+    lox = Lox(cache, engine, args.emit_python, not args.no_optimize, args.dump_ast, args.max_depth, output)
+    lox.interpreter.memoize = args.memoize
+    lox.interpreter.memoSize = args.memo_size
+    try:
+        if args.file:
+            lox.runFile(args.file)
+        else:
+            lox.runPrompt()
+    finally:
+        if args.memo_stats:
+            printMemoStats(lox.interpreter)
 
     return 0
 
+def printMemoStats(interpreter: Interpreter) -> None:
+    for function, stats in interpreter.memoStats.items():
+        calls: int = stats.hits + stats.misses
+        rate: float = stats.hits / calls if calls else 0.0
+        print(f"memo {function.name.lexeme} [line {function.name.line}]: {stats.hits} hits, {stats.misses} misses ({rate:.0%} hit rate)", file=sys.stderr)
+
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("file", nargs="?", help="A lox script to execute", type=argparse.FileType(mode="r"))
+    ap.add_argument("--cache-dir", help="Cache compiled scripts in this directory and reuse them on later runs")
+    ap.add_argument("--cache-size", type=int, default=64, help="Maximum size of the script cache in MiB (default: %(default)s)")
+    ap.add_argument("--engine", choices=Lox.ENGINES, default="tree", help="How to execute scripts: walking the AST recursively or with an explicit stack, compiled to Python closures, compiled to bytecode for a VM or transpiled to Python source (default: %(default)s)")
+    ap.add_argument("--emit-python", metavar="PATH", help="Write the Python source the script is transpiled to into PATH, implies --engine python")
+    ap.add_argument("--max-depth", type=int, help=f"Deepest Lox recursion the stack engine allows before a stack overflow error (default: {StackEvaluator.MAX_DEPTH})")
+    ap.add_argument("--no-optimize", action="store_true", help="Run the AST as parsed, without folding constants or removing dead code")
+    ap.add_argument("--memoize", action="store_true", help="Memoize every pure function not annotated with @nomemo, rather than only those annotated with @memo (tree and stack engines)")
+    ap.add_argument("--memo-size", type=int, default=1024, help="Most results each memoized function keeps (default: %(default)s)")
+    ap.add_argument("--memo-stats", action="store_true", help="Print the cache hits and misses of memoized functions to stderr when done")
+    ap.add_argument("--output-buffer", type=int, default=Output.BUFFER_SIZE, metavar="CHARS", help="Characters of printed output to collect before writing them out (default: %(default)s)")
+    ap.add_argument("--flush", choices=[policy.name.lower() for policy in FlushPolicy], help="Write printed output after every line or once the buffer is full (default: line on a terminal, otherwise full)")
+    ap.add_argument("--dump-ast", action="store_true", help="Print the AST that is about to run to stderr")
     args = ap.parse_args()
     main(args)
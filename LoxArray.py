@@ -0,0 +1,132 @@
+from __future__ import annotations
+from array import array
+from typing import Callable
+from ErrorManager import NativeError
+from LoxMap import LoxMap, MapView
+from Rope import Rope
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class LoxArray:
+    """
+    The array value of Lox. Arrays holding only integers or only floats keep them unboxed in an
+    array.array, anything else goes in a list. Typed storage switches to a list for good once it is
+    given a value it can't hold, such as a string or an integer too large for 64 bits.
+    """
+
+    __slots__ = ("items",)
+
+    # Mutable, so not hashable and can't be a map key
+    __hash__ = None
+
+    # Typecode of the typed storage for arrays whose elements all have the type
+    TYPECODES: dict[type, str] = {int: "q", float: "d"}
+    MIN_INT: int = -(1 << 63)
+    MAX_INT: int = (1 << 63) - 1
+
+    # Typed arrays at least this long are sorted with NumPy if it is installed
+    NUMPY_SORT_LENGTH: int = 1024
+
+    # Arrays being turned into strings, so an array which contains itself is shown as [...]
+    printing: set[int] = set()
+
+    def __init__(self, items: list[any] | array) -> None:
+        self.items: list[any] | array = items
+
+    @staticmethod
+    def of(values: list[any]) -> LoxArray:
+        """
+        An array of values, in typed storage if they allow it. The array takes over the list.
+        """
+        if values:
+            elementType: type = type(values[0])
+            typecode: str | None = LoxArray.TYPECODES.get(elementType)
+            if typecode is not None and all(type(value) is elementType for value in values):
+                try:
+                    return LoxArray(array(typecode, values))
+                except OverflowError:
+                    pass
+        return LoxArray(values)
+
+    def __str__(self) -> str:
+        return self.format(LoxMap.show)
+
+    def format(self, stringify: Callable[[any], str]) -> str:
+        """
+        The array as a string, with stringify turning each element into one so engines can show their own values
+        """
+        if id(self) in LoxArray.printing:
+            return "[...]"
+        LoxArray.printing.add(id(self))
+        try:
+            return "[" + ", ".join(stringify(value) for value in self.items) + "]"
+        finally:
+            LoxArray.printing.discard(id(self))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def check(self, index: any) -> None:
+        if type(index) is not int:
+            raise NativeError("Index must be an integer")
+        if not 0 <= index < len(self.items):
+            raise NativeError(f"Index {index} is out of range for an array of length {len(self.items)}")
+
+    def get(self, index: any) -> any:
+        if type(index) is int and 0 <= index < len(self.items):
+            return self.items[index]
+        self.check(index)
+
+    def set(self, index: any, value: any) -> None:
+        self.check(index)
+        if type(self.items) is not list and not self.holds(value):
+            self.items = self.items.tolist()
+        self.items[index] = value
+
+    def push(self, value: any) -> None:
+        items: list[any] | array = self.items
+        if type(items) is list:
+            if not items:
+                # An empty array picks its storage with its first element
+                self.items = LoxArray.of([value]).items
+                return
+        elif not self.holds(value):
+            items = self.items = items.tolist()
+        items.append(value)
+
+    def holds(self, value: any) -> bool:
+        """
+        Whether the typed storage can hold value
+        """
+        if self.items.typecode == "d":
+            return type(value) is float
+        return type(value) is int and LoxArray.MIN_INT <= value <= LoxArray.MAX_INT
+
+    def sorted(self) -> LoxArray:
+        items: list[any] | array = self.items
+        if type(items) is not list:
+            if numpy is not None and len(items) >= LoxArray.NUMPY_SORT_LENGTH:
+                return LoxArray(array(items.typecode, numpy.sort(numpy.frombuffer(items, dtype=items.typecode)).tobytes()))
+            return LoxArray(array(items.typecode, sorted(items)))
+
+        try:
+            # Ropes are only ordered once they are plain strings
+            return LoxArray(sorted(items, key=lambda value: str(value) if type(value) is Rope else value))
+        except TypeError:
+            raise NativeError("Array elements must all be numbers or all be strings to sort them")
+
+def getIndex(object: any, index: any) -> any:
+    if type(object) is MapView:
+        raise NativeError("The keys or values of a map can't be indexed, sort them into an array first")
+    if type(object) is not LoxArray and type(object) is not LoxMap:
+        raise NativeError("Only arrays and maps can be indexed")
+    return object.get(index)
+
+def setIndex(object: any, index: any, value: any) -> any:
+    if type(object) is not LoxArray and type(object) is not LoxMap:
+        raise NativeError("Only arrays and maps can be indexed")
+    object.set(index, value)
+    return value
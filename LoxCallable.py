@@ -8,6 +8,9 @@ from abc import *
 
 class LoxCallable(ABC):
 
+    # Whether calls have no side effects and give the same result for the same arguments
+    pure: bool = False
+
     @abstractmethod
     def call(self, interpreter: Interpreter, arguments: list[any]) -> any:
         ...
@@ -0,0 +1,188 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from Interpreter import Interpreter
+
+from ErrorManager import NativeError
+from LoxCallable import LoxCallable
+
+class Shape:
+    """
+    The layout of a set of instances: which slot of their values each field is in. Instances of a class
+    start with its empty shape, and adding a field moves an instance along a transition to the shape
+    with that field as well, so instances which got the same fields in the same order share a shape.
+    A shape belongs to one class, so it also tells which methods an instance has.
+    """
+
+    __slots__ = ("klass", "fields", "transitions")
+
+    def __init__(self, klass: LoxClass, fields: dict[str, int]) -> None:
+        self.klass: LoxClass = klass
+        self.fields: dict[str, int] = fields
+        # The shape an instance of this one moves to when it gets a new field, by field name
+        self.transitions: dict[str, Shape] = {}
+
+    def withField(self, name: str) -> Shape:
+        shape: Shape | None = self.transitions.get(name)
+        if shape is None:
+            shape = self.transitions[name] = Shape(self.klass, {**self.fields, name: len(self.fields)})
+        return shape
+
+class LoxInstance:
+
+    __slots__ = ("shape", "values")
+
+    def __init__(self, shape: Shape) -> None:
+        self.shape: Shape = shape
+        # Field values in the slots given by the shape
+        self.values: list[any] = []
+
+    def __str__(self) -> str:
+        return f"<{self.shape.klass.name} instance>"
+
+class LoxClass(LoxCallable):
+    """
+    A class, called to make an instance. Methods take the instance as their first argument, the
+    methods of the superclass are copied in so finding any method is a single lookup. A class can't
+    change once it is declared.
+    """
+
+    def __init__(self, name: str, superclass: LoxClass | None = None, methods: dict[str, any] | None = None) -> None:
+        self.name: str = name
+        self.superclass: LoxClass | None = None
+        self.methods: dict[str, any] = {}
+        self.initializer: any = None
+        # Shape of new instances
+        self.shape: Shape = Shape(self, {})
+        if superclass is not None:
+            self.inherit(superclass)
+        for methodName, method in (methods or {}).items():
+            self.define(methodName, method)
+
+    def __str__(self) -> str:
+        return f"<class {self.name}>"
+
+    def inherit(self, superclass: LoxClass) -> None:
+        self.superclass = superclass
+        self.methods.update(superclass.methods)
+        self.initializer = superclass.initializer
+
+    def define(self, name: str, method: any) -> None:
+        self.methods[name] = method
+        if name == "init":
+            self.initializer = method
+
+    def arity(self) -> int:
+        # The initializer's first parameter is the instance
+        return self.initializer.arity() - 1 if self.initializer is not None else 0
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> LoxInstance:
+        instance: LoxInstance = LoxInstance(self.shape)
+        if self.initializer is not None:
+            interpreter.callback(self.initializer, [instance] + arguments)
+        return instance
+
+class BoundMethod(LoxCallable):
+    """
+    A method taken from an instance as a value. Calling a method straight away doesn't make one.
+    """
+
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver: LoxInstance, method: any) -> None:
+        self.receiver: LoxInstance = receiver
+        self.method: any = method
+
+    def __str__(self) -> str:
+        return str(self.method)
+
+    def __eq__(self, other: any) -> bool:
+        if type(other) is BoundMethod:
+            return self.receiver is other.receiver and self.method is other.method
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((id(self.receiver), id(self.method)))
+
+    def arity(self) -> int:
+        return self.method.arity() - 1
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> any:
+        return interpreter.callback(self.method, [self.receiver] + arguments)
+
+class PropertyCache:
+    """
+    Monomorphic inline cache of one property get, set or method call site. It keeps the last shape
+    seen there and what the property is for that shape, so while instances of the same shape come
+    through the property is found without looking up its name.
+    """
+
+    __slots__ = ("shape", "slot", "method", "next")
+
+    def __init__(self) -> None:
+        self.shape: Shape | None = None
+        # Slot of the field, or of the new field for a set which adds one
+        self.slot: int = -1
+        # The method when the property is one rather than a field
+        self.method: any = None
+        # For a set which adds the field, the shape the instance moves to
+        self.next: Shape | None = None
+
+    def lookUp(self, shape: Shape, name: str) -> None:
+        """
+        Fill the cache in with what name is for instances of shape, fields first and then methods
+        """
+        slot: int | None = shape.fields.get(name)
+        if slot is not None:
+            self.slot, self.method = slot, None
+        else:
+            method: any = shape.klass.methods.get(name)
+            if method is None:
+                raise NativeError(f"Undefined property: {name}")
+            self.slot, self.method = -1, method
+        self.shape = shape
+
+def getProperty(object: any, name: str, cache: PropertyCache) -> any:
+    if type(object) is not LoxInstance:
+        raise NativeError("Only instances have properties")
+    if object.shape is not cache.shape:
+        cache.lookUp(object.shape, name)
+    if cache.method is None:
+        return object.values[cache.slot]
+    return BoundMethod(object, cache.method)
+
+def setProperty(object: any, name: str, value: any, cache: PropertyCache) -> any:
+    if type(object) is not LoxInstance:
+        raise NativeError("Only instances have fields")
+    shape: Shape = object.shape
+    if shape is not cache.shape:
+        slot: int | None = shape.fields.get(name)
+        if slot is None:
+            cache.slot, cache.next = len(shape.fields), shape.withField(name)
+        else:
+            cache.slot, cache.next = slot, None
+        cache.shape = shape
+
+    if cache.next is None:
+        object.values[cache.slot] = value
+    else:
+        object.shape = cache.next
+        object.values.append(value)
+    return value
+
+def findMethod(object: any, name: str, cache: PropertyCache) -> any:
+    """
+    The method a call of object.name runs, which takes object as its first argument. None if the
+    property is a field, its value is then called like any other.
+    """
+    if type(object) is not LoxInstance:
+        raise NativeError("Only instances have properties")
+    if object.shape is not cache.shape:
+        cache.lookUp(object.shape, name)
+    return cache.method
+
+def superMethod(superclass: LoxClass, receiver: LoxInstance, name: str) -> BoundMethod:
+    method: any = superclass.methods.get(name)
+    if method is None:
+        raise NativeError(f"Undefined property: {name}")
+    return BoundMethod(receiver, method)
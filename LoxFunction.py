@@ -3,29 +3,140 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from Interpreter import Interpreter
 
+from collections import OrderedDict
 import Stmt
-from ExecutionFlow import Return
-from Environment import Environment
+from ExecutionFlow import Signal
+from Environment import Access, Cell, Environment
 from LoxCallable import LoxCallable
 
+class CallPlan:
+    """
+    How to set up the frame for a call of one function declaration, worked out from the resolution
+    tables the first time the declaration runs and shared by all its closures
+    """
+
+    __slots__ = ("arity", "locals", "parameterCells", "captures")
+
+    def __init__(self, arity: int, frameSize: int, parameterCells: tuple[int, ...], captures: tuple[tuple[Access, int, int], ...]) -> None:
+        self.arity: int = arity
+        # Parameters take the first slots of the frame, the locals of the body the rest
+        self.locals: list[None] = [None] * (frameSize - arity)
+        # Slots of the parameters closures capture, which have to be boxed in cells
+        self.parameterCells: tuple[int, ...] = parameterCells
+        # (access, depth, slot) of the cells a closure of the function captures, empty if it needs none
+        self.captures: tuple[tuple[Access, int, int], ...] = captures
+
+    def frame(self, arguments: list[any], upvalues: tuple[Cell, ...]) -> Environment:
+        """
+        The frame for a call with arguments, which callers pass in a list of their own so it can
+        become the frame's values
+        """
+        values: list[any] = arguments + self.locals if self.locals else arguments
+        for slot in self.parameterCells:
+            values[slot] = Cell(values[slot])
+        return Environment(None, values, upvalues)
+
 class LoxFunction(LoxCallable):
 
-    def __init__(self, declaration: Stmt.Function, closure: Environment) -> None:
+    def __init__(self, declaration: Stmt.Function, plan: CallPlan, upvalues: tuple[Cell, ...]) -> None:
         self.declaration: Stmt.Function = declaration
-        self.closure: Environment = closure
+        self.plan: CallPlan = plan
+        # Only the cells of the variables the function uses from enclosing functions are kept alive
+        self.upvalues: tuple[Cell, ...] = upvalues
 
     def __str__(self) -> str:
         return f"<fun {self.declaration.name.lexeme}>"
 
     def arity(self) -> int:
-        return len(self.declaration.params)
+        return self.plan.arity
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> any:
+        function: LoxFunction = self
+        while True:
+            signal: Signal | None = interpreter.executeBlock(function.declaration.body, function.bind(interpreter, arguments))
+            if signal is not Signal.TAIL_CALL:
+                break
+            # Trampoline: make the tail call from here rather than nesting it, so the Python stack stays flat
+            function, arguments = interpreter.tailCall
+            interpreter.tailCall = None
+
+        if signal is Signal.RETURN:
+            value: any = interpreter.returnValue
+            interpreter.returnValue = None
+            return value
+        return None
+
+    def bind(self, interpreter: Interpreter, arguments: list[any]) -> Environment:
+        """
+        The frame for a call of the function with arguments
+        """
+        return self.plan.frame(arguments, self.upvalues)
+
+class MemoStats:
+    """
+    Cache hits and misses of every memoized closure of one function declaration
+    """
+
+    __slots__ = ("hits", "misses")
+
+    def __init__(self) -> None:
+        self.hits: int = 0
+        self.misses: int = 0
+
+class MemoizedFunction(LoxFunction):
+    """
+    A pure function which remembers its results for the most recently used arguments. Each closure
+    has its own cache since closures of the same declaration can capture different values.
+    """
+
+    # Only immutable values make keys, paired with their type so 1, 1.0 and true stay apart
+    KEY_TYPES: tuple[type, ...] = (type(None), bool, int, float, str)
+
+    # Result of a lookup which missed
+    MISSING: object = object()
+
+    def __init__(self, declaration: Stmt.Function, plan: CallPlan, upvalues: tuple[Cell, ...], size: int, stats: MemoStats) -> None:
+        super().__init__(declaration, plan, upvalues)
+        self.size: int = size
+        self.stats: MemoStats = stats
+        self.results: OrderedDict[tuple, any] = OrderedDict()
+
+    def key(self, arguments: list[any]) -> tuple | None:
+        """
+        The cache key for a call with arguments, None if they can't be cached
+        """
+        if all(type(argument) in MemoizedFunction.KEY_TYPES for argument in arguments):
+            return tuple((type(argument), argument) for argument in arguments)
+        return None
+
+    def lookup(self, key: tuple) -> any:
+        result: any = self.results.get(key, MemoizedFunction.MISSING)
+        if result is MemoizedFunction.MISSING:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+            self.results.move_to_end(key)
+        return result
+
+    def store(self, key: tuple, result: any) -> None:
+        self.results[key] = result
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+    def forget(self) -> None:
+        """
+        Drops the results and keeps none from now on, once the function is no longer pure
+        """
+        self.results.clear()
+        self.size = 0
 
     def call(self, interpreter: Interpreter, arguments: list[any]) -> any:
-        environment = Environment(interpreter.errorManager, self.closure)
-        for i, argument in enumerate(arguments):
-            environment.define(self.declaration.params[i].lexeme, argument)
-
-        try:
-            interpreter.executeBlock(self.declaration.body, environment)
-        except Return as ret:
-            return ret.value
+        key: tuple | None = self.key(arguments)
+        if key is None:
+            return super().call(interpreter, arguments)
+
+        result: any = self.lookup(key)
+        if result is MemoizedFunction.MISSING:
+            result = super().call(interpreter, arguments)
+            self.store(key, result)
+        return result
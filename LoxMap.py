@@ -0,0 +1,131 @@
+from __future__ import annotations
+from typing import Callable, Iterator
+from ErrorManager import NativeError
+from Rope import Rope
+
+class LoxMap:
+    """
+    The map value of Lox, a Python dict. Keys match when == says they are equal, so 1, 1.0 and true
+    are the same key, and functions are keys by identity. Arrays and maps can change, so they can't
+    be keys.
+    """
+
+    __slots__ = ("entries",)
+
+    # Mutable, so not hashable and can't be a key itself
+    __hash__ = None
+
+    KEY_ERROR: str = "Arrays and maps can't be map keys"
+
+    # Result of a pop which missed
+    MISSING: object = object()
+
+    # Maps being turned into strings, so a map which contains itself is shown as {...}
+    printing: set[int] = set()
+
+    def __init__(self, entries: dict[any, any]) -> None:
+        self.entries: dict[any, any] = entries
+
+    @staticmethod
+    def of(pairs: list[any]) -> LoxMap:
+        """
+        A map of keys and values given alternately, later duplicates of a key win
+        """
+        result: LoxMap = LoxMap({})
+        for index in range(0, len(pairs), 2):
+            result.set(pairs[index], pairs[index + 1])
+        return result
+
+    @staticmethod
+    def show(value: any) -> str:
+        return "nil" if value is None else str(value)
+
+    def __str__(self) -> str:
+        return self.format(LoxMap.show)
+
+    def format(self, stringify: Callable[[any], str]) -> str:
+        """
+        The map as a string, with stringify turning each key and value into one so engines can show their own values
+        """
+        if id(self) in LoxMap.printing:
+            return "{...}"
+        LoxMap.printing.add(id(self))
+        try:
+            return "{" + ", ".join(f"{stringify(key)}: {stringify(value)}" for key, value in self.entries.items()) + "}"
+        finally:
+            LoxMap.printing.discard(id(self))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: any) -> any:
+        try:
+            return self.entries[key]
+        except KeyError:
+            raise NativeError(f"Key {LoxMap.show(key)} is not in the map")
+        except TypeError:
+            raise NativeError(LoxMap.KEY_ERROR)
+
+    def set(self, key: any, value: any) -> None:
+        if type(key) is Rope:
+            # Keys are kept flat, the pieces of the rope aren't needed again
+            key = str(key)
+        try:
+            self.entries[key] = value
+        except TypeError:
+            raise NativeError(LoxMap.KEY_ERROR)
+
+    def has(self, key: any) -> bool:
+        try:
+            return key in self.entries
+        except TypeError:
+            raise NativeError(LoxMap.KEY_ERROR)
+
+    def delete(self, key: any) -> bool:
+        """
+        Remove key, returning whether it was there
+        """
+        try:
+            return self.entries.pop(key, LoxMap.MISSING) is not LoxMap.MISSING
+        except TypeError:
+            raise NativeError(LoxMap.KEY_ERROR)
+
+class MapView:
+    """
+    The keys or the values of a map, which keys() and values() return rather than copying them into
+    an array. A view reads the map as it is when it is used, and can be iterated by the builtins but
+    not indexed, as a position in a map isn't a fast lookup.
+    """
+
+    __slots__ = ("map", "values")
+
+    # Changes with the map, so can't be a map key
+    __hash__ = None
+
+    def __init__(self, map: LoxMap, values: bool) -> None:
+        self.map: LoxMap = map
+        self.values: bool = values
+
+    def __iter__(self) -> Iterator[any]:
+        try:
+            yield from self.map.entries.values() if self.values else self.map.entries
+        except RuntimeError:
+            raise NativeError("Map changed size while iterating over it")
+
+    def __len__(self) -> int:
+        return len(self.map.entries)
+
+    def __str__(self) -> str:
+        return self.format(LoxMap.show)
+
+    def format(self, stringify: Callable[[any], str]) -> str:
+        """
+        The view as a string, shown like an array, with stringify turning each element into one
+        """
+        if id(self) in LoxMap.printing:
+            return "[...]"
+        LoxMap.printing.add(id(self))
+        try:
+            return "[" + ", ".join(stringify(value) for value in self) + "]"
+        finally:
+            LoxMap.printing.discard(id(self))
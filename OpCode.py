@@ -0,0 +1,60 @@
+from enum import IntEnum, auto
+
+class OpCode(IntEnum):
+    """
+    Instructions of the bytecode VM. Operands follow the opcode, each in its own code unit.
+    """
+    CONSTANT = 0    # index of the constant to push
+    NIL = auto()
+    TRUE = auto()
+    FALSE = auto()
+    POP = auto()
+
+    GET_LOCAL = auto()      # stack slot relative to the frame
+    SET_LOCAL = auto()      # stack slot relative to the frame
+    GET_UPVALUE = auto()    # index in the closure's upvalues
+    SET_UPVALUE = auto()    # index in the closure's upvalues
+    GET_GLOBAL = auto()     # index of the (symbol, name) constant
+    SET_GLOBAL = auto()     # index of the (symbol, name) constant
+    DEFINE_GLOBAL = auto()  # index of the (symbol, name) constant
+
+    EQUAL = auto()
+    NOT_EQUAL = auto()
+    GREATER = auto()
+    GREATER_EQUAL = auto()
+    LESS = auto()
+    LESS_EQUAL = auto()
+    ADD = auto()
+    SUBTRACT = auto()
+    MULTIPLY = auto()
+    DIVIDE = auto()
+    POWER = auto()
+    BIT_AND = auto()
+    BIT_OR = auto()
+    BIT_XOR = auto()
+    SHIFT_LEFT = auto()
+    SHIFT_RIGHT = auto()
+    NOT = auto()
+    NEGATE = auto()
+
+    PRINT = auto()
+    JUMP = auto()           # forward offset
+    JUMP_IF_FALSE = auto()  # forward offset, leaves the condition on the stack
+    LOOP = auto()           # backward offset
+    CALL = auto()           # argument count
+    CLOSURE = auto()        # index of the function constant, then an (is local, index) pair per upvalue
+    CLOSE_UPVALUE = auto()
+    RETURN = auto()
+
+    ARRAY = auto()          # number of elements on the stack
+    MAP = auto()            # number of key and value pairs on the stack
+    GET_INDEX = auto()
+    SET_INDEX = auto()
+
+    CLASS = auto()          # index of the class name constant
+    INHERIT = auto()
+    METHOD = auto()         # index of the method name constant
+    GET_PROPERTY = auto()   # index of the (name, PropertyCache) constant
+    SET_PROPERTY = auto()   # index of the (name, PropertyCache) constant
+    INVOKE = auto()         # index of the (name, PropertyCache) constant, then the argument count
+    GET_SUPER = auto()      # index of the method name constant
@@ -0,0 +1,246 @@
+import math
+from typing import Callable
+import Expr
+import Stmt
+from ErrorManager import *
+from Interpreter import Interpreter
+from Rope import STRING
+from TokenType import TokenType
+
+class Optimizer:
+    """
+    Rewrites the resolved AST before it runs: folds operations on literals into a single literal,
+    simplifies ternaries and logical operators with a constant condition, and drops code which can
+    never run. New nodes are only literals and empty blocks, so the Resolver's side tables stay valid.
+    """
+
+    # Operators whose result can grow without bound are only folded for small right operands
+    MAX_EXPONENT: int = 256
+
+    TERMINATORS: tuple[type, ...] = (Stmt.Return, Stmt.Control)
+
+    def __init__(self, interpreter: Interpreter) -> None:
+        self.interpreter: Interpreter = interpreter
+
+    def optimize(self, statements: list[Stmt.Stmt]) -> list[Stmt.Stmt]:
+        return self.statements(statements)
+
+    # Helper methods
+
+    def expr(self, expr: Expr.Expr) -> Expr.Expr:
+        return expr.accept(self)
+
+    def stmt(self, stmt: Stmt.Stmt) -> Stmt.Stmt:
+        """
+        Optimize a statement which has to stay a statement, such as the body of a loop
+        """
+        optimized: Stmt.Stmt | None = stmt.accept(self)
+        if optimized is None:
+            # Declares nothing so, like any such block, has no frame
+            optimized = Stmt.Block([])
+        return optimized
+
+    def statements(self, statements: list[Stmt.Stmt]) -> list[Stmt.Stmt]:
+        optimized: list[Stmt.Stmt] = []
+        for stmt in statements:
+            result: Stmt.Stmt | None = stmt.accept(self)
+            if result is not None:
+                optimized.append(result)
+            if isinstance(stmt, Optimizer.TERMINATORS):
+                # Nothing after a return, break or continue in the same block can run
+                break
+        return optimized
+
+    @staticmethod
+    def isConstant(expr: Expr.Expr) -> bool:
+        return isinstance(expr, (Expr.Literal, Expr.String))
+
+    @staticmethod
+    def constant(value: any) -> Expr.Expr | None:
+        """
+        The literal for a folded value, or None if it can't be written as one
+        """
+        if isinstance(value, STRING):
+            return Expr.String(str(value))
+        if isinstance(value, float) and not math.isfinite(value):
+            return None
+        return Expr.Literal(value)
+
+    def fold(self, expr: Expr.Expr, operation: Callable[[], any]) -> Expr.Expr:
+        """
+        Evaluate an operation on constants with the Interpreter's generic path, as it would at runtime.
+        If that would raise, the operation is left alone so the error is still reported when it runs.
+        """
+        try:
+            folded: Expr.Expr | None = Optimizer.constant(operation())
+        except (RuntimeError, ArithmeticError, ValueError):
+            return expr
+        return folded if folded is not None else expr
+
+    # Expression visitors
+
+    def visitArrayExpr(self, expr: Expr.Array) -> Expr.Expr:
+        expr.elements = [self.expr(element) for element in expr.elements]
+        return expr
+
+    def visitAssignExpr(self, expr: Expr.Assign) -> Expr.Expr:
+        expr.value = self.expr(expr.value)
+        return expr
+
+    def visitBinaryExpr(self, expr: Expr.Binary) -> Expr.Expr:
+        expr.left = self.expr(expr.left)
+        expr.right = self.expr(expr.right)
+        if not (Optimizer.isConstant(expr.left) and Optimizer.isConstant(expr.right)):
+            return expr
+
+        if expr.operator.type in (TokenType.STAR_STAR, TokenType.LESS_LESS):
+            if not isinstance(expr.right.value, int) or expr.right.value > Optimizer.MAX_EXPONENT:
+                return expr
+        return self.fold(expr, lambda: self.interpreter.binaryOperation(expr.operator, expr.left.value, expr.right.value))
+
+    def visitCallExpr(self, expr: Expr.Call) -> Expr.Expr:
+        expr.callee = self.expr(expr.callee)
+        expr.arguments = [self.expr(argument) for argument in expr.arguments]
+        return expr
+
+    def visitGetExpr(self, expr: Expr.Get) -> Expr.Expr:
+        expr.object = self.expr(expr.object)
+        return expr
+
+    def visitGroupingExpr(self, expr: Expr.Grouping) -> Expr.Expr:
+        expr.expression = self.expr(expr.expression)
+        if Optimizer.isConstant(expr.expression):
+            return expr.expression
+        return expr
+
+    def visitIndexExpr(self, expr: Expr.Index) -> Expr.Expr:
+        expr.object = self.expr(expr.object)
+        expr.index = self.expr(expr.index)
+        return expr
+
+    def visitLiteralExpr(self, expr: Expr.Literal) -> Expr.Expr:
+        return expr
+
+    def visitLogicalExpr(self, expr: Expr.Logical) -> Expr.Expr:
+        expr.left = self.expr(expr.left)
+        expr.right = self.expr(expr.right)
+        if not Optimizer.isConstant(expr.left):
+            return expr
+
+        # A constant left side either is the result or hands over to the right side
+        if bool(expr.left.value) == (expr.operator.type == TokenType.OR):
+            return expr.left
+        return expr.right
+
+    def visitMapExpr(self, expr: Expr.Map) -> Expr.Expr:
+        expr.keys = [self.expr(key) for key in expr.keys]
+        expr.values = [self.expr(value) for value in expr.values]
+        return expr
+
+    def visitSetExpr(self, expr: Expr.Set) -> Expr.Expr:
+        expr.object = self.expr(expr.object)
+        expr.value = self.expr(expr.value)
+        return expr
+
+    def visitSetIndexExpr(self, expr: Expr.SetIndex) -> Expr.Expr:
+        expr.object = self.expr(expr.object)
+        expr.index = self.expr(expr.index)
+        expr.value = self.expr(expr.value)
+        return expr
+
+    def visitStringExpr(self, expr: Expr.String) -> Expr.Expr:
+        return expr
+
+    def visitSuperExpr(self, expr: Expr.Super) -> Expr.Expr:
+        return expr
+
+    def visitTernaryExpr(self, expr: Expr.Ternary) -> Expr.Expr:
+        expr.condition = self.expr(expr.condition)
+        expr.trueExpr = self.expr(expr.trueExpr)
+        expr.falseExpr = self.expr(expr.falseExpr)
+        if not Optimizer.isConstant(expr.condition):
+            return expr
+        return expr.trueExpr if expr.condition.value else expr.falseExpr
+
+    def visitThisExpr(self, expr: Expr.This) -> Expr.Expr:
+        return expr
+
+    def visitUnaryExpr(self, expr: Expr.Unary) -> Expr.Expr:
+        expr.right = self.expr(expr.right)
+        if not Optimizer.isConstant(expr.right):
+            return expr
+        return self.fold(expr, lambda: self.interpreter.unaryOperation(expr.operator, expr.right.value))
+
+    def visitVariableExpr(self, expr: Expr.Variable) -> Expr.Expr:
+        return expr
+
+    # Statement visitors, these return None for a statement which can be dropped
+
+    def visitBlockStmt(self, stmt: Stmt.Block) -> Stmt.Stmt | None:
+        stmt.statements = self.statements(stmt.statements)
+        return stmt
+
+    def visitControlStmt(self, stmt: Stmt.Control) -> Stmt.Stmt | None:
+        return stmt
+
+    def visitClassStmt(self, stmt: Stmt.Class) -> Stmt.Stmt | None:
+        for method in stmt.methods:
+            method.body = self.statements(method.body)
+        return stmt
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression) -> Stmt.Stmt | None:
+        stmt.expression = self.expr(stmt.expression)
+        if Optimizer.isConstant(stmt.expression):
+            return None
+        return stmt
+
+    def visitFunctionStmt(self, stmt: Stmt.Function) -> Stmt.Stmt | None:
+        stmt.body = self.statements(stmt.body)
+        return stmt
+
+    def visitForStmt(self, stmt: Stmt.For) -> Stmt.Stmt | None:
+        if stmt.initializer is not None:
+            stmt.initializer = stmt.initializer.accept(self)
+        stmt.condition = self.expr(stmt.condition)
+        if Optimizer.isConstant(stmt.condition) and not stmt.condition.value:
+            # The initializer declares its variable in the enclosing scope, so it has to stay
+            return stmt.initializer
+
+        if stmt.increment is not None:
+            stmt.increment = self.expr(stmt.increment)
+            if Optimizer.isConstant(stmt.increment):
+                stmt.increment = None
+        stmt.body = self.stmt(stmt.body)
+        return stmt
+
+    def visitIfStmt(self, stmt: Stmt.If) -> Stmt.Stmt | None:
+        stmt.condition = self.expr(stmt.condition)
+        if Optimizer.isConstant(stmt.condition):
+            branch: Stmt.Stmt | None = stmt.thenBranch if stmt.condition.value else stmt.elseBranch
+            return branch.accept(self) if branch is not None else None
+
+        stmt.thenBranch = self.stmt(stmt.thenBranch)
+        if stmt.elseBranch is not None:
+            stmt.elseBranch = stmt.elseBranch.accept(self)
+        return stmt
+
+    def visitPrintStmt(self, stmt: Stmt.Print) -> Stmt.Stmt | None:
+        stmt.expression = self.expr(stmt.expression)
+        return stmt
+
+    def visitReturnStmt(self, stmt: Stmt.Return) -> Stmt.Stmt | None:
+        if stmt.value is not None:
+            stmt.value = self.expr(stmt.value)
+        return stmt
+
+    def visitVarStmt(self, stmt: Stmt.Var) -> Stmt.Stmt | None:
+        if stmt.initializer is not None:
+            stmt.initializer = self.expr(stmt.initializer)
+        return stmt
+
+    def visitWhileStmt(self, stmt: Stmt.While) -> Stmt.Stmt | None:
+        stmt.condition = self.expr(stmt.condition)
+        if Optimizer.isConstant(stmt.condition) and not stmt.condition.value:
+            return None
+        stmt.body = self.stmt(stmt.body)
+        return stmt
@@ -0,0 +1,68 @@
+from __future__ import annotations
+from enum import Enum, auto
+import io
+import sys
+from typing import TextIO
+
+class FlushPolicy(Enum):
+    """
+    When an Output writes what is waiting in its buffer out to its stream
+    """
+    # After every line, so output shows up as soon as it is printed
+    LINE = auto()
+    # Once the buffer holds bufferSize characters, and when the Output is flushed
+    FULL = auto()
+
+class Output:
+    """
+    Where the print statement writes. Lines are collected in a buffer and written out together, so a
+    script printing a lot doesn't make a write to the stream for every line. The Output has to be
+    flushed before anything else writes to the terminal: at exit, before an error is reported and
+    before the REPL reads a line.
+    """
+
+    BUFFER_SIZE: int = 1 << 16
+
+    def __init__(self, stream: TextIO | None = None, bufferSize: int = BUFFER_SIZE, policy: FlushPolicy | None = None) -> None:
+        # None means whatever sys.stdout is when the buffer is written out
+        self.stream: TextIO | None = stream
+        if policy is None:
+            # Like C stdio, a terminal gets each line straight away
+            policy = FlushPolicy.LINE if (stream or sys.stdout).isatty() else FlushPolicy.FULL
+        self.policy: FlushPolicy = policy
+        self.bufferSize: int = bufferSize
+        # Number of characters at which the buffer is written out
+        self.limit: int = 1 if policy is FlushPolicy.LINE else bufferSize
+        self.lines: list[str] = []
+        self.size: int = 0
+
+    def write(self, line: str) -> None:
+        """
+        Print line, it is ended with a newline
+        """
+        self.lines.append(line)
+        self.size += len(line) + 1
+        if self.size >= self.limit:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.lines:
+            return
+        stream: TextIO = self.stream or sys.stdout
+        self.lines.append("")
+        stream.write("\n".join(self.lines))
+        stream.flush()
+        self.lines.clear()
+        self.size = 0
+
+class MemoryOutput(Output):
+    """
+    Keeps what is printed in memory rather than writing it anywhere, for embedding Lox
+    """
+
+    def __init__(self) -> None:
+        super().__init__(io.StringIO(), policy=FlushPolicy.FULL)
+
+    def getvalue(self) -> str:
+        self.flush()
+        return self.stream.getvalue()
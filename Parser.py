@@ -1,31 +1,38 @@
+from typing import Iterable, Iterator
 import Expr
 import Stmt
 from ErrorManager import *
+from SymbolTable import SymbolTable
 from Token import Token
 from TokenType import TokenType
 
 class Parser:
 
-    def __init__(self, errorManager: ErrorManager, tokens: list[Token]) -> None:
+    def __init__(self, errorManager: ErrorManager, tokens: Iterable[Token]) -> None:
         self.errorManager = errorManager
-        self.tokens: list[Token] = tokens
-        self.current = 0
+
+        # The grammar only ever needs the current and the previous token, so consume the tokens
+        # lazily through a one token lookahead instead of indexing into a list of every token
+        self.tokens: Iterator[Token] = iter(tokens)
+        self.previousToken: Token | None = None
+        self.currentToken: Token = next(self.tokens)
 
     # Helper methods
 
     def previous(self) -> Token:
-        return self.tokens[self.current-1]
+        return self.previousToken
 
     def peek(self) -> Token:
-        return self.tokens[self.current]
+        return self.currentToken
 
     def atEnd(self) -> bool:
-        return self.peek().type == TokenType.EOF
+        return self.currentToken.type == TokenType.EOF
 
-    def advance(self) -> None:
+    def advance(self) -> Token:
         if not self.atEnd():
-            self.current += 1
-        return self.previous()
+            self.previousToken = self.currentToken
+            self.currentToken = next(self.tokens)
+        return self.previousToken
 
     def check(self, type_: TokenType) -> bool:
         if self.atEnd():
@@ -70,12 +77,19 @@ class Parser:
 
     def declaration(self) -> Stmt.Stmt:
         """
-        declaration :=    funDeclaration
+        declaration :=    classDeclaration
+                        | annotations? funDeclaration
                         | varDeclaration
                         | statement
         """
         try:
-            if self.match(TokenType.FUN):
+            if self.check(TokenType.AT):
+                annotations: list[Token] = self.annotations()
+                self.consume(TokenType.FUN, "Expected function declaration after annotations")
+                return self.function("function", annotations)
+            elif self.match(TokenType.CLASS):
+                return self.classDeclaration()
+            elif self.match(TokenType.FUN):
                 return self.function("function")
             elif self.match(TokenType.VAR):
                 return self.varDeclaration()
@@ -83,7 +97,39 @@ class Parser:
         except ParseError as e:
             self.synchronize()
 
-    def function(self, type: str) -> Stmt.Stmt:
+    def annotations(self) -> list[Token]:
+        """
+        annotations := ( "@" IDENTIFIER )+
+        """
+        annotations: list[Token] = []
+        while self.match(TokenType.AT):
+            annotations.append(self.consume(TokenType.IDENTIFIER, "Expected annotation name after \"@\""))
+        return annotations
+
+    def classDeclaration(self) -> Stmt.Stmt:
+        """
+        classDeclaration := "class" IDENTIFIER ( "<" IDENTIFIER )? "{" function* "}"
+        """
+        name: Token = self.consume(TokenType.IDENTIFIER, "Expected class name")
+        superclass: Expr.Variable | None = None
+        if self.match(TokenType.LESS):
+            superclass = Expr.Variable(self.consume(TokenType.IDENTIFIER, "Expected superclass name"))
+        self.consume(TokenType.LEFT_BRACE, "Expected opening \"{\" for class body")
+
+        methods: list[Stmt.Function] = []
+        while not self.check(TokenType.RIGHT_BRACE) and not self.atEnd():
+            method: Stmt.Function = self.function("method")
+            # The instance is passed to a method as a hidden first parameter
+            method.params.insert(0, Parser.receiver(method.name.line))
+            methods.append(method)
+        self.consume(TokenType.RIGHT_BRACE, "Expected closing \"}\" for class body")
+        return Stmt.Class(name, superclass, methods)
+
+    @staticmethod
+    def receiver(line: int) -> Token:
+        return Token(TokenType.THIS, "this", None, line, SymbolTable.THIS)
+
+    def function(self, type: str, annotations: list[Token] | None = None) -> Stmt.Stmt:
         """
         funDeclaration := "fun" function
         function := IDENTIFIER "(" parameters? ")" block
@@ -107,7 +153,7 @@ class Parser:
         self.consume(TokenType.LEFT_BRACE, f"Expected opening \"{{\" for {type} body")
 
         body: list[Stmt.Stmt] = self.block()
-        return Stmt.Function(name, parameters, body)
+        return Stmt.Function(name, parameters, body, annotations or [])
 
     def varDeclaration(self) -> Stmt.Stmt:
         """
@@ -261,7 +307,7 @@ class Parser:
 
     def assignment(self) -> Expr.Expr:
         """
-        assignment := IDENTIFIER "=" assignment | ternary
+        assignment := ( IDENTIFIER | call "[" expression "]" | call "." IDENTIFIER ) "=" assignment | ternary
         """
         expr: Expr.Expr = self.ternary()
 
@@ -272,6 +318,10 @@ class Parser:
             if isinstance(expr, Expr.Variable):
                 name: Token = expr.name
                 return Expr.Assign(name, value)
+            elif isinstance(expr, Expr.Index):
+                return Expr.SetIndex(expr.object, expr.bracket, expr.index, value)
+            elif isinstance(expr, Expr.Get):
+                return Expr.Set(expr.object, expr.name, value)
 
             self.error(equals, "Invalid assignment target")
 
@@ -281,113 +331,65 @@ class Parser:
         """
         ternary := logical_or ( "?" logical_or ":" ternary )?
         """
-        expr: Expr.Expr = self.logical_or()
+        expr: Expr.Expr = self.binary()
         if self.match(TokenType.QUESTION):
-            trueExpr: Expr.Expr = self.logical_or()
+            trueExpr: Expr.Expr = self.binary()
             self.consume(TokenType.COLON, "Expected \":\" after ternary condition")
             falseExpr: Expr.Expr = self.ternary()
             return Expr.Ternary(expr, trueExpr, falseExpr)
 
         return expr
 
-    def logical_or(self) -> Expr.Expr:
+    # Binding power and node type of every binary operator, operators with a higher binding power bind
+    # tighter. All of them are left associative, including "**" and the bitwise and shift operators
+    # which share one level.
+    BINARY_OPERATORS: dict[TokenType, tuple[int, type[Expr.Expr]]] = {
+        TokenType.OR:              (1, Expr.Logical),
+        TokenType.AND:             (2, Expr.Logical),
+        TokenType.BANG_EQUAL:      (3, Expr.Binary),
+        TokenType.EQUAL_EQUAL:     (3, Expr.Binary),
+        TokenType.GREATER:         (4, Expr.Binary),
+        TokenType.GREATER_EQUAL:   (4, Expr.Binary),
+        TokenType.LESS:            (4, Expr.Binary),
+        TokenType.LESS_EQUAL:      (4, Expr.Binary),
+        TokenType.AMPERSAND:       (5, Expr.Binary),
+        TokenType.BAR:             (5, Expr.Binary),
+        TokenType.CARROT:          (5, Expr.Binary),
+        TokenType.LESS_LESS:       (5, Expr.Binary),
+        TokenType.GREATER_GREATER: (5, Expr.Binary),
+        TokenType.PLUS:            (6, Expr.Binary),
+        TokenType.MINUS:           (6, Expr.Binary),
+        TokenType.STAR:            (7, Expr.Binary),
+        TokenType.SLASH:           (7, Expr.Binary),
+        TokenType.STAR_STAR:       (8, Expr.Binary),
+    }
+
+    def binary(self, minPower: int = 1) -> Expr.Expr:
         """
         logical_or := logical_and ( "or" logical_and )*
-        """
-        expr: Expr.Expr = self.logical_and()
-        while self.match(TokenType.OR):
-            operator: Token = self.previous()
-            right: Expr.Expr = self.logical_and()
-            expr = Expr.Logical(expr, operator, right)
-        return expr
-
-    def logical_and(self) -> Expr.Expr:
-        """
         logical_and := equality ( "and" equality )*
-        """
-        expr: Expr.Expr = self.equality()
-        while self.match(TokenType.AND):
-            operator: Token = self.previous()
-            right: Expr.Expr = self.equality()
-            expr = Expr.Logical(expr, operator, right)
-        return expr
-
-    def equality(self) -> Expr.Expr:
-        """
         equality := comparison ( ( "!=" | "==" ) comparison )*
-        """
-        expr: Expr.Expr = self.comparison()
-        while self.match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
-            operator: Token = self.previous()
-            right: Expr.Expr = self.comparison()
-            expr = Expr.Binary(expr, operator, right)
-        return expr
-
-    def comparison(self) -> Expr.Expr:
-        """
         comparison := bitwise ( ( ">" | ">=" | "<" | "<=" ) bitwise )*
-        """
-        expr: Expr.Expr = self.bitwise()
-        while self.match(TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL):
-            operator: Token = self.previous()
-            right: Expr.Expr = self.bitwise()
-            expr = Expr.Binary(expr, operator, right)
-        return expr
-
-    def bitwise(self) -> Expr.Expr:
-        """
-        bitwise := shift ( ( "&" | "|" | "^" ) shift )*
-        """
-        expr: Expr.Expr = self.shift()
-        while self.match(TokenType.AMPERSAND, TokenType.BAR, TokenType.CARROT, TokenType.LESS_LESS, TokenType.GREATER_GREATER):
-            operator: Token = self.previous()
-            right: Expr.Expr = self.shift()
-            expr = Expr.Binary(expr, operator, right)
-        return expr
-
-    def shift(self) -> Expr.Expr:
-        """
-        shift := term ( ( "<<" | ">>" ) term )*
-        """
-        expr: Expr.Expr = self.term()
-        while self.match(TokenType.AMPERSAND, TokenType.BAR, TokenType.CARROT, TokenType.LESS_LESS, TokenType.GREATER_GREATER):
-            operator: Token = self.previous()
-            right: Expr.Expr = self.term()
-            expr = Expr.Binary(expr, operator, right)
-        return expr
-
-    def term(self) -> Expr.Expr:
-        """
+        bitwise := term ( ( "&" | "|" | "^" | "<<" | ">>" ) term )*
         term := factor ( ( "+" | "-" ) factor )*
-        """
-        expr: Expr.Expr = self.factor()
-        while self.match(TokenType.PLUS, TokenType.MINUS):
-            operator: Token = self.previous()
-            right: Expr.Expr = self.factor()
-            expr = Expr.Binary(expr, operator, right)
-        return expr
-
-    def factor(self) -> Expr.Expr:
-        """
         factor := exp ( ( "*" | "/" ) exp )*
-        """
-        expr: Expr.Expr = self.exp()
-        while self.match(TokenType.STAR, TokenType.SLASH):
-            operator: Token = self.previous()
-            right: Expr.Expr = self.exp()
-            expr = Expr.Binary(expr, operator, right)
-        return expr
-
-    def exp(self) -> Expr.Expr:
-        """
         exp := unary ( "**" unary )*
+
+        Rather than a method per level, parse by precedence climbing over BINARY_OPERATORS. Only
+        operators binding at least as tight as minPower are consumed at this depth.
         """
         expr: Expr.Expr = self.unary()
-        while self.match(TokenType.STAR_STAR):
-            operator: Token = self.previous()
-            right: Expr.Expr = self.unary()
-            expr = Expr.Binary(expr, operator, right)
-        return expr
+        while True:
+            operator: Token = self.peek()
+            binding: tuple[int, type[Expr.Expr]] | None = Parser.BINARY_OPERATORS.get(operator.type)
+            if binding is None or binding[0] < minPower:
+                return expr
+
+            power, node = binding
+            self.advance()
+            # Only let tighter binding operators into the right operand to keep this one left associative
+            right: Expr.Expr = self.binary(power+1)
+            expr = node(expr, operator, right)
 
     def unary(self) -> Expr.Expr:
         """
@@ -417,12 +419,19 @@ class Parser:
 
     def call(self) -> Expr.Expr:
         """
-        call := primary ( "(" arguments? ")" )*
+        call := primary ( "(" arguments? ")" | "[" expression "]" | "." IDENTIFIER )*
         """
         expr: Expr.Expr = self.primary()
         while True:
             if self.match(TokenType.LEFT_PAREN):
                 expr = self.finishCall(expr)
+            elif self.match(TokenType.LEFT_BRACKET):
+                index: Expr.Expr = self.expression()
+                bracket: Token = self.consume(TokenType.RIGHT_BRACKET, "Expected closing \"]\" after index")
+                expr = Expr.Index(expr, bracket, index)
+            elif self.match(TokenType.DOT):
+                name: Token = self.consume(TokenType.IDENTIFIER, "Expected property name after \".\"")
+                expr = Expr.Get(expr, name)
             else:
                 break
         return expr
@@ -435,26 +444,62 @@ class Parser:
     def primary(self) -> Expr.Expr:
         """
         primary := NUMBER | STRING | "true" | "false" | "nil" | "(" expression ")" | IDENTIFIER
-        """
-        if self.match(TokenType.FALSE): return Expr.Literal(False)
-        if self.match(TokenType.TRUE): return Expr.Literal(True)
-        if self.match(TokenType.NIL): return Expr.Literal(None)
-
-        if self.match(TokenType.NUMBER):
-            return Expr.Literal(self.previous().literal)
-
-        if self.match(TokenType.STRING):
-            return Expr.String(self.previous().literal)
+                 | "this" | "super" "." IDENTIFIER
+                 | "[" ( expression ( "," expression )* )? "]"
+                 | "{" ( expression ":" expression ( "," expression ":" expression )* )? "}"
+        """
+        # Dispatch once on the current token instead of trying match() for every alternative
+        token: Token = self.peek()
+        match token.type:
+            case TokenType.FALSE:      expr: Expr.Expr = Expr.Literal(False)
+            case TokenType.TRUE:       expr: Expr.Expr = Expr.Literal(True)
+            case TokenType.NIL:        expr: Expr.Expr = Expr.Literal(None)
+            case TokenType.NUMBER:     expr: Expr.Expr = Expr.Literal(token.literal)
+            case TokenType.STRING:     expr: Expr.Expr = Expr.String(token.literal)
+            case TokenType.IDENTIFIER: expr: Expr.Expr = Expr.Variable(token)
+            case TokenType.THIS:       expr: Expr.Expr = Expr.This(token)
+
+            case TokenType.SUPER:
+                self.advance()
+                self.consume(TokenType.DOT, "Expected \".\" after \"super\"")
+                method: Token = self.consume(TokenType.IDENTIFIER, "Expected superclass method name")
+                return Expr.Super(token, method, Expr.This(Parser.receiver(token.line)))
 
-        if self.match(TokenType.IDENTIFIER):
-            return Expr.Variable(self.previous())
+            case TokenType.LEFT_PAREN:
+                self.advance()
+                expr: Expr.Expr = self.expression()
+                self.consume(TokenType.RIGHT_PAREN, "Expected closing ')' after expression")
+                return Expr.Grouping(expr)
 
-        if self.match(TokenType.LEFT_PAREN):
-            expr: Expr.Expr = self.expression()
-            self.consume(TokenType.RIGHT_PAREN, "Expected closing ')' after expression")
-            return Expr.Grouping(expr)
+            case TokenType.LEFT_BRACKET:
+                self.advance()
+                elements: list[Expr.Expr] = []
+                if not self.check(TokenType.RIGHT_BRACKET):
+                    elements.append(self.expression())
+                    while self.match(TokenType.COMMA):
+                        elements.append(self.expression())
+                self.consume(TokenType.RIGHT_BRACKET, "Expected closing \"]\" after array elements")
+                return Expr.Array(token, elements)
+
+            case TokenType.LEFT_BRACE:
+                self.advance()
+                keys: list[Expr.Expr] = []
+                values: list[Expr.Expr] = []
+                if not self.check(TokenType.RIGHT_BRACE):
+                    while True:
+                        keys.append(self.expression())
+                        self.consume(TokenType.COLON, "Expected \":\" after map key")
+                        values.append(self.expression())
+                        if not self.match(TokenType.COMMA):
+                            break
+                self.consume(TokenType.RIGHT_BRACE, "Expected closing \"}\" after map entries")
+                return Expr.Map(token, keys, values)
+
+            case _:
+                raise self.error(token, "Expected valid expression")
 
-        raise self.error(self.peek(), "Expected valid expression")
+        self.advance()
+        return expr
 
     # Start parsing
 
@@ -0,0 +1,305 @@
+from __future__ import annotations
+import Expr
+import Stmt
+from ErrorManager import ErrorManager
+from Interpreter import Interpreter
+from LoxCallable import LoxCallable
+from Token import Token
+
+# What a name refers to: the Var, Function, Class or parameter Token declaring a local, or the symbol of a global
+Binding = Stmt.Var | Stmt.Function | Stmt.Class | Token | int
+
+class FunctionFacts:
+    """
+    What the body of one function does, as far as its purity is concerned
+    """
+
+    def __init__(self, declaration: Stmt.Function, enclosing: FunctionFacts | None) -> None:
+        self.declaration: Stmt.Function = declaration
+        self.enclosing: FunctionFacts | None = enclosing
+        # Locals declared by the function itself
+        self.bindings: set[Binding] = set()
+        # Set on a print, an assignment to a variable of another function or a global, a call to
+        # anything but a known function, or making a closure
+        self.effects: bool = False
+        # Variables of other functions or globals the function reads, pure only if none of them change
+        self.reads: set[Binding] = set()
+        # What the names it calls refer to, these have to be pure functions
+        self.calls: set[Binding] = set()
+
+class Purity:
+    """
+    Works out which functions are pure: they don't print, don't assign to variables other than their
+    own, don't read variables which can change, and only call other pure functions or pure builtins.
+    Calling a pure function again with the same arguments always gives the same result, so the
+    Interpreter can memoize it. Also checks the @memo and @nomemo annotations.
+    """
+
+    ANNOTATIONS: tuple[str, ...] = ("memo", "nomemo")
+
+    def __init__(self, errorManager: ErrorManager, interpreter: Interpreter) -> None:
+        self.errorManager: ErrorManager = errorManager
+        self.interpreter: Interpreter = interpreter
+        self.scopes: list[dict[int, Binding]] = []
+        self.function: FunctionFacts | None = None
+        self.functions: list[FunctionFacts] = []
+        # Bindings which are assigned to, or globals declared more than once
+        self.changed: set[Binding] = set()
+        self.globalDeclarations: dict[int, Stmt.Var | Stmt.Function | Stmt.Class] = {}
+
+    def analyze(self, statements: list[Stmt.Stmt]) -> None:
+        # Functions from earlier calls are decided again, the new statements can change what they read
+        first: int = len(self.functions)
+        self.visit(statements)
+
+        # Globals can be called before they are declared, so calls are only looked up once everything is declared
+        callees: dict[FunctionFacts, set[Stmt.Function] | None] = {facts: self.callees(facts) for facts in self.functions}
+        pure: set[Stmt.Function] = {
+            facts.declaration for facts in self.functions
+            if not facts.effects and not (facts.reads & self.changed) and callees[facts] is not None
+        }
+        # Drop functions calling impure ones until nothing changes, functions which only call each
+        # other stay pure
+        while True:
+            impure: set[Stmt.Function] = {facts.declaration for facts in self.functions if facts.declaration in pure and not callees[facts] <= pure}
+            if not impure:
+                break
+            pure -= impure
+
+        for facts in self.functions:
+            if facts.declaration in pure:
+                self.interpreter.resolvePure(facts.declaration)
+            elif facts.declaration in self.interpreter.pureFunctions:
+                self.interpreter.forgetPure(facts.declaration)
+
+        for facts in self.functions[first:]:
+            for annotation in facts.declaration.annotations:
+                if annotation.lexeme not in Purity.ANNOTATIONS:
+                    self.errorManager.parseError(annotation, f"Unknown annotation: {annotation.lexeme}")
+                elif annotation.lexeme == "memo" and facts.declaration not in pure:
+                    self.errorManager.parseError(annotation, "Cannot memoize a function with side effects")
+
+    # Helper methods
+
+    def visit(self, node: Expr.Expr | Stmt.Stmt | list[Stmt.Stmt] | None) -> None:
+        if isinstance(node, list):
+            for stmt in node:
+                stmt.accept(self)
+        elif node is not None:
+            node.accept(self)
+
+    def declare(self, name: Token, binding: Stmt.Var | Stmt.Function | Stmt.Class | Token) -> None:
+        if not self.scopes:
+            if name.symbol in self.globalDeclarations:
+                self.changed.add(name.symbol)
+            self.globalDeclarations[name.symbol] = binding
+            return
+
+        self.scopes[-1][name.symbol] = binding
+        if self.function is not None:
+            self.function.bindings.add(binding)
+
+    def lookUp(self, name: Token) -> Binding:
+        for scope in reversed(self.scopes):
+            binding: Binding | None = scope.get(name.symbol)
+            if binding is not None:
+                return binding
+        return name.symbol
+
+    def isOwn(self, binding: Binding) -> bool:
+        return self.function is not None and binding in self.function.bindings
+
+    def knownFunction(self, binding: Binding) -> Stmt.Function | LoxCallable | None:
+        """
+        The function a name always refers to, if it can only refer to one
+        """
+        if binding in self.changed:
+            return None
+        if isinstance(binding, int):
+            binding = self.globalDeclarations.get(binding, binding)
+            if isinstance(binding, int):
+                # Nothing in the script declares the name, so it can only be a builtin
+                builtin: any = self.interpreter.globals.values.get(binding)
+                return builtin if isinstance(builtin, LoxCallable) else None
+        return binding if isinstance(binding, Stmt.Function) else None
+
+    def callees(self, facts: FunctionFacts) -> set[Stmt.Function] | None:
+        """
+        The Lox functions facts calls, None if it calls anything else but pure builtins
+        """
+        functions: set[Stmt.Function] = set()
+        for binding in facts.calls:
+            callee: Stmt.Function | LoxCallable | None = self.knownFunction(binding)
+            if isinstance(callee, Stmt.Function):
+                functions.add(callee)
+            elif callee is None or not callee.pure:
+                return None
+        return functions
+
+    def analyzeFunction(self, stmt: Stmt.Function) -> None:
+        self.function = FunctionFacts(stmt, self.function)
+        self.functions.append(self.function)
+        self.scopes.append({})
+        for param in stmt.params:
+            self.declare(param, param)
+        self.visit(stmt.body)
+        self.scopes.pop()
+        self.function = self.function.enclosing
+
+    # Statement visitors
+
+    def visitBlockStmt(self, stmt: Stmt.Block) -> None:
+        self.scopes.append({})
+        self.visit(stmt.statements)
+        self.scopes.pop()
+
+    def visitClassStmt(self, stmt: Stmt.Class) -> None:
+        self.declare(stmt.name, stmt)
+        if self.function is not None:
+            # Each call would return a new class
+            self.function.effects = True
+        self.visit(stmt.superclass)
+        for method in stmt.methods:
+            self.analyzeFunction(method)
+
+    def visitControlStmt(self, stmt: Stmt.Control) -> None:
+        return
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression) -> None:
+        self.visit(stmt.expression)
+
+    def visitForStmt(self, stmt: Stmt.For) -> None:
+        self.visit(stmt.initializer)
+        self.visit(stmt.condition)
+        self.visit(stmt.increment)
+        self.visit(stmt.body)
+
+    def visitFunctionStmt(self, stmt: Stmt.Function) -> None:
+        self.declare(stmt.name, stmt)
+        if self.function is not None:
+            # Each call would return a new closure, which a cached result can't stand in for
+            self.function.effects = True
+        self.analyzeFunction(stmt)
+
+    def visitIfStmt(self, stmt: Stmt.If) -> None:
+        self.visit(stmt.condition)
+        self.visit(stmt.thenBranch)
+        self.visit(stmt.elseBranch)
+
+    def visitPrintStmt(self, stmt: Stmt.Print) -> None:
+        self.visit(stmt.expression)
+        if self.function is not None:
+            self.function.effects = True
+
+    def visitReturnStmt(self, stmt: Stmt.Return) -> None:
+        self.visit(stmt.value)
+
+    def visitVarStmt(self, stmt: Stmt.Var) -> None:
+        self.visit(stmt.initializer)
+        self.declare(stmt.name, stmt)
+
+    def visitWhileStmt(self, stmt: Stmt.While) -> None:
+        self.visit(stmt.condition)
+        self.visit(stmt.body)
+
+    # Expression visitors
+
+    def visitArrayExpr(self, expr: Expr.Array) -> None:
+        for element in expr.elements:
+            self.visit(element)
+        if self.function is not None:
+            # Each call has to return a new array, which a cached result can't stand in for
+            self.function.effects = True
+
+    def visitAssignExpr(self, expr: Expr.Assign) -> None:
+        self.visit(expr.value)
+        binding: Binding = self.lookUp(expr.name)
+        self.changed.add(binding)
+        if self.function is not None and not self.isOwn(binding):
+            self.function.effects = True
+
+    def visitBinaryExpr(self, expr: Expr.Binary) -> None:
+        self.visit(expr.left)
+        self.visit(expr.right)
+
+    def visitCallExpr(self, expr: Expr.Call) -> None:
+        for argument in expr.arguments:
+            self.visit(argument)
+        if self.function is None:
+            self.visit(expr.callee)
+            return
+
+        if isinstance(expr.callee, Expr.Variable):
+            self.function.calls.add(self.lookUp(expr.callee.name))
+        else:
+            self.visit(expr.callee)
+            self.function.effects = True
+
+    def visitGetExpr(self, expr: Expr.Get) -> None:
+        self.visit(expr.object)
+        if self.function is not None:
+            # Fields can change between calls with the same arguments
+            self.function.effects = True
+
+    def visitGroupingExpr(self, expr: Expr.Grouping) -> None:
+        self.visit(expr.expression)
+
+    def visitIndexExpr(self, expr: Expr.Index) -> None:
+        self.visit(expr.object)
+        self.visit(expr.index)
+        if self.function is not None:
+            # Arrays can change between calls with the same arguments
+            self.function.effects = True
+
+    def visitLiteralExpr(self, expr: Expr.Literal) -> None:
+        return
+
+    def visitLogicalExpr(self, expr: Expr.Logical) -> None:
+        self.visit(expr.left)
+        self.visit(expr.right)
+
+    def visitMapExpr(self, expr: Expr.Map) -> None:
+        for key, value in zip(expr.keys, expr.values):
+            self.visit(key)
+            self.visit(value)
+        if self.function is not None:
+            # Each call has to return a new map
+            self.function.effects = True
+
+    def visitSetExpr(self, expr: Expr.Set) -> None:
+        self.visit(expr.object)
+        self.visit(expr.value)
+        if self.function is not None:
+            self.function.effects = True
+
+    def visitSetIndexExpr(self, expr: Expr.SetIndex) -> None:
+        self.visit(expr.object)
+        self.visit(expr.index)
+        self.visit(expr.value)
+        if self.function is not None:
+            self.function.effects = True
+
+    def visitStringExpr(self, expr: Expr.String) -> None:
+        return
+
+    def visitSuperExpr(self, expr: Expr.Super) -> None:
+        # The superclass and its methods can't change, and bound methods of the same receiver and method are equal
+        return
+
+    def visitTernaryExpr(self, expr: Expr.Ternary) -> None:
+        self.visit(expr.condition)
+        self.visit(expr.trueExpr)
+        self.visit(expr.falseExpr)
+
+    def visitThisExpr(self, expr: Expr.This) -> None:
+        return
+
+    def visitUnaryExpr(self, expr: Expr.Unary) -> None:
+        self.visit(expr.right)
+
+    def visitVariableExpr(self, expr: Expr.Variable) -> None:
+        if self.function is None:
+            return
+        binding: Binding = self.lookUp(expr.name)
+        if not self.isOwn(binding):
+            self.function.reads.add(binding)
@@ -1,28 +1,67 @@
+from __future__ import annotations
 from enum import Enum, auto
 import Expr
 import Stmt
 from ErrorManager import ErrorManager
+from Environment import Access
 from Interpreter import Interpreter
+from SymbolTable import SymbolTable
 from Token import Token
 
 class FunctionType(Enum):
     NONE = auto()
     FUNCTION = auto()
+    METHOD = auto()
+    INITIALIZER = auto()
+
+class ClassType(Enum):
+    NONE = auto()
+    CLASS = auto()
+    SUBCLASS = auto()
 
 class LoopType(Enum):
     NONE = auto()
     FOR = auto()
     WHILE = auto()
 
+class Local:
+    """
+    A variable declared in a local scope, slots are handed out in declaration order
+    """
+
+    def __init__(self, slot: int, declaration: Stmt.Var | Stmt.Function | None) -> None:
+        self.slot: int = slot
+        self.declaration: Stmt.Var | Stmt.Function | None = declaration
+        self.defined: bool = False
+        # Set once a closure refers to the variable, it then has to live in a Cell
+        self.captured: bool = False
+        # (expr, depth) of references from the function declaring it, resolved when the scope ends
+        self.references: list[tuple[Expr.Expr, int]] = []
+
+class FunctionState:
+    """
+    The function being resolved, or the top level, and the variables it captures from enclosing functions
+    """
+
+    def __init__(self, enclosing: FunctionState | None, scopeIndex: int) -> None:
+        self.enclosing: FunctionState | None = enclosing
+        # Index in Resolver.scopes of the outermost scope belonging to the function
+        self.scopeIndex: int = scopeIndex
+        # How to find each upvalue when the function is declared, as (access, depth, index)
+        self.upvalues: list[tuple[Access, int, int]] = []
+        self.upvalueIndices: dict[Local, int] = {}
+
 class Resolver:
 
     def __init__(self, errorManager: ErrorManager, interpreter: Interpreter) -> None:
         self.errorManager = errorManager
         self.interpreter: Interpreter = interpreter
-        self.scopes: list[dict[str,bool]] = []
+        self.scopes: list[dict[int,Local]] = []
+        self.function: FunctionState = FunctionState(None, 0)
 
         self.currentFunction = FunctionType.NONE;
         self.currentLoop = LoopType.NONE;
+        self.currentClass = ClassType.NONE
 
     # Helper methods
 
@@ -35,45 +74,138 @@ class Resolver:
 
     def resolveLocal(self, expr: Expr.Expr, name: Token) -> None:
         """
-        Walk up the scopes from innermost to outermost and tell the interpreter which scope to use for the variable lookup
+        Walk up the scopes from innermost to outermost and tell the interpreter which scope and slot to use for the variable lookup
+        """
+        for depth, scope in enumerate(reversed(self.scopes)):
+            local: Local|None = scope.get(name.symbol)
+            if local is not None:
+                index: int = len(self.scopes)-1-depth
+                if index >= self.function.scopeIndex:
+                    # Whether it is read directly or through a cell is only known once its scope ends
+                    local.references.append((expr, depth))
+                else:
+                    local.captured = True
+                    self.interpreter.resolve(expr, Access.UPVALUE, 0, self.addUpvalue(self.function, local, index))
+                return
+
+    def addUpvalue(self, function: FunctionState, local: Local, index: int) -> int:
+        """
+        Capture the local declared in scope index in function and every function between them, returns
+        the index of the upvalue in function
         """
-        for i,scope in enumerate(self.scopes):
-            if name.lexeme in scope:
-                self.interpreter.resolve(expr, len(self.scopes)-1-i)
+        upvalue: int|None = function.upvalueIndices.get(local)
+        if upvalue is not None:
+            return upvalue
+
+        enclosing: FunctionState = function.enclosing
+        if index >= enclosing.scopeIndex:
+            # Declared in the enclosing function, take the cell from the frame the function is declared in
+            function.upvalues.append((Access.CELL, function.scopeIndex-1-index, local.slot))
+        else:
+            function.upvalues.append((Access.UPVALUE, 0, self.addUpvalue(enclosing, local, index)))
+
+        upvalue = function.upvalueIndices[local] = len(function.upvalues)-1
+        return upvalue
 
     def resolveFunction(self, function: Stmt.Function, type: FunctionType) -> None:
         enclosingType: FunctionType = self.currentFunction
+        enclosingLoop: LoopType = self.currentLoop
         self.currentFunction = type
+        # A loop around the declaration isn't one break and continue in the body can reach
+        self.currentLoop = LoopType.NONE
+        self.function = FunctionState(self.function, len(self.scopes))
         self.beginScope()
         for param in function.params:
             self.declare(param)
             self.define(param)
         self.resolve(function.body)
-        self.endScope()
+
+        # Parameters arrive as plain values, the captured ones are boxed when the function is called
+        self.interpreter.resolveParameterCells(function, tuple(local.slot for local in self.scopes[-1].values() if local.captured and local.declaration is None))
+        self.endScope(function)
+        self.interpreter.resolveUpvalues(function, tuple(self.function.upvalues))
+        self.function = self.function.enclosing
         self.currentFunction = enclosingType
+        self.currentLoop = enclosingLoop
 
     def beginScope(self) -> None:
         self.scopes.append({})
 
-    def endScope(self) -> None:
-        self.scopes.pop()
+    def endScope(self, node: Stmt.Block | Stmt.Function | Stmt.Class) -> None:
+        scope: dict[int,Local] = self.scopes.pop()
+        for local in scope.values():
+            access: Access = Access.CELL if local.captured else Access.LOCAL
+            for expr, depth in local.references:
+                self.interpreter.resolve(expr, access, depth, local.slot)
+            if local.declaration is not None:
+                self.interpreter.resolveDeclaration(local.declaration, local.slot, local.captured)
+
+        # Every variable in the scope has a slot, so the frame for it needs exactly that many
+        self.interpreter.resolveFrame(node, len(scope))
+
+    @staticmethod
+    def declares(statements: list[Stmt.Stmt]) -> bool:
+        """
+        Whether the statements declare a variable in the scope they are in. A for loop declares its
+        initializer in the enclosing scope.
+        """
+        return any(
+            isinstance(stmt, (Stmt.Var, Stmt.Function, Stmt.Class)) or (isinstance(stmt, Stmt.For) and isinstance(stmt.initializer, Stmt.Var))
+            for stmt in statements
+        )
 
-    def declare(self, name: Token) -> None:
+    def declare(self, name: Token, stmt: Stmt.Var | Stmt.Function | Stmt.Class | None = None) -> None:
+        """
+        Give the variable the next slot in the innermost scope. Parameters are bound by position so
+        have no declaring statement.
+        """
         if self.scopes:
-            if name.lexeme in self.scopes[-1]:
+            scope: dict[int,Local] = self.scopes[-1]
+            local: Local|None = scope.get(name.symbol)
+            if local is not None:
                 self.errorManager.parseError(name, f"Cannot redefine variable {name.lexeme}")
-            self.scopes[-1][name.lexeme] = False
+                local.defined = False
+            else:
+                scope[name.symbol] = Local(len(scope), stmt)
 
     def define(self, name: Token) -> None:
         if self.scopes:
-            self.scopes[-1][name.lexeme] = True
+            self.scopes[-1][name.symbol].defined = True
 
     # Statement Visitors
 
     def visitBlockStmt(self, stmt: Stmt.Block) -> None:
+        if not Resolver.declares(stmt.statements):
+            # Without a frame of its own the block isn't counted in the distance to enclosing variables
+            self.resolve(stmt.statements)
+            return
         self.beginScope()
         self.resolve(stmt.statements)
-        self.endScope()
+        self.endScope(stmt)
+
+    def visitClassStmt(self, stmt: Stmt.Class) -> None:
+        enclosingClass: ClassType = self.currentClass
+        self.currentClass = ClassType.CLASS
+        self.declare(stmt.name, stmt)
+        self.define(stmt.name)
+
+        if stmt.superclass is not None:
+            if stmt.superclass.name.symbol == stmt.name.symbol:
+                self.errorManager.parseError(stmt.superclass.name, "A class can't inherit from itself")
+            self.currentClass = ClassType.SUBCLASS
+            self.resolve(stmt.superclass)
+            # The methods find the superclass as super, in a scope of its own around them
+            self.beginScope()
+            local: Local = Local(0, None)
+            local.defined = True
+            self.scopes[-1][SymbolTable.SUPER] = local
+
+        for method in stmt.methods:
+            self.resolveFunction(method, FunctionType.INITIALIZER if method.name.lexeme == "init" else FunctionType.METHOD)
+
+        if stmt.superclass is not None:
+            self.endScope(stmt)
+        self.currentClass = enclosingClass
 
     def visitControlStmt(self, stmt: Stmt.Control) -> None:
         if self.currentLoop == LoopType.NONE:
@@ -84,7 +216,7 @@ class Resolver:
         self.resolve(stmt.expression)
 
     def visitFunctionStmt(self, stmt: Stmt.Function) -> None:
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt)
         self.define(stmt.name)
         self.resolveFunction(stmt, FunctionType.FUNCTION)
 
@@ -113,10 +245,15 @@ class Resolver:
         if self.currentFunction == FunctionType.NONE:
             self.errorManager.parseError(stmt.keyword, "Can't return outside of a function")
         if stmt.value is not None:
+            if self.currentFunction == FunctionType.INITIALIZER:
+                self.errorManager.parseError(stmt.keyword, "Can't return a value from an initializer")
             self.resolve(stmt.value)
+            if isinstance(stmt.value, Expr.Call):
+                # Nothing is left to do in the function after the call, so it can take the function's place
+                self.interpreter.resolveTailCall(stmt, stmt.value)
 
     def visitVarStmt(self, stmt: Stmt.Var) -> None:
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt)
         if stmt.initializer is not None:
             self.resolve(stmt.initializer)
         self.define(stmt.name)
@@ -130,6 +267,10 @@ class Resolver:
 
     # Expression visitors
 
+    def visitArrayExpr(self, expr: Expr.Array) -> None:
+        for element in expr.elements:
+            self.resolve(element)
+
     def visitAssignExpr(self, expr: Expr.Assign) -> None:
         self.resolve(expr.value)
         self.resolveLocal(expr, expr.name)
@@ -143,9 +284,16 @@ class Resolver:
         for argument in expr.arguments:
             self.resolve(argument)
 
+    def visitGetExpr(self, expr: Expr.Get) -> None:
+        self.resolve(expr.object)
+
     def visitGroupingExpr(self, expr: Expr.Grouping) -> None:
         self.resolve(expr.expression)
 
+    def visitIndexExpr(self, expr: Expr.Index) -> None:
+        self.resolve(expr.object)
+        self.resolve(expr.index)
+
     def visitLiteralExpr(self, expr: Expr.Literal) -> None:
         return
 
@@ -153,20 +301,51 @@ class Resolver:
         self.resolve(expr.left)
         self.resolve(expr.right)
 
+    def visitMapExpr(self, expr: Expr.Map) -> None:
+        for key, value in zip(expr.keys, expr.values):
+            self.resolve(key)
+            self.resolve(value)
+
+    def visitSetExpr(self, expr: Expr.Set) -> None:
+        self.resolve(expr.object)
+        self.resolve(expr.value)
+
+    def visitSetIndexExpr(self, expr: Expr.SetIndex) -> None:
+        self.resolve(expr.object)
+        self.resolve(expr.index)
+        self.resolve(expr.value)
+
     def visitStringExpr(self, expr: Expr.String) -> None:
         return
 
+    def visitSuperExpr(self, expr: Expr.Super) -> None:
+        if self.currentClass == ClassType.NONE:
+            self.errorManager.parseError(expr.keyword, "Can't use super outside of a class")
+        elif self.currentClass == ClassType.CLASS:
+            self.errorManager.parseError(expr.keyword, "Can't use super in a class with no superclass")
+        else:
+            self.resolveLocal(expr, expr.keyword)
+            self.resolve(expr.receiver)
+
     def visitTernaryExpr(self, expr: Expr.Ternary) -> None:
         self.resolve(expr.condition)
         self.resolve(expr.trueExpr)
         self.resolve(expr.falseExpr)
 
+    def visitThisExpr(self, expr: Expr.This) -> None:
+        if self.currentClass == ClassType.NONE:
+            self.errorManager.parseError(expr.keyword, "Can't use this outside of a class")
+            return
+        self.resolveLocal(expr, expr.keyword)
+
     def visitUnaryExpr(self, expr: Expr.Unary) -> None:
         self.resolve(expr.right)
 
     def visitVariableExpr(self, expr: Expr.Variable) -> None:
-        if self.scopes and self.scopes[-1].get(expr.name.lexeme, None) == False:
-            self.errorManager.parseError(expr.name, "Can't read local variable in its own initializer")
+        if self.scopes:
+            local: Local|None = self.scopes[-1].get(expr.name.symbol)
+            if local is not None and not local.defined:
+                self.errorManager.parseError(expr.name, "Can't read local variable in its own initializer")
         self.resolveLocal(expr, expr.name)
 
 
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+class Rope:
+    """
+    A string built by concatenation, kept as the list of its pieces so adding a piece doesn't copy
+    the characters so far. The characters are only joined once something needs them: printing,
+    str(), equality or hashing. Ropes made by adding to the same rope share its list of pieces, the
+    first one to add appends to it and the others copy the pieces they see.
+    """
+
+    __slots__ = ("pieces", "count", "length", "flat")
+
+    # Shorter results of adding two plain strings stay plain strings
+    MIN_LENGTH: int = 128
+
+    def __init__(self, pieces: list[str], count: int, length: int) -> None:
+        # The rope is the first count pieces, later ones belong to ropes made from it
+        self.pieces: list[str] = pieces
+        self.count: int = count
+        self.length: int = length
+        # The joined pieces, once they have been needed
+        self.flat: str | None = None
+
+    def __str__(self) -> str:
+        if self.flat is None:
+            self.flat = "".join(self.pieces[:self.count])
+        return self.flat
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __eq__(self, other: any) -> bool:
+        if isinstance(other, (str, Rope)):
+            return self.length == len(other) and str(self) == str(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        # The same as the plain string, as they are equal
+        return hash(str(self))
+
+    def append(self, right: str | Rope) -> Rope:
+        pieces: list[str] = self.pieces
+        if len(pieces) != self.count:
+            # Another rope has already added to these pieces
+            pieces = pieces[:self.count]
+        if type(right) is Rope:
+            pieces.extend(right.pieces[:right.count])
+        else:
+            pieces.append(right)
+        return Rope(pieces, len(pieces), self.length + len(right))
+
+# Types of Lox string values
+STRING: tuple[type, ...] = (str, Rope)
+
+def concatenate(left: str | Rope, right: str | Rope) -> str | Rope:
+    """
+    Add two strings, giving a Rope once the result is long
+    """
+    if type(left) is Rope:
+        return left.append(right)
+    if type(right) is Rope:
+        return Rope([left], 1, len(left)).append(right)
+    if len(left) + len(right) < Rope.MIN_LENGTH:
+        return left + right
+    return Rope([left, right], 2, len(left) + len(right))
+
+def typeName(value: any) -> str:
+    """
+    Name of the type of value for error messages, a Rope is a str as far as Lox is concerned
+    """
+    return "str" if type(value) is Rope else type(value).__name__
@@ -1,4 +1,5 @@
 from ErrorManager import ErrorManager
+from SymbolTable import SymbolTable
 from TokenType import TokenType
 from Token import Token
 
@@ -25,9 +26,16 @@ class Scanner:
         "while":    TokenType.WHILE,
     }
 
-    def __init__(self, errorManager: ErrorManager, source: str) -> None:
+    # Keywords which resolve like variables, and their fixed symbols
+    KEYWORD_SYMBOLS: dict[TokenType, int] = {
+        TokenType.THIS:     SymbolTable.THIS,
+        TokenType.SUPER:    SymbolTable.SUPER,
+    }
+
+    def __init__(self, errorManager: ErrorManager, source: str, symbols: SymbolTable|None = None) -> None:
         self.source = source
         self.errorManager = errorManager
+        self.symbols: SymbolTable = symbols if symbols is not None else SymbolTable()
         self.tokens: list[Token] = []
 
         self.start = 0
@@ -37,9 +45,9 @@ class Scanner:
     def atEnd(self) -> bool:
         return self.current >= len(self.source)
 
-    def addToken(self, type_: TokenType, literal: any = None) -> None:
+    def addToken(self, type_: TokenType, literal: any = None, symbol: int|None = None) -> None:
         text: str = self.source[self.start:self.current]
-        self.tokens.append(Token(type_, text, literal, self.line))
+        self.tokens.append(Token(type_, text, literal, self.line, symbol))
 
     def advance(self) -> str:
         c: str = self.source[self.current]
@@ -138,7 +146,10 @@ class Scanner:
 
         text: str = self.source[self.start:self.current]
         type_: TokenType = Scanner.KEYWORDS.get(text, TokenType.IDENTIFIER)
-        self.addToken(type_)
+        if type_ == TokenType.IDENTIFIER:
+            self.addToken(type_, symbol=self.symbols.intern(text))
+        else:
+            self.addToken(type_, symbol=Scanner.KEYWORD_SYMBOLS.get(type_))
 
     def scanToken(self) -> None:
         c: str = self.advance()
@@ -148,6 +159,8 @@ class Scanner:
             case ")": self.addToken(TokenType.RIGHT_PAREN)
             case "{": self.addToken(TokenType.LEFT_BRACE)
             case "}": self.addToken(TokenType.RIGHT_BRACE)
+            case "[": self.addToken(TokenType.LEFT_BRACKET)
+            case "]": self.addToken(TokenType.RIGHT_BRACKET)
             case ",": self.addToken(TokenType.COMMA)
             case ".": self.addToken(TokenType.DOT)
             case "-": self.addToken(TokenType.MINUS)
@@ -158,6 +171,7 @@ class Scanner:
             case "^": self.addToken(TokenType.CARROT)
             case "?": self.addToken(TokenType.QUESTION)
             case ":": self.addToken(TokenType.COLON)
+            case "@": self.addToken(TokenType.AT)
 
             case "!" if self.match("="): self.addToken(TokenType.BANG_EQUAL)
             case "!":                    self.addToken(TokenType.BANG)
@@ -0,0 +1,119 @@
+import hashlib
+import importlib
+import os
+import pathlib
+import pickle
+import sys
+import tempfile
+import zlib
+
+import Stmt
+from SymbolTable import SymbolTable
+
+class CachedScript:
+    """
+    Everything needed to interpret a script without scanning, parsing or resolving it again
+    """
+
+    def __init__(self, symbols: list[str], statements: list[Stmt.Stmt], resolution: dict[str, dict]) -> None:
+        # Names of the symbols at the time the script was compiled, tokens in the AST refer to them by id
+        self.symbols: list[str] = symbols
+        self.statements: list[Stmt.Stmt] = statements
+        # The side tables the Resolver filled in on the Interpreter, by attribute name
+        self.resolution: dict[str, dict] = resolution
+
+class ScriptCache:
+    """
+    Persistent on disk cache of compiled scripts, keyed by a hash of the source and a fingerprint of
+    the interpreter. Entries are compressed pickles and the directory is kept under a size limit by
+    evicting the least recently used entries. Only point this at a directory you trust, loading an
+    entry unpickles it.
+    """
+
+    # Bump whenever the layout of a CachedScript changes
+    FORMAT: int = 1
+
+    # Modules whose source decides the shape of the AST and its resolution, editing any of them
+    # (including regenerating Expr and Stmt) invalidates every entry. Purity fills pureFunctions from
+    # which Builtins are pure, and the Access of Environment is stored in the Resolver's tables.
+    MODULES: tuple[str, ...] = (
+        "Token", "TokenType", "Scanner", "FastScanner", "Parser", "Expr", "Stmt", "Resolver", "Purity",
+        "Builtins", "LoxCallable", "Environment", "Interpreter",
+    )
+
+    SUFFIX: str = ".loxc"
+
+    def __init__(self, directory: str | os.PathLike, maxSize: int = 64 << 20) -> None:
+        self.directory: pathlib.Path = pathlib.Path(directory)
+        self.maxSize: int = maxSize
+        self.fingerprint: bytes = ScriptCache.interpreterFingerprint()
+
+    @staticmethod
+    def interpreterFingerprint() -> bytes:
+        digest = hashlib.sha256(f"{ScriptCache.FORMAT} {sys.version}".encode())
+        for name in ScriptCache.MODULES:
+            digest.update(pathlib.Path(importlib.import_module(name).__file__).read_bytes())
+        return digest.digest()
+
+    def path(self, source: str) -> pathlib.Path:
+        key: str = hashlib.sha256(self.fingerprint + source.encode()).hexdigest()
+        return self.directory / (key + ScriptCache.SUFFIX)
+
+    def load(self, source: str, symbols: SymbolTable) -> CachedScript | None:
+        """
+        Return the cached compilation of source, or None on a miss. On a hit the symbols the script
+        uses are added to the symbol table with the ids they had when it was compiled.
+        """
+        path: pathlib.Path = self.path(source)
+        try:
+            script: CachedScript = pickle.loads(zlib.decompress(path.read_bytes()))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated or otherwise unreadable entry, drop it and compile from scratch
+            path.unlink(missing_ok=True)
+            return None
+
+        # Ids are only valid if this session interned the same names in the same order so far
+        if script.symbols[:len(symbols)] != symbols.names:
+            return None
+        for name in script.symbols[len(symbols):]:
+            symbols.intern(name)
+
+        # Mark the entry as recently used for eviction
+        os.utime(path)
+        return script
+
+    def store(self, source: str, symbols: SymbolTable, statements: list[Stmt.Stmt], resolution: dict[str, dict]) -> None:
+        script: CachedScript = CachedScript(list(symbols.names), statements, resolution)
+        try:
+            data: bytes = zlib.compress(pickle.dumps(script, pickle.HIGHEST_PROTOCOL))
+        except RecursionError:
+            # The AST is nested too deeply to pickle, just don't cache it
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first so other processes never see a partial entry
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp, self.path(source))
+
+        self.evict()
+
+    def evict(self) -> None:
+        entries: list[tuple[float, int, pathlib.Path]] = []
+        for path in self.directory.glob("*" + ScriptCache.SUFFIX):
+            try:
+                stat: os.stat_result = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total: int = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxSize:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,399 @@
+from __future__ import annotations
+from typing import Callable
+import Expr
+import Stmt
+from LoxCallable import LoxCallable
+from LoxFunction import LoxFunction, MemoizedFunction
+from LoxArray import LoxArray
+from LoxClass import BoundMethod, LoxClass, LoxInstance
+from ExecutionFlow import Signal
+from ErrorManager import *
+from TokenType import TokenType
+from Environment import Environment
+from Interpreter import Interpreter
+
+# A piece of work still to be done: a handler and the node or value it is applied to
+WorkItem = tuple[Callable[[any], None], any]
+
+class StackEvaluator:
+    """
+    Walks the AST like the Interpreter but without recursing in Python. What is left to do is kept on
+    an explicit stack of work items and intermediate results on a stack of values, so a Lox call only
+    pushes a few items rather than several Python frames. The depth of Lox recursion is limited by
+    maxDepth instead of the C stack. Variables, operators and declarations go through the
+    Interpreter, whose environment is the one the evaluator is currently running in.
+    """
+
+    MAX_DEPTH: int = 1 << 16
+
+    def __init__(self, interpreter: Interpreter, maxDepth: int | None = None) -> None:
+        self.interpreter: Interpreter = interpreter
+        self.errorManager: ErrorManager = interpreter.errorManager
+        self.maxDepth: int = maxDepth if maxDepth is not None else StackEvaluator.MAX_DEPTH
+        self.work: list[WorkItem] = []
+        self.values: list[any] = []
+        # Number of Lox calls in progress
+        self.depth: int = 0
+
+    def interpret(self, statements: list[Stmt.Stmt]) -> None:
+        self.work = [(self.execute, stmt) for stmt in reversed(statements)]
+        try:
+            self.run()
+        except RuntimeError as error:
+            self.work.clear()
+            self.values.clear()
+            self.depth = 0
+            self.interpreter.environment = self.interpreter.globals
+            self.interpreter.returnValue = None
+            self.interpreter.runtimeError(error)
+
+    def run(self) -> None:
+        work: list[WorkItem] = self.work
+        while work:
+            handler, argument = work.pop()
+            handler(argument)
+
+    # Helper methods
+
+    def execute(self, stmt: Stmt.Stmt) -> None:
+        stmt.accept(self)
+
+    def evaluate(self, expr: Expr.Expr) -> None:
+        expr.accept(self)
+
+    def executeStatements(self, statements: list[Stmt.Stmt]) -> None:
+        self.work.extend((self.execute, stmt) for stmt in reversed(statements))
+
+    def discard(self, _: None) -> None:
+        self.values.pop()
+
+    def restoreEnvironment(self, environment: Environment) -> None:
+        self.interpreter.environment = environment
+
+    def unwind(self, signal: Signal) -> None:
+        """
+        Drop the work up to the loop or call which handles signal, putting back the environments of
+        the blocks being left
+        """
+        work: list[WorkItem] = self.work
+        while True:
+            handler, argument = work.pop()
+            if handler == self.restoreEnvironment:
+                self.restoreEnvironment(argument)
+            elif handler == self.returnFromCall:
+                # Break and continue can't leave a function, so this is a return
+                self.returnFromCall(argument)
+                return
+            elif handler == self.loopNext and signal is not Signal.RETURN:
+                if signal is Signal.CONTINUE:
+                    work.append((handler, argument))
+                return
+
+    # Continuations, run once the values they need are on the value stack
+
+    def applyUnary(self, expr: Expr.Unary) -> None:
+        self.values.append(self.interpreter.unaryOperation(expr.operator, self.values.pop()))
+
+    def applyBinary(self, expr: Expr.Binary) -> None:
+        right: any = self.values.pop()
+        self.values[-1] = self.interpreter.binaryOperation(expr.operator, self.values[-1], right)
+
+    def applyLogical(self, expr: Expr.Logical) -> None:
+        # The left side stays as the result if it decides the outcome
+        if self.interpreter.isTruthy(self.values[-1]) == (expr.operator.type == TokenType.OR):
+            return
+        self.values.pop()
+        self.evaluate(expr.right)
+
+    def applyTernary(self, expr: Expr.Ternary) -> None:
+        self.evaluate(expr.trueExpr if self.interpreter.isTruthy(self.values.pop()) else expr.falseExpr)
+
+    def applyAssign(self, expr: Expr.Assign) -> None:
+        self.interpreter.assignVariable(expr, self.values[-1])
+
+    def applyArray(self, expr: Expr.Array) -> None:
+        count: int = len(expr.elements)
+        elements: list[any] = self.values[len(self.values) - count:]
+        del self.values[len(self.values) - count:]
+        self.values.append(LoxArray.of(elements))
+
+    def applyMap(self, expr: Expr.Map) -> None:
+        count: int = 2 * len(expr.keys)
+        pairs: list[any] = self.values[len(self.values) - count:]
+        del self.values[len(self.values) - count:]
+        self.values.append(self.interpreter.makeMap(expr.brace, pairs))
+
+    def applyIndex(self, expr: Expr.Index) -> None:
+        index: any = self.values.pop()
+        self.values[-1] = self.interpreter.getElement(expr.bracket, self.values[-1], index)
+
+    def applySetIndex(self, expr: Expr.SetIndex) -> None:
+        value: any = self.values.pop()
+        index: any = self.values.pop()
+        self.values[-1] = self.interpreter.setElement(expr.bracket, self.values[-1], index, value)
+
+    def applyGet(self, expr: Expr.Get) -> None:
+        self.values[-1] = self.interpreter.readProperty(expr, self.interpreter.propertyCache(expr), self.values[-1])
+
+    def applySet(self, expr: Expr.Set) -> None:
+        value: any = self.values.pop()
+        self.values[-1] = self.interpreter.writeProperty(expr, self.interpreter.propertyCache(expr), self.values[-1], value)
+
+    def applyClass(self, stmt: Stmt.Class) -> None:
+        self.interpreter.defineClass(stmt, self.values.pop())
+
+    def scheduleCall(self, handler: Callable[[Expr.Call], None], expr: Expr.Call) -> None:
+        # Callee first, then the arguments from left to right. A method called straight from an
+        # instance only needs the instance.
+        self.work.append((handler, expr))
+        self.work.extend((self.evaluate, argument) for argument in reversed(expr.arguments))
+        self.work.append((self.evaluate, expr.callee.object if type(expr.callee) is Expr.Get else expr.callee))
+
+    def popCall(self, expr: Expr.Call) -> tuple[LoxCallable, list[any]]:
+        """
+        Take the callee and arguments of expr off the value stack
+        """
+        count: int = len(expr.arguments)
+        arguments: list[any] = self.values[len(self.values) - count:]
+        del self.values[len(self.values) - count:]
+        if type(expr.callee) is Expr.Get:
+            object: any = self.values.pop()
+            return self.interpreter.invocation(expr, self.interpreter.propertyCache(expr.callee), object, arguments)
+        callee: any = self.values.pop()
+        self.interpreter.checkCall(expr, callee, count)
+        return callee, arguments
+
+    def applyCall(self, expr: Expr.Call) -> None:
+        callee, arguments = self.popCall(expr)
+        self.call(expr, callee, arguments)
+
+    def call(self, expr: Expr.Call, callee: LoxCallable, arguments: list[any]) -> None:
+        """
+        Start a call of callee, its result ends up on the value stack. Methods and initializers run
+        like any other Lox function, with the instance as their first argument.
+        """
+        if type(callee) is BoundMethod:
+            arguments.insert(0, callee.receiver)
+            callee = callee.method
+        elif type(callee) is LoxClass:
+            instance: LoxInstance = LoxInstance(callee.shape)
+            if callee.initializer is None:
+                self.values.append(instance)
+                return
+            self.work.append((self.replaceResult, instance))
+            arguments.insert(0, instance)
+            callee = callee.initializer
+
+        if not isinstance(callee, LoxFunction):
+            self.values.append(self.interpreter.callNative(expr, callee, arguments))
+            return
+
+        if isinstance(callee, MemoizedFunction):
+            key: tuple | None = callee.key(arguments)
+            if key is not None:
+                result: any = callee.lookup(key)
+                if result is not MemoizedFunction.MISSING:
+                    self.values.append(result)
+                    return
+                self.work.append((self.storeResult, (callee, key)))
+
+        if self.depth >= self.maxDepth:
+            raise RuntimeError(expr.paren, "Stack overflow")
+        self.depth += 1
+        self.work.append((self.returnFromCall, self.interpreter.environment))
+        self.interpreter.environment = callee.bind(self.interpreter, arguments)
+        self.executeStatements(callee.declaration.body)
+
+    def applyTailCall(self, expr: Expr.Call) -> None:
+        callee, arguments = self.popCall(expr)
+        if type(callee) is BoundMethod:
+            arguments.insert(0, callee.receiver)
+            callee = callee.method
+        if not isinstance(callee, LoxFunction):
+            # Returned once it is called the usual way, a class still has to run its initializer
+            self.work.append((self.applyReturn, None))
+            self.call(expr, callee, arguments)
+            return
+
+        # Drop what is left of the current call and reuse its return marker, so the depth stays the same
+        work: list[WorkItem] = self.work
+        while work[-1][0] != self.returnFromCall:
+            work.pop()
+        self.interpreter.environment = callee.bind(self.interpreter, arguments)
+        self.executeStatements(callee.declaration.body)
+
+    def returnFromCall(self, environment: Environment) -> None:
+        self.depth -= 1
+        self.interpreter.environment = environment
+        self.values.append(self.interpreter.returnValue)
+        self.interpreter.returnValue = None
+
+    def replaceResult(self, instance: LoxInstance) -> None:
+        # What an initializer returns is dropped for the new instance
+        self.values[-1] = instance
+
+    def storeResult(self, call: tuple[MemoizedFunction, tuple]) -> None:
+        callee, key = call
+        callee.store(key, self.values[-1])
+
+    def applyReturn(self, _: None) -> None:
+        self.interpreter.returnValue = self.values.pop()
+        self.unwind(Signal.RETURN)
+
+    def applyPrint(self, _: None) -> None:
+        self.interpreter.output.write(self.interpreter.stringify(self.values.pop()))
+
+    def applyVar(self, stmt: Stmt.Var) -> None:
+        self.interpreter.declare(stmt, self.values.pop())
+
+    def applyIf(self, stmt: Stmt.If) -> None:
+        if self.interpreter.isTruthy(self.values.pop()):
+            self.execute(stmt.thenBranch)
+        elif stmt.elseBranch is not None:
+            self.execute(stmt.elseBranch)
+
+    def loopTest(self, stmt: Stmt.While | Stmt.For) -> None:
+        self.work.append((self.loopBody, stmt))
+        self.evaluate(stmt.condition)
+
+    def loopBody(self, stmt: Stmt.While | Stmt.For) -> None:
+        if self.interpreter.isTruthy(self.values.pop()):
+            self.work.append((self.loopNext, stmt))
+            self.execute(stmt.body)
+
+    def loopNext(self, stmt: Stmt.While | Stmt.For) -> None:
+        """
+        Runs after each iteration of the body, break and continue unwind to here
+        """
+        self.work.append((self.loopTest, stmt))
+        if isinstance(stmt, Stmt.For) and stmt.increment is not None:
+            self.work.append((self.discard, None))
+            self.evaluate(stmt.increment)
+
+    # Expression visitors, these leave the value of the expression on the value stack
+
+    def visitLiteralExpr(self, expr: Expr.Literal) -> None:
+        self.values.append(expr.value)
+
+    def visitStringExpr(self, expr: Expr.String) -> None:
+        self.values.append(expr.value)
+
+    def visitVariableExpr(self, expr: Expr.Variable) -> None:
+        self.values.append(self.interpreter.lookUpVariable(expr))
+
+    def visitGroupingExpr(self, expr: Expr.Grouping) -> None:
+        self.evaluate(expr.expression)
+
+    def visitUnaryExpr(self, expr: Expr.Unary) -> None:
+        self.work.append((self.applyUnary, expr))
+        self.evaluate(expr.right)
+
+    def visitBinaryExpr(self, expr: Expr.Binary) -> None:
+        self.work.extend(((self.applyBinary, expr), (self.evaluate, expr.right), (self.evaluate, expr.left)))
+
+    def visitLogicalExpr(self, expr: Expr.Logical) -> None:
+        self.work.append((self.applyLogical, expr))
+        self.evaluate(expr.left)
+
+    def visitTernaryExpr(self, expr: Expr.Ternary) -> None:
+        self.work.append((self.applyTernary, expr))
+        self.evaluate(expr.condition)
+
+    def visitAssignExpr(self, expr: Expr.Assign) -> None:
+        self.work.append((self.applyAssign, expr))
+        self.evaluate(expr.value)
+
+    def visitArrayExpr(self, expr: Expr.Array) -> None:
+        self.work.append((self.applyArray, expr))
+        self.work.extend((self.evaluate, element) for element in reversed(expr.elements))
+
+    def visitMapExpr(self, expr: Expr.Map) -> None:
+        self.work.append((self.applyMap, expr))
+        for key, value in reversed(list(zip(expr.keys, expr.values))):
+            self.work.extend(((self.evaluate, value), (self.evaluate, key)))
+
+    def visitIndexExpr(self, expr: Expr.Index) -> None:
+        self.work.extend(((self.applyIndex, expr), (self.evaluate, expr.index), (self.evaluate, expr.object)))
+
+    def visitSetIndexExpr(self, expr: Expr.SetIndex) -> None:
+        self.work.extend(((self.applySetIndex, expr), (self.evaluate, expr.value), (self.evaluate, expr.index), (self.evaluate, expr.object)))
+
+    def visitCallExpr(self, expr: Expr.Call) -> None:
+        self.scheduleCall(self.applyCall, expr)
+
+    def visitGetExpr(self, expr: Expr.Get) -> None:
+        self.work.append((self.applyGet, expr))
+        self.evaluate(expr.object)
+
+    def visitSetExpr(self, expr: Expr.Set) -> None:
+        self.work.extend(((self.applySet, expr), (self.evaluate, expr.value), (self.evaluate, expr.object)))
+
+    def visitThisExpr(self, expr: Expr.This) -> None:
+        self.values.append(self.interpreter.lookUpVariable(expr))
+
+    def visitSuperExpr(self, expr: Expr.Super) -> None:
+        # The receiver is this, which is only looked up
+        self.values.append(self.interpreter.visitSuperExpr(expr))
+
+    # Statement visitors
+
+    def visitBlockStmt(self, stmt: Stmt.Block) -> None:
+        size: int | None = self.interpreter.frameSizes.get(stmt)
+        if size is not None:
+            environment: Environment = self.interpreter.environment
+            self.work.append((self.restoreEnvironment, environment))
+            self.interpreter.environment = Environment(environment, [None] * size, environment.upvalues)
+        self.executeStatements(stmt.statements)
+
+    def visitClassStmt(self, stmt: Stmt.Class) -> None:
+        if stmt.superclass is None:
+            self.interpreter.defineClass(stmt, None)
+            return
+        self.work.append((self.applyClass, stmt))
+        self.evaluate(stmt.superclass)
+
+    def visitControlStmt(self, stmt: Stmt.Control) -> None:
+        self.unwind(Signal.BREAK if stmt.control.type == TokenType.BREAK else Signal.CONTINUE)
+
+    def visitReturnStmt(self, stmt: Stmt.Return) -> None:
+        call: Expr.Call | None = self.interpreter.tailCalls.get(stmt)
+        if call is not None:
+            self.scheduleCall(self.applyTailCall, call)
+            return
+
+        self.work.append((self.applyReturn, None))
+        if stmt.value is not None:
+            self.evaluate(stmt.value)
+        else:
+            self.values.append(None)
+
+    def visitPrintStmt(self, stmt: Stmt.Print) -> None:
+        self.work.append((self.applyPrint, None))
+        self.evaluate(stmt.expression)
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression) -> None:
+        self.work.append((self.discard, None))
+        self.evaluate(stmt.expression)
+
+    def visitForStmt(self, stmt: Stmt.For) -> None:
+        self.work.append((self.loopTest, stmt))
+        if stmt.initializer is not None:
+            self.execute(stmt.initializer)
+
+    def visitFunctionStmt(self, stmt: Stmt.Function) -> None:
+        # Declaring a function doesn't evaluate anything
+        self.interpreter.visitFunctionStmt(stmt)
+
+    def visitIfStmt(self, stmt: Stmt.If) -> None:
+        self.work.append((self.applyIf, stmt))
+        self.evaluate(stmt.condition)
+
+    def visitVarStmt(self, stmt: Stmt.Var) -> None:
+        self.work.append((self.applyVar, stmt))
+        if stmt.initializer is not None:
+            self.evaluate(stmt.initializer)
+        else:
+            self.values.append(None)
+
+    def visitWhileStmt(self, stmt: Stmt.While) -> None:
+        self.work.append((self.loopTest, stmt))
@@ -1,6 +1,7 @@
 # This file is auto-generated from tool/GenerateAst.py
 # Do not modify!
 
+from __future__ import annotations
 from Token import Token
 from Expr import *
 
@@ -14,6 +15,15 @@ class Block(Stmt):
     def accept(self, visitor: any) -> any:
         return visitor.visitBlockStmt(self)
 
+class Class(Stmt):
+    def __init__(self, name: Token, superclass: Variable, methods: list[Function]):
+        self.name: Token = name
+        self.superclass: Variable = superclass
+        self.methods: list[Function] = methods
+
+    def accept(self, visitor: any) -> any:
+        return visitor.visitClassStmt(self)
+
 class Control(Stmt):
     def __init__(self, control: Token):
         self.control: Token = control
@@ -39,10 +49,11 @@ class For(Stmt):
         return visitor.visitForStmt(self)
 
 class Function(Stmt):
-    def __init__(self, name: Token, params: list[Token], body: list[Stmt]):
+    def __init__(self, name: Token, params: list[Token], body: list[Stmt], annotations: list[Token]):
         self.name: Token = name
         self.params: list[Token] = params
         self.body: list[Stmt] = body
+        self.annotations: list[Token] = annotations
 
     def accept(self, visitor: any) -> any:
         return visitor.visitFunctionStmt(self)
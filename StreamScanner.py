@@ -0,0 +1,58 @@
+import codecs
+import mmap
+from typing import BinaryIO, Iterator, TextIO
+from ErrorManager import ErrorManager
+from SymbolTable import SymbolTable
+from TokenType import TokenType
+from Token import Token
+from Scanner import Scanner
+from FastScanner import FastScanner
+
+class StreamScanner(FastScanner):
+    """
+    Lazily scans tokens from a file object or mmap, reading the source in chunks so that only the
+    unscanned tail of the input is held in memory
+    """
+
+    CHUNK_SIZE: int = 1 << 16
+
+    def __init__(self, errorManager: ErrorManager, stream: TextIO | BinaryIO | mmap.mmap, symbols: SymbolTable | None = None, chunkSize: int = CHUNK_SIZE) -> None:
+        super().__init__(errorManager, "", symbols)
+        self.stream = stream
+        self.chunkSize: int = chunkSize
+        self.decoder: codecs.IncrementalDecoder = codecs.getincrementaldecoder("utf-8")()
+        self.eof: bool = False
+
+    def read(self, size: int) -> str:
+        """
+        Read the next piece of the source, returns an empty string only at the end of the stream
+        """
+        text: str = ""
+        while not text and not self.eof:
+            data: str | bytes = self.stream.read(size)
+            self.eof = not data
+            if isinstance(data, str):
+                text = data
+            else:
+                # Binary streams and mmaps may split a multi-byte character between two reads
+                text = self.decoder.decode(data, final=self.eof)
+        return text
+
+    def iterTokens(self) -> Iterator[Token]:
+        buffer: str = ""
+        while not self.eof:
+            chunk: str = self.read(self.chunkSize)
+            if not chunk.isascii():
+                # Hand the rest of the input over to the character at a time scanner, see FastScanner.iterTokens
+                scanner: Scanner = Scanner(self.errorManager, buffer[self.start:] + chunk + self.read(-1), self.symbols)
+                scanner.line = self.line
+                yield from scanner.scanTokens()
+                return
+
+            # Drop everything which has already been scanned before appending the next chunk
+            buffer = buffer[self.start:] + chunk
+            self.start = 0
+            for type_, start, end, literal, line in self.scanBuffer(buffer, final=self.eof):
+                yield FastScanner.makeToken(type_, buffer[start:end], literal, line)
+
+        yield Token(TokenType.EOF, "", None, self.line)
@@ -0,0 +1,29 @@
+class SymbolTable:
+    """
+    Interns identifier names as small integer ids, so that scopes and environments can be keyed by
+    an int instead of hashing and comparing the name. One table is shared by everything run by a
+    single Lox instance so ids stay stable between REPL lines and files.
+    """
+
+    # this and super resolve like variables, so they are interned first in every table
+    THIS: int = 0
+    SUPER: int = 1
+
+    def __init__(self) -> None:
+        self.ids: dict[str, int] = {}
+        self.names: list[str] = []
+        self.intern("this")
+        self.intern("super")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def intern(self, name: str) -> int:
+        symbol: int | None = self.ids.get(name)
+        if symbol is None:
+            symbol = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return symbol
+
+    def name(self, symbol: int) -> str:
+        return self.names[symbol]
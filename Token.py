@@ -2,11 +2,14 @@ from TokenType import TokenType
 
 class Token:
 
-    def __init__(self, type_: TokenType, lexeme: str, literal: any, line: int) -> None:
+    def __init__(self, type_: TokenType, lexeme: str, literal: any, line: int, symbol: int|None = None) -> None:
         self.type: TokenType = type_
         self.lexeme: str = lexeme
         self.literal: any = literal
         self.line: int = line
 
+        # Interned id of the lexeme in the SymbolTable, only set for identifiers, this and super
+        self.symbol: int|None = symbol
+
     def __str__(self) -> str:
         return f"Token(type_={self.type}, lexeme=\"{self.lexeme}\", literal={self.literal}, line={self.line})"
@@ -0,0 +1,130 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_right
+from typing import Iterator
+from TokenType import TokenType
+from Scanner import Scanner
+
+class TokenView:
+    """
+    Token-like view of a single entry in a TokenBuffer. The type is read when the view is created,
+    everything else is fetched from the buffer on demand.
+    """
+
+    __slots__ = ("buffer", "index", "type", "symbol", "_lexeme")
+
+    def __init__(self, buffer: TokenBuffer, index: int) -> None:
+        self.buffer: TokenBuffer = buffer
+        self.index: int = index
+        self.type: TokenType = TokenBuffer.TYPES[buffer.types[index]]
+        self.symbol: int | None = buffer.symbol(index)
+        self._lexeme: str | None = None
+
+    @property
+    def lexeme(self) -> str:
+        if self._lexeme is None:
+            self._lexeme = self.buffer.lexeme(self.index)
+        return self._lexeme
+
+    @property
+    def literal(self) -> any:
+        return self.buffer.literal(self.index)
+
+    @property
+    def line(self) -> int:
+        return self.buffer.line(self.index)
+
+    @property
+    def column(self) -> int:
+        return self.buffer.column(self.index)
+
+    def __str__(self) -> str:
+        return f"Token(type_={self.type}, lexeme=\"{self.lexeme}\", literal={self.literal}, line={self.line})"
+
+class TokenBuffer:
+    """
+    Compact struct of arrays token store. Instead of a Token object per token it keeps parallel
+    array columns for the type code, start and end offset into the source, literal index and line.
+    Identifiers never have a literal so their column holds the interned symbol instead. Lexemes are
+    sliced out of the source when asked for and columns are found with a binary search over the
+    offsets where each line starts. Lines are kept as the scanner counted them, which the offsets
+    can't always reproduce, such as after a block comment whose end the scanner doesn't count.
+    """
+
+    TYPES: list[TokenType] = list(TokenType)
+    CODES: dict[TokenType, int] = {type_: code for code, type_ in enumerate(TYPES)}
+    IDENTIFIER: int = CODES[TokenType.IDENTIFIER]
+    # Keywords which name a variable, by type code
+    KEYWORD_SYMBOLS: dict[int, int] = {code: Scanner.KEYWORD_SYMBOLS[type_] for code, type_ in enumerate(TYPES) if type_ in Scanner.KEYWORD_SYMBOLS}
+
+    def __init__(self, source: str) -> None:
+        self.source: str = source
+        self.types: array = array("B")
+        self.starts: array = array("I")
+        self.ends: array = array("I")
+        self.literalIndices: array = array("i")
+        self.literals: list[any] = []
+        self.lines: array = array("I")
+        self.lineStarts: array | None = None
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> TokenView:
+        if not -len(self) <= index < len(self):
+            raise IndexError("TokenBuffer index out of range")
+        return TokenView(self, index % len(self))
+
+    def __iter__(self) -> Iterator[TokenView]:
+        for index in range(len(self)):
+            yield TokenView(self, index)
+
+    def append(self, type_: TokenType, start: int, end: int, literal: any, line: int) -> None:
+        """
+        Add a token, for identifiers pass the symbol in place of the literal like FastScanner.scanBuffer
+        """
+        self.types.append(TokenBuffer.CODES[type_])
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(line)
+        if type_ == TokenType.IDENTIFIER:
+            self.literalIndices.append(literal)
+        elif literal is None:
+            self.literalIndices.append(-1)
+        else:
+            self.literalIndices.append(len(self.literals))
+            self.literals.append(literal)
+
+    def lexeme(self, index: int) -> str:
+        return self.source[self.starts[index]:self.ends[index]]
+
+    def literal(self, index: int) -> any:
+        literalIndex: int = self.literalIndices[index]
+        if literalIndex < 0 or self.types[index] == TokenBuffer.IDENTIFIER:
+            return None
+        return self.literals[literalIndex]
+
+    def symbol(self, index: int) -> int | None:
+        if self.types[index] == TokenBuffer.IDENTIFIER:
+            return self.literalIndices[index]
+        return TokenBuffer.KEYWORD_SYMBOLS.get(self.types[index])
+
+    def lineIndex(self) -> array:
+        """
+        Offsets of the first character on every line, only built once a column is asked for
+        """
+        if self.lineStarts is None:
+            self.lineStarts = array("I", [0])
+            newline: int = self.source.find("\n")
+            while newline >= 0:
+                self.lineStarts.append(newline+1)
+                newline = self.source.find("\n", newline+1)
+        return self.lineStarts
+
+    def line(self, index: int) -> int:
+        return self.lines[index]
+
+    def column(self, index: int) -> int:
+        start: int = self.starts[index]
+        lineStarts: array = self.lineIndex()
+        return start - lineStarts[bisect_right(lineStarts, start)-1] + 1
@@ -7,6 +7,8 @@ class TokenType(Enum):
     RIGHT_PAREN = auto()
     LEFT_BRACE = auto()
     RIGHT_BRACE = auto()
+    LEFT_BRACKET = auto()
+    RIGHT_BRACKET = auto()
     COMMA = auto()
     DOT = auto()
     MINUS = auto()
@@ -18,6 +20,7 @@ class TokenType(Enum):
     CARROT = auto()
     QUESTION = auto()
     COLON = auto()
+    AT = auto()
 
     # One or two character tokens
     BANG = auto()
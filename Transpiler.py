@@ -0,0 +1,772 @@
+from __future__ import annotations
+import ast
+import itertools
+import types
+from enum import Enum, auto
+import Expr
+import Stmt
+from LoxCallable import LoxCallable
+from LoxArray import LoxArray, getIndex, setIndex
+from LoxMap import LoxMap, MapView
+from LoxClass import BoundMethod, LoxClass, LoxInstance, PropertyCache, findMethod, getProperty, setProperty, superMethod
+from ErrorManager import *
+from Token import Token
+from TokenType import TokenType
+from SymbolTable import SymbolTable
+from Environment import Cell
+from Interpreter import Interpreter
+
+NUMBER: tuple[type, ...] = (int, float)
+INTEGER: tuple[type, ...] = (int,)
+
+# Operations where Python would accept operands that Lox doesn't, they raise TypeError like the native
+# operators do so both kinds of failure are reported the same way
+
+def multiply(left: any, right: any) -> any:
+    if isinstance(left, NUMBER) and isinstance(right, NUMBER):
+        return left * right
+    raise TypeError("Operands must be numbers")
+
+def power(left: any, right: any) -> any:
+    if isinstance(left, int) and isinstance(right, int):
+        return left ** right
+    raise TypeError("Operands must be integers")
+
+def greater(left: any, right: any) -> bool:
+    if isinstance(left, NUMBER) and isinstance(right, NUMBER):
+        return left > right
+    raise TypeError("Operands must be numbers")
+
+def greaterEqual(left: any, right: any) -> bool:
+    if isinstance(left, NUMBER) and isinstance(right, NUMBER):
+        return left >= right
+    raise TypeError("Operands must be numbers")
+
+def less(left: any, right: any) -> bool:
+    if isinstance(left, NUMBER) and isinstance(right, NUMBER):
+        return left < right
+    raise TypeError("Operands must be numbers")
+
+def lessEqual(left: any, right: any) -> bool:
+    if isinstance(left, NUMBER) and isinstance(right, NUMBER):
+        return left <= right
+    raise TypeError("Operands must be numbers")
+
+def store(cell: Cell, value: any) -> any:
+    cell.value = value
+    return value
+
+class Failure(Enum):
+    """
+    The Python exception a location in the generated code can raise, and how to report it
+    """
+    # TypeError from an operator which needs numbers or integers
+    OPERAND = auto()
+    # TypeError from adding anything but two numbers or two strings
+    ADD = auto()
+    # TypeError from calling something which isn't a function or with the wrong number of arguments
+    CALL = auto()
+    # NameError from a global which isn't defined
+    GLOBAL = auto()
+    # NativeError from indexing, making a map or a class, or properties, which carries its own message
+    NATIVE = auto()
+
+class Location:
+    """
+    A node of the generated code which can fail. The node is given the location's id as its line
+    number, so the line CPython reports in a traceback finds the location again.
+    """
+
+    __slots__ = ("failure", "line", "details")
+
+    def __init__(self, failure: Failure, line: int, details: any) -> None:
+        self.failure: Failure = failure
+        self.line: int = line
+        self.details: any = details
+
+class NativeFunction:
+    """
+    Lets generated code call a builtin LoxCallable like any other Python function
+    """
+
+    __slots__ = ("callable", "runtime")
+
+    def __init__(self, callable: LoxCallable, runtime: Transpiler) -> None:
+        self.callable: LoxCallable = callable
+        self.runtime: Transpiler = runtime
+
+    def __str__(self) -> str:
+        return str(self.callable)
+
+    def __call__(self, *arguments: any) -> any:
+        if len(arguments) != self.callable.arity():
+            raise TypeError("Wrong number of arguments")
+        return self.callable.call(self.runtime, list(arguments))
+
+    def __eq__(self, other: any) -> bool:
+        # Bound methods are made on every access, they are equal when they bind the same method to the same instance
+        if type(other) is NativeFunction:
+            return self.callable == other.callable
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.callable)
+
+    def arity(self) -> int:
+        return self.callable.arity()
+
+class Method:
+    """
+    A generated function as the method of a class, which takes the instance as its first argument
+    """
+
+    __slots__ = ("function", "name")
+
+    def __init__(self, function: types.FunctionType, name: str) -> None:
+        self.function: types.FunctionType = function
+        self.name: str = name
+
+    def __str__(self) -> str:
+        return f"<fun {self.name}>"
+
+    def __call__(self, *arguments: any) -> any:
+        return self.function(*arguments)
+
+    def arity(self) -> int:
+        return self.function.__code__.co_argcount
+
+class Variable:
+
+    def __init__(self, name: str, owner: FunctionState | None, boxed: bool) -> None:
+        # Python name of the variable
+        self.name: str = name
+        # Function declaring the variable, None for globals
+        self.owner: FunctionState | None = owner
+        # Captured variables declared inside a loop live in a Cell, so each iteration has its own
+        self.boxed: bool = boxed
+
+class FunctionState:
+    """
+    The Python function being generated, either for a Lox function or the top level of the script
+    """
+
+    def __init__(self, enclosing: FunctionState | None) -> None:
+        self.enclosing: FunctionState | None = enclosing
+        self.scopes: list[dict[int, Variable]] = []
+        self.loopDepth: int = 0
+        # Names which need global and nonlocal declarations at the top of the function
+        self.globals: set[str] = set()
+        self.nonlocals: set[str] = set()
+        # Cells of the enclosing function which the function has to capture when it is defined, not
+        # when it is called, because the enclosing function replaces them on every loop iteration
+        self.factoryParams: dict[str, None] = {}
+
+class Transpiler:
+    """
+    Engine which translates the resolved AST into Python source, so the script runs on CPython's own
+    bytecode interpreter. Lox functions become Python functions, locals become Python locals captured
+    by closures with nonlocal, and loops become native loops. Operators are native wherever Python
+    behaves the same as Lox. Every node which can fail is tagged with a location, and a failing
+    TypeError or NameError is reported as the RuntimeError the Interpreter would raise.
+    """
+
+    FILENAME: str = "<lox>"
+
+    # Line numbers of tagged nodes start here, well past the lines of any generated source
+    LOCATION_BASE: int = 1 << 24
+
+    NATIVE_OPERATORS: dict[TokenType, tuple[str, tuple[type, ...]]] = {
+        TokenType.MINUS: ("-", NUMBER),
+        TokenType.SLASH: ("/", NUMBER),
+        TokenType.AMPERSAND: ("&", INTEGER),
+        TokenType.BAR: ("|", INTEGER),
+        TokenType.CARROT: ("^", INTEGER),
+        TokenType.LESS_LESS: ("<<", INTEGER),
+        TokenType.GREATER_GREATER: (">>", INTEGER),
+    }
+
+    # Comparisons are only native when one side is a number, otherwise Python would compare strings
+    COMPARISONS: dict[TokenType, tuple[str, str]] = {
+        TokenType.GREATER: (">", "_lx_gt"),
+        TokenType.GREATER_EQUAL: (">=", "_lx_ge"),
+        TokenType.LESS: ("<", "_lx_lt"),
+        TokenType.LESS_EQUAL: ("<=", "_lx_le"),
+    }
+
+    def __init__(self, interpreter: Interpreter, emitPath: str | None = None) -> None:
+        self.interpreter: Interpreter = interpreter
+        self.errorManager: ErrorManager = interpreter.errorManager
+        # Write the generated Python here for inspection
+        self.emitPath: str | None = emitPath
+
+        self.namespace: dict[str, any] = {
+            "_lx_Cell": Cell,
+            "_lx_store": store,
+            "_lx_mul": multiply,
+            "_lx_pow": power,
+            "_lx_gt": greater,
+            "_lx_ge": greaterEqual,
+            "_lx_lt": less,
+            "_lx_le": lessEqual,
+            "_lx_stringify": self.stringify,
+            "_lx_assignable": self.assignable,
+            "_lx_array": LoxArray.of,
+            "_lx_map": LoxMap.of,
+            "_lx_index": getIndex,
+            "_lx_setindex": setIndex,
+            "_lx_class": self.makeClass,
+            "_lx_subclass": self.makeSubclass,
+            "_lx_get": self.getProperty,
+            "_lx_set": setProperty,
+            "_lx_invoke": self.invoke,
+            "_lx_super": self.superMethod,
+        }
+        for symbol, value in interpreter.globals.values.items():
+            if isinstance(value, LoxCallable):
+                value = NativeFunction(value, self)
+            self.namespace[Transpiler.globalName(interpreter.symbols.name(symbol))] = value
+
+        self.locations: dict[int, Location] = {}
+        self.nextLocation = itertools.count(Transpiler.LOCATION_BASE)
+        self.nameCounts: dict[str, int] = {}
+        # Lox name of every generated function, by its Python name
+        self.functionNames: dict[str, str] = {}
+        self.factories = itertools.count()
+        self.propertyCaches = itertools.count()
+
+        # Per transpile
+        self.state: FunctionState | None = None
+        self.definedGlobals: set[str] = set()
+
+    # Runtime
+
+    def interpret(self, statements: list[Stmt.Stmt]) -> None:
+        tree: ast.Module = self.transpile(statements)
+        if self.emitPath is not None:
+            with open(self.emitPath, "w") as f:
+                # The helpers it calls are defined by the Transpiler rather than in the file
+                f.write(f"# Transpiled from Lox, runs in the namespace of {type(self).__name__}\n")
+                f.write(ast.unparse(tree) + "\n")
+
+        code: types.CodeType = compile(tree, Transpiler.FILENAME, "exec")
+        self.namespace["_lx_print"] = self.interpreter.output.write
+        try:
+            exec(code, self.namespace)
+        except RuntimeError as error:
+            self.interpreter.runtimeError(error)
+        except (TypeError, NameError, NativeError, RecursionError) as error:
+            runtimeError: RuntimeError | None = self.translate(error)
+            if runtimeError is None:
+                raise
+            self.interpreter.runtimeError(runtimeError)
+
+    def stringify(self, object: any) -> str:
+        if type(object) is types.FunctionType:
+            return f"<fun {self.functionNames[object.__name__]}>"
+        if type(object) is LoxArray or type(object) is LoxMap or type(object) is MapView:
+            # Generated functions can be elements, keys or values too, which str() can't show as Lox functions
+            return object.format(self.stringify)
+        return self.interpreter.stringify(object)
+
+    def assignable(self, name: str, value: any) -> any:
+        """
+        Globals have to be declared before they are assigned to
+        """
+        if name not in self.namespace:
+            raise NameError(name)
+        return value
+
+    def callback(self, callee: any, arguments: list[any]) -> any:
+        """
+        Call a Lox value from a builtin, such as the function given to map
+        """
+        if not callable(callee):
+            raise NativeError("Did not find function or class")
+        arity: int = Transpiler.arity(callee)
+        if len(arguments) != arity:
+            raise NativeError(f"Expected {arity} arguments but got {len(arguments)}")
+        return callee(*arguments)
+
+    @staticmethod
+    def arity(callee: any) -> int:
+        return callee.__code__.co_argcount if type(callee) is types.FunctionType else callee.arity()
+
+    def makeClass(self, name: str, *methods: types.FunctionType) -> NativeFunction:
+        return NativeFunction(LoxClass(name, None, self.methods(methods)), self)
+
+    def makeSubclass(self, name: str, superclass: any, *methods: types.FunctionType) -> NativeFunction:
+        # Classes are wrapped like builtins so generated code can call them
+        if type(superclass) is NativeFunction:
+            superclass = superclass.callable
+        if type(superclass) is not LoxClass:
+            raise NativeError("Superclass must be a class")
+        return NativeFunction(LoxClass(name, superclass, self.methods(methods)), self)
+
+    def methods(self, functions: tuple[types.FunctionType, ...]) -> dict[str, Method]:
+        methods: dict[str, Method] = {}
+        for function in functions:
+            name: str = self.functionNames[function.__name__]
+            methods[name] = Method(function, name)
+        return methods
+
+    def getProperty(self, object: any, name: str, cache: PropertyCache) -> any:
+        value: any = getProperty(object, name, cache)
+        return NativeFunction(value, self) if type(value) is BoundMethod else value
+
+    def invoke(self, object: any, name: str, cache: PropertyCache, *arguments: any) -> any:
+        """
+        Call the property name of object. A method is called without binding it, with object as its
+        first argument.
+        """
+        if type(object) is LoxInstance and object.shape is cache.shape:
+            method: Method | None = cache.method
+        else:
+            method = findMethod(object, name, cache)
+        if method is None:
+            return self.callback(object.values[cache.slot], list(arguments))
+        if len(arguments) + 1 != method.arity():
+            raise NativeError(f"Expected {method.arity() - 1} arguments but got {len(arguments)}")
+        return method.function(object, *arguments)
+
+    def superMethod(self, superclass: NativeFunction, receiver: LoxInstance, name: str) -> NativeFunction:
+        return NativeFunction(superMethod(superclass.callable, receiver, name), self)
+
+    def translate(self, error: TypeError | NameError | NativeError | RecursionError) -> RuntimeError | None:
+        """
+        The RuntimeError the Interpreter would have raised instead of error, if it came from a tagged node
+        """
+        frame: types.FrameType | None = None
+        tb: types.TracebackType | None = error.__traceback__
+        while tb is not None:
+            # The innermost generated frame is the one where the Lox code failed
+            if tb.tb_frame.f_code.co_filename == Transpiler.FILENAME:
+                frame, lineno = tb.tb_frame, tb.tb_lineno
+            tb = tb.tb_next
+        if frame is None or lineno not in self.locations:
+            return None
+
+        location: Location = self.locations[lineno]
+        token: Token = Token(TokenType.EOF, "", None, location.line)
+        match location.failure:
+            case _ if isinstance(error, RecursionError):
+                # Generated functions call each other as Python functions, deep recursion runs out of Python stack
+                return RuntimeError(token, "Stack overflow")
+            case Failure.OPERAND if isinstance(error, TypeError):
+                return RuntimeError(token, f"Operand must be one of the following types: {', '.join(t.__name__ for t in location.details)}")
+            case Failure.ADD if isinstance(error, TypeError):
+                left, right = (Transpiler.operandValue(frame, operand) for operand in location.details)
+                return RuntimeError(token, f"Cannot add types of {type(left).__name__} and {type(right).__name__}")
+            case Failure.CALL if isinstance(error, TypeError):
+                operand, argumentCount = location.details
+                callee: any = Transpiler.operandValue(frame, operand)
+                if not callable(callee):
+                    return RuntimeError(token, "Did not find function or class")
+                arity: int = Transpiler.arity(callee)
+                return RuntimeError(token, f"Expected {arity} arguments but got {argumentCount}")
+            case Failure.GLOBAL if isinstance(error, NameError):
+                return RuntimeError(token, f"Undefined variable: {location.details}")
+            case Failure.CALL | Failure.NATIVE if isinstance(error, NativeError):
+                return RuntimeError(token, error.message)
+        return None
+
+    @staticmethod
+    def operandValue(frame: types.FrameType, operand: tuple[str, any]) -> any:
+        kind, value = operand
+        if kind == "value":
+            return value
+        return frame.f_locals[value] if value in frame.f_locals else frame.f_globals[value]
+
+    # Code generation
+
+    def transpile(self, statements: list[Stmt.Stmt]) -> ast.Module:
+        """
+        Translate the statements into a module defining and calling _lx_main
+        """
+        self.state = FunctionState(None)
+        self.definedGlobals = set(self.namespace)
+        body: list[str] = self.statements(statements)
+        main: list[str] = ["def _lx_main():"] + Transpiler.indent(self.declarations(self.state) + body) + ["_lx_main()"]
+        self.state = None
+
+        return TagLocations().visit(ast.parse("\n".join(main), Transpiler.FILENAME))
+
+    @staticmethod
+    def indent(lines: list[str]) -> list[str]:
+        return ["    " + line for line in lines] or ["    pass"]
+
+    @staticmethod
+    def globalName(name: str) -> str:
+        return "g_" + name
+
+    def uniqueName(self, prefix: str, name: str) -> str:
+        """
+        Python name for a Lox local. Python scopes are per function rather than per block so each
+        declaration gets its own name: v_x, then v1_x, v2_x and so on.
+        """
+        count: int = self.nameCounts.get(prefix + name, 0)
+        self.nameCounts[prefix + name] = count + 1
+        return f"{prefix}_{name}" if count == 0 else f"{prefix}{count}_{name}"
+
+    def tag(self, failure: Failure, line: int, details: any, code: str) -> str:
+        location: int = next(self.nextLocation)
+        self.locations[location] = Location(failure, line, details)
+        return f"_lx_at({location}, {code})"
+
+    def operand(self, expr: Expr.Expr, code: str, temporary: str) -> tuple[str, tuple[str, any]]:
+        """
+        Keep hold of an operand so its value can be found if the operation fails, returns the code to
+        use for it and where to find the value
+        """
+        if isinstance(expr, (Expr.Literal, Expr.String)):
+            return code, ("value", expr.value)
+        if code.isidentifier():
+            return code, ("name", code)
+        return f"({temporary} := {code})", ("name", temporary)
+
+    def declarations(self, state: FunctionState) -> list[str]:
+        lines: list[str] = []
+        if state.globals:
+            lines.append(f"global {', '.join(sorted(state.globals))}")
+        if state.nonlocals:
+            lines.append(f"nonlocal {', '.join(sorted(state.nonlocals))}")
+        return lines
+
+    def resolve(self, name: Token) -> Variable | None:
+        state: FunctionState | None = self.state
+        while state is not None:
+            for scope in reversed(state.scopes):
+                variable: Variable | None = scope.get(name.symbol)
+                if variable is not None:
+                    return variable
+            state = state.enclosing
+        return None
+
+    def reference(self, variable: Variable, assign: bool) -> None:
+        if variable.owner is self.state:
+            return
+
+        if variable.boxed:
+            # The function nested directly in the owner captures the current cell when it is defined
+            state: FunctionState = self.state
+            while state.enclosing is not variable.owner:
+                state = state.enclosing
+            state.factoryParams[variable.name] = None
+        elif assign:
+            self.state.nonlocals.add(variable.name)
+
+    def declare(self, name: Token, captured: bool) -> Variable:
+        if not self.state.scopes:
+            variable: Variable = Variable(Transpiler.globalName(name.lexeme), None, False)
+            self.state.globals.add(variable.name)
+            return variable
+
+        variable = Variable(self.uniqueName("v", name.lexeme), self.state, captured and self.state.loopDepth > 0)
+        self.state.scopes[-1][name.symbol] = variable
+        return variable
+
+    def assign(self, name: Token, value: str, statement: bool) -> str:
+        variable: Variable | None = self.resolve(name)
+        if variable is None:
+            target: str = Transpiler.globalName(name.lexeme)
+            self.state.globals.add(target)
+            if target not in self.definedGlobals:
+                value = self.tag(Failure.GLOBAL, name.line, name.lexeme, f"_lx_assignable({target!r}, {value})")
+        elif variable.boxed:
+            self.reference(variable, assign=True)
+            return f"{variable.name}.value = {value}" if statement else f"_lx_store({variable.name}, {value})"
+        else:
+            self.reference(variable, assign=True)
+            target = variable.name
+        return f"{target} = {value}" if statement else f"({target} := {value})"
+
+    def expr(self, expr: Expr.Expr) -> str:
+        return expr.accept(self)
+
+    def statements(self, statements: list[Stmt.Stmt]) -> list[str]:
+        lines: list[str] = []
+        for stmt in statements:
+            lines.extend(stmt.accept(self))
+        return lines
+
+    def loopBody(self, body: Stmt.Stmt) -> list[str]:
+        self.state.loopDepth += 1
+        lines: list[str] = body.accept(self)
+        self.state.loopDepth -= 1
+        return Transpiler.indent(lines)
+
+    @staticmethod
+    def continues(stmt: Stmt.Stmt) -> bool:
+        """
+        Whether stmt has a continue for the loop it is the body of
+        """
+        match stmt:
+            case Stmt.Control():
+                return stmt.control.type == TokenType.CONTINUE
+            case Stmt.Block():
+                return any(Transpiler.continues(inner) for inner in stmt.statements)
+            case Stmt.If():
+                return Transpiler.continues(stmt.thenBranch) or (stmt.elseBranch is not None and Transpiler.continues(stmt.elseBranch))
+        return False
+
+    # Expression visitors
+
+    def visitLiteralExpr(self, expr: Expr.Literal) -> str:
+        return repr(expr.value)
+
+    def visitStringExpr(self, expr: Expr.String) -> str:
+        return repr(expr.value)
+
+    def visitGroupingExpr(self, expr: Expr.Grouping) -> str:
+        return f"({self.expr(expr.expression)})"
+
+    def visitVariableExpr(self, expr: Expr.Variable) -> str:
+        return self.variable(expr.name)
+
+    def variable(self, name: Token) -> str:
+        variable: Variable | None = self.resolve(name)
+        if variable is None:
+            return self.tag(Failure.GLOBAL, name.line, name.lexeme, Transpiler.globalName(name.lexeme))
+
+        self.reference(variable, assign=False)
+        return f"{variable.name}.value" if variable.boxed else variable.name
+
+    def visitAssignExpr(self, expr: Expr.Assign) -> str:
+        return self.assign(expr.name, self.expr(expr.value), statement=False)
+
+    def visitUnaryExpr(self, expr: Expr.Unary) -> str:
+        right: str = self.expr(expr.right)
+        if expr.operator.type == TokenType.BANG:
+            return f"(not {right})"
+        return self.tag(Failure.OPERAND, expr.operator.line, NUMBER, f"(-{right})")
+
+    def visitLogicalExpr(self, expr: Expr.Logical) -> str:
+        return f"({self.expr(expr.left)} {expr.operator.lexeme} {self.expr(expr.right)})"
+
+    def visitTernaryExpr(self, expr: Expr.Ternary) -> str:
+        return f"({self.expr(expr.trueExpr)} if {self.expr(expr.condition)} else {self.expr(expr.falseExpr)})"
+
+    def visitBinaryExpr(self, expr: Expr.Binary) -> str:
+        left: str = self.expr(expr.left)
+        right: str = self.expr(expr.right)
+        token: Token = expr.operator
+
+        match token.type:
+            case TokenType.EQUAL_EQUAL:
+                return f"({left} == {right})"
+            case TokenType.BANG_EQUAL:
+                return f"({left} != {right})"
+            case TokenType.PLUS:
+                location: int = next(self.nextLocation)
+                left, leftOperand = self.operand(expr.left, left, f"_lx_l{location}")
+                right, rightOperand = self.operand(expr.right, right, f"_lx_r{location}")
+                self.locations[location] = Location(Failure.ADD, token.line, (leftOperand, rightOperand))
+                return f"_lx_at({location}, ({left} + {right}))"
+            case TokenType.STAR:
+                return self.tag(Failure.OPERAND, token.line, NUMBER, f"_lx_mul({left}, {right})")
+            case TokenType.STAR_STAR:
+                return self.tag(Failure.OPERAND, token.line, INTEGER, f"_lx_pow({left}, {right})")
+            case type_ if type_ in Transpiler.COMPARISONS:
+                native, helper = Transpiler.COMPARISONS[type_]
+                if Transpiler.isNumber(expr.left) or Transpiler.isNumber(expr.right):
+                    return self.tag(Failure.OPERAND, token.line, NUMBER, f"({left} {native} {right})")
+                return self.tag(Failure.OPERAND, token.line, NUMBER, f"{helper}({left}, {right})")
+
+        native, types_ = Transpiler.NATIVE_OPERATORS[token.type]
+        return self.tag(Failure.OPERAND, token.line, types_, f"({left} {native} {right})")
+
+    @staticmethod
+    def isNumber(expr: Expr.Expr) -> bool:
+        while isinstance(expr, Expr.Grouping):
+            expr = expr.expression
+        return isinstance(expr, Expr.Literal) and isinstance(expr.value, NUMBER)
+
+    def visitCallExpr(self, expr: Expr.Call) -> str:
+        if type(expr.callee) is Expr.Get:
+            # A method called straight from an instance isn't bound, the instance becomes its first argument
+            arguments: str = "".join(f", {self.expr(argument)}" for argument in expr.arguments)
+            code: str = f"_lx_invoke({self.expr(expr.callee.object)}, {expr.callee.name.lexeme!r}, {self.propertyCache()}{arguments})"
+            return self.tag(Failure.NATIVE, expr.paren.line, None, code)
+
+        callee: str = self.expr(expr.callee)
+        arguments: list[str] = [self.expr(argument) for argument in expr.arguments]
+        location: int = next(self.nextLocation)
+        callee, operand = self.operand(expr.callee, callee, f"_lx_c{location}")
+        self.locations[location] = Location(Failure.CALL, expr.paren.line, (operand, len(arguments)))
+        return f"_lx_at({location}, {callee}({', '.join(arguments)}))"
+
+    def visitArrayExpr(self, expr: Expr.Array) -> str:
+        return f"_lx_array([{', '.join(self.expr(element) for element in expr.elements)}])"
+
+    def visitMapExpr(self, expr: Expr.Map) -> str:
+        entries: str = ", ".join(self.expr(entry) for pair in zip(expr.keys, expr.values) for entry in pair)
+        return self.tag(Failure.NATIVE, expr.brace.line, None, f"_lx_map([{entries}])")
+
+    def visitIndexExpr(self, expr: Expr.Index) -> str:
+        return self.tag(Failure.NATIVE, expr.bracket.line, None, f"_lx_index({self.expr(expr.object)}, {self.expr(expr.index)})")
+
+    def visitSetIndexExpr(self, expr: Expr.SetIndex) -> str:
+        code: str = f"_lx_setindex({self.expr(expr.object)}, {self.expr(expr.index)}, {self.expr(expr.value)})"
+        return self.tag(Failure.NATIVE, expr.bracket.line, None, code)
+
+    def visitGetExpr(self, expr: Expr.Get) -> str:
+        code: str = f"_lx_get({self.expr(expr.object)}, {expr.name.lexeme!r}, {self.propertyCache()})"
+        return self.tag(Failure.NATIVE, expr.name.line, None, code)
+
+    def visitSetExpr(self, expr: Expr.Set) -> str:
+        code: str = f"_lx_set({self.expr(expr.object)}, {expr.name.lexeme!r}, {self.expr(expr.value)}, {self.propertyCache()})"
+        return self.tag(Failure.NATIVE, expr.name.line, None, code)
+
+    def visitThisExpr(self, expr: Expr.This) -> str:
+        return self.variable(expr.keyword)
+
+    def visitSuperExpr(self, expr: Expr.Super) -> str:
+        code: str = f"_lx_super({self.variable(expr.keyword)}, {self.expr(expr.receiver)}, {expr.method.lexeme!r})"
+        return self.tag(Failure.NATIVE, expr.method.line, None, code)
+
+    def propertyCache(self) -> str:
+        """
+        Name of a new inline cache in the namespace, for one property access
+        """
+        name: str = f"_lx_pc{next(self.propertyCaches)}"
+        self.namespace[name] = PropertyCache()
+        return name
+
+    # Statement visitors
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression) -> list[str]:
+        if isinstance(stmt.expression, Expr.Assign):
+            return [self.assign(stmt.expression.name, self.expr(stmt.expression.value), statement=True)]
+        return [self.expr(stmt.expression)]
+
+    def visitPrintStmt(self, stmt: Stmt.Print) -> list[str]:
+        return [f"_lx_print(_lx_stringify({self.expr(stmt.expression)}))"]
+
+    def visitVarStmt(self, stmt: Stmt.Var) -> list[str]:
+        value: str = self.expr(stmt.initializer) if stmt.initializer is not None else "None"
+        declaration: tuple[int, bool] | None = self.interpreter.slots.get(stmt)
+        variable: Variable = self.declare(stmt.name, declaration is not None and declaration[1])
+        if variable.owner is None:
+            self.definedGlobals.add(variable.name)
+        if variable.boxed:
+            return [f"{variable.name} = _lx_Cell({value})"]
+        return [f"{variable.name} = {value}"]
+
+    def visitFunctionStmt(self, stmt: Stmt.Function) -> list[str]:
+        # The function is in scope in its own body so it can call itself
+        declaration: tuple[int, bool] | None = self.interpreter.slots.get(stmt)
+        variable: Variable = self.declare(stmt.name, declaration is not None and declaration[1])
+        if variable.owner is None:
+            self.definedGlobals.add(variable.name)
+        name: str = self.uniqueName("f", stmt.name.lexeme) if variable.boxed else variable.name
+        lines, function = self.function(stmt, name)
+
+        if variable.boxed:
+            # The cell exists before the function is made in case the function captures itself
+            return [f"{variable.name} = _lx_Cell(None)"] + lines + [f"{variable.name}.value = {function}"]
+        if function != name:
+            return lines + [f"{variable.name} = {function}"]
+        return lines
+
+    def function(self, stmt: Stmt.Function, name: str) -> tuple[list[str], str]:
+        """
+        The definition of the Python function name for stmt, and the code giving the function once it is defined
+        """
+        self.functionNames[name] = stmt.name.lexeme
+        self.state = FunctionState(self.state)
+        self.state.scopes.append({})
+        params: list[str] = [self.declare(param, False).name for param in stmt.params]
+        body: list[str] = self.statements(stmt.body)
+        state: FunctionState = self.state
+        self.state = state.enclosing
+
+        lines: list[str] = [f"def {name}({', '.join(params)}):"] + Transpiler.indent(self.declarations(state) + body)
+        function: str = name
+        if state.factoryParams:
+            factory: str = f"_lx_make{next(self.factories)}"
+            factoryParams: str = ", ".join(state.factoryParams)
+            lines = [f"def {factory}({factoryParams}):"] + Transpiler.indent(lines + [f"return {name}"])
+            function = f"{factory}({factoryParams})"
+        return lines, function
+
+    def visitClassStmt(self, stmt: Stmt.Class) -> list[str]:
+        declaration: tuple[int, bool] | None = self.interpreter.slots.get(stmt)
+        variable: Variable = self.declare(stmt.name, declaration is not None and declaration[1])
+        if variable.owner is None:
+            self.definedGlobals.add(variable.name)
+        # The cell exists before the methods are made in case they capture the class
+        lines: list[str] = [f"{variable.name} = _lx_Cell(None)"] if variable.boxed else []
+
+        self.state.scopes.append({})
+        arguments: list[str] = [repr(stmt.name.lexeme)]
+        if stmt.superclass is not None:
+            # The methods find the superclass as the local super
+            superclass: str = self.expr(stmt.superclass)
+            keyword: Token = Token(TokenType.SUPER, "super", None, stmt.superclass.name.line, SymbolTable.SUPER)
+            superVariable: Variable = self.declare(keyword, True)
+            lines.append(f"{superVariable.name} = _lx_Cell({superclass})" if superVariable.boxed else f"{superVariable.name} = {superclass}")
+            arguments.append(self.variable(keyword))
+        for method in stmt.methods:
+            methodLines, function = self.function(method, self.uniqueName("m", method.name.lexeme))
+            lines += methodLines
+            arguments.append(function)
+        self.state.scopes.pop()
+
+        helper: str = "_lx_class" if stmt.superclass is None else "_lx_subclass"
+        klass: str = self.tag(Failure.NATIVE, stmt.name.line if stmt.superclass is None else stmt.superclass.name.line, None, f"{helper}({', '.join(arguments)})")
+        return lines + [f"{variable.name}.value = {klass}" if variable.boxed else f"{variable.name} = {klass}"]
+
+    def visitBlockStmt(self, stmt: Stmt.Block) -> list[str]:
+        self.state.scopes.append({})
+        lines: list[str] = self.statements(stmt.statements)
+        self.state.scopes.pop()
+        return lines
+
+    def visitControlStmt(self, stmt: Stmt.Control) -> list[str]:
+        return ["break" if stmt.control.type == TokenType.BREAK else "continue"]
+
+    def visitReturnStmt(self, stmt: Stmt.Return) -> list[str]:
+        if stmt.value is None:
+            return ["return None"]
+        return [f"return {self.expr(stmt.value)}"]
+
+    def visitIfStmt(self, stmt: Stmt.If) -> list[str]:
+        lines: list[str] = [f"if {self.expr(stmt.condition)}:"] + Transpiler.indent(stmt.thenBranch.accept(self))
+        if stmt.elseBranch is not None:
+            lines += ["else:"] + Transpiler.indent(stmt.elseBranch.accept(self))
+        return lines
+
+    def visitWhileStmt(self, stmt: Stmt.While) -> list[str]:
+        return [f"while {self.expr(stmt.condition)}:"] + self.loopBody(stmt.body)
+
+    def visitForStmt(self, stmt: Stmt.For) -> list[str]:
+        # The initializer declares its variable in the enclosing scope, like the tree walker
+        lines: list[str] = stmt.initializer.accept(self) if stmt.initializer is not None else []
+        condition: str = self.expr(stmt.condition)
+        increment: list[str] = self.visitExpressionStmt(Stmt.Expression(stmt.increment)) if stmt.increment is not None else []
+
+        if not increment or not Transpiler.continues(stmt.body):
+            return lines + [f"while {condition}:"] + self.loopBody(stmt.body) + Transpiler.indent(increment)
+
+        # A continue has to run the increment, so it runs at the top of every iteration but the first
+        first: str = f"_lx_first{next(self.factories)}"
+        return lines + [
+            f"{first} = True",
+            "while True:",
+            f"    if not {first}:",
+        ] + Transpiler.indent(Transpiler.indent(increment)) + [
+            f"    {first} = False",
+            f"    if not {condition}:",
+            "        break",
+        ] + self.loopBody(stmt.body)
+
+class TagLocations(ast.NodeTransformer):
+    """
+    Replace every _lx_at(location, node) in the generated code with node, numbered with the location
+    """
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        if isinstance(node.func, ast.Name) and node.func.id == "_lx_at":
+            tagged: ast.expr = self.visit(node.args[1])
+            tagged.lineno = tagged.end_lineno = node.args[0].value
+            return tagged
+        return self.generic_visit(node)
@@ -0,0 +1,526 @@
+from __future__ import annotations
+import Stmt
+from LoxCallable import LoxCallable
+from LoxArray import LoxArray, getIndex, setIndex
+from LoxMap import LoxMap
+from LoxClass import BoundMethod, LoxClass, LoxInstance, findMethod, getProperty, setProperty, superMethod
+from ErrorManager import *
+from Token import Token
+from TokenType import TokenType
+from OpCode import OpCode
+from BytecodeCompiler import BytecodeCompiler, Prototype
+from Interpreter import Interpreter
+
+NUMBER: tuple[type, ...] = (int, float)
+INTEGER: tuple[type, ...] = (int,)
+
+class Upvalue:
+    """
+    A variable captured by a closure. While the variable is still on the stack the upvalue refers to its
+    slot there, once it goes out of scope the value is moved into a list of its own. Either way it is
+    read as cells[index].
+    """
+
+    __slots__ = ("cells", "index")
+
+    def __init__(self, stack: list[any], index: int) -> None:
+        self.cells: list[any] = stack
+        self.index: int = index
+
+    def close(self) -> None:
+        self.cells = [self.cells[self.index]]
+        self.index = 0
+
+class Closure(LoxCallable):
+
+    __slots__ = ("vm", "prototype", "upvalues")
+
+    def __init__(self, vm: VM, prototype: Prototype, upvalues: list[Upvalue]) -> None:
+        self.vm: VM = vm
+        self.prototype: Prototype = prototype
+        self.upvalues: list[Upvalue] = upvalues
+
+    def __str__(self) -> str:
+        return str(self.prototype)
+
+    def arity(self) -> int:
+        return self.prototype.arity
+
+    def call(self, interpreter: Interpreter, arguments: list[any]) -> any:
+        return self.vm.invoke(self, arguments)
+
+class CallFrame:
+
+    __slots__ = ("closure", "ip", "base", "instance")
+
+    def __init__(self, closure: Closure, base: int, instance: LoxInstance | None = None) -> None:
+        self.closure: Closure = closure
+        self.ip: int = 0
+        # Stack index of slot zero, which holds the closure, arguments and locals follow it
+        self.base: int = base
+        # For an initializer called by calling its class, the new instance which the call returns
+        self.instance: LoxInstance | None = instance
+
+class VM:
+    """
+    Runs the bytecode from the BytecodeCompiler with a value stack and a stack of call frames. Calls
+    between Lox functions don't recurse in Python, so the depth of Lox recursion is only limited by
+    FRAMES_MAX. The globals, stringify and error reporting of the Interpreter are shared.
+    """
+
+    FRAMES_MAX: int = 1 << 16
+
+    def __init__(self, interpreter: Interpreter) -> None:
+        self.interpreter: Interpreter = interpreter
+        self.errorManager: ErrorManager = interpreter.errorManager
+        self.globals: dict[int, any] = interpreter.globals.values
+        self.stack: list[any] = []
+        self.frames: list[CallFrame] = []
+        # Upvalues still referring to the stack, by stack index
+        self.openUpvalues: dict[int, Upvalue] = {}
+
+    def interpret(self, statements: list[Stmt.Stmt]) -> None:
+        compiler: BytecodeCompiler = BytecodeCompiler(self.errorManager)
+        script: Prototype = compiler.compile(statements)
+        if self.errorManager.hadError:
+            return
+
+        try:
+            try:
+                self.invoke(Closure(self, script, []), [])
+            except RecursionError:
+                # Builtins calling back into Lox, such as map, nest Python calls and can run out of Python stack first
+                raise VM.error(self.currentLine(), "Stack overflow")
+        except RuntimeError as error:
+            self.interpreter.runtimeError(error)
+            self.stack.clear()
+            self.frames.clear()
+            self.openUpvalues.clear()
+
+    def invoke(self, closure: Closure, arguments: list[any]) -> any:
+        """
+        Call closure from Python and run until it returns
+        """
+        if len(self.frames) >= VM.FRAMES_MAX:
+            raise VM.error(self.currentLine(), "Stack overflow")
+        base: int = len(self.stack)
+        self.stack.append(closure)
+        self.stack.extend(arguments)
+        self.frames.append(CallFrame(closure, base))
+        return self.run(len(self.frames) - 1)
+
+    def currentLine(self) -> int:
+        if not self.frames:
+            return 0
+        frame: CallFrame = self.frames[-1]
+        return frame.closure.prototype.chunk.lines[max(frame.ip - 1, 0)]
+
+    def captureUpvalue(self, index: int) -> Upvalue:
+        upvalue: Upvalue | None = self.openUpvalues.get(index)
+        if upvalue is None:
+            upvalue = self.openUpvalues[index] = Upvalue(self.stack, index)
+        return upvalue
+
+    def closeUpvalues(self, last: int) -> None:
+        """
+        Close every open upvalue for a stack slot at or above last
+        """
+        for index in [index for index in self.openUpvalues if index >= last]:
+            self.openUpvalues.pop(index).close()
+
+    def callValue(self, callee: any, argCount: int, line: int, hidden: int = 0) -> CallFrame:
+        """
+        Call callee, which is on the stack below its arguments, the slow way: anything but a closure
+        called with the right number of arguments. Returns the frame to carry on running, which is a
+        new one if a closure was called. Classes and bound methods call their initializer or method
+        with the instance as a hidden first argument, which hidden counts so errors can leave it out.
+        """
+        stack: list[any] = self.stack
+        instance: LoxInstance | None = None
+        if type(callee) is BoundMethod:
+            stack.insert(len(stack) - argCount, callee.receiver)
+            callee = callee.method
+            argCount += 1
+            hidden += 1
+        elif type(callee) is LoxClass:
+            instance = LoxInstance(callee.shape)
+            if callee.initializer is None:
+                if argCount != 0:
+                    raise VM.error(line, f"Expected 0 arguments but got {argCount}")
+                stack[-1] = instance
+                return self.frames[-1]
+            stack.insert(len(stack) - argCount, instance)
+            callee = callee.initializer
+            argCount += 1
+            hidden += 1
+        stack[-1 - argCount] = callee
+
+        if type(callee) is Closure:
+            if argCount != callee.prototype.arity:
+                raise VM.error(line, f"Expected {callee.prototype.arity - hidden} arguments but got {argCount - hidden}")
+            if len(self.frames) >= VM.FRAMES_MAX:
+                raise VM.error(line, "Stack overflow")
+            frame: CallFrame = CallFrame(callee, len(stack) - argCount - 1, instance)
+            self.frames.append(frame)
+            return frame
+
+        if not isinstance(callee, LoxCallable):
+            raise VM.error(line, "Did not find function or class")
+        if argCount != callee.arity():
+            raise VM.error(line, f"Expected {callee.arity() - hidden} arguments but got {argCount - hidden}")
+        arguments: list[any] = stack[len(stack) - argCount:]
+        del stack[len(stack) - argCount - 1:]
+        try:
+            result: any = callee.call(self.interpreter, arguments)
+        except NativeError as error:
+            raise VM.error(line, error.message)
+        stack.append(instance if instance is not None else result)
+        return self.frames[-1]
+
+    @staticmethod
+    def error(line: int, message: str) -> RuntimeError:
+        # Runtime errors only need the line of their token
+        return RuntimeError(Token(TokenType.EOF, "", None, line), message)
+
+    @staticmethod
+    def operandError(line: int, types: tuple[type, ...]) -> RuntimeError:
+        return VM.error(line, f"Operand must be one of the following types: {', '.join(t.__name__ for t in types)}")
+
+    def run(self, exitDepth: int) -> any:
+        """
+        Execute instructions until the frame at exitDepth returns, and return its result
+        """
+        stack: list[any] = self.stack
+        frames: list[CallFrame] = self.frames
+        globals: dict[int, any] = self.globals
+        push = stack.append
+        pop = stack.pop
+
+        frame: CallFrame = frames[-1]
+        closure: Closure = frame.closure
+        code = closure.prototype.chunk.code
+        constants: list[any] = closure.prototype.chunk.constants
+        lines = closure.prototype.chunk.lines
+        ip: int = frame.ip
+        base: int = frame.base
+
+        # Compare opcodes as plain ints, checked roughly from most to least frequent
+        (CONSTANT, NIL, TRUE, FALSE, POP, GET_LOCAL, SET_LOCAL, GET_UPVALUE, SET_UPVALUE, GET_GLOBAL, SET_GLOBAL,
+         DEFINE_GLOBAL, EQUAL, NOT_EQUAL, GREATER, GREATER_EQUAL, LESS, LESS_EQUAL, ADD, SUBTRACT, MULTIPLY,
+         DIVIDE, POWER, BIT_AND, BIT_OR, BIT_XOR, SHIFT_LEFT, SHIFT_RIGHT, NOT, NEGATE, PRINT, JUMP,
+         JUMP_IF_FALSE, LOOP, CALL, CLOSURE, CLOSE_UPVALUE, RETURN, ARRAY, MAP, GET_INDEX, SET_INDEX, CLASS, INHERIT,
+         METHOD, GET_PROPERTY, SET_PROPERTY, INVOKE, GET_SUPER) = map(int, OpCode)
+
+        while True:
+            op: int = code[ip]
+            ip += 1
+
+            if op == GET_LOCAL:
+                push(stack[base + code[ip]])
+                ip += 1
+            elif op == CONSTANT:
+                push(constants[code[ip]])
+                ip += 1
+            elif op == POP:
+                pop()
+            elif op == JUMP_IF_FALSE:
+                if stack[-1]:
+                    ip += 1
+                else:
+                    ip += code[ip] + 1
+            elif op == SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif op == GET_GLOBAL:
+                symbol, name = constants[code[ip]]
+                ip += 1
+                if symbol not in globals:
+                    raise VM.error(lines[ip - 1], f"Undefined variable: {name}")
+                push(globals[symbol])
+            elif op == ADD:
+                b = pop()
+                a = stack[-1]
+                if (isinstance(a, NUMBER) and isinstance(b, NUMBER)) or (isinstance(a, str) and isinstance(b, str)):
+                    stack[-1] = a + b
+                else:
+                    raise VM.error(lines[ip - 1], f"Cannot add types of {type(a).__name__} and {type(b).__name__}")
+            elif op == SUBTRACT:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, NUMBER) and isinstance(b, NUMBER)):
+                    raise VM.operandError(lines[ip - 1], NUMBER)
+                stack[-1] = a - b
+            elif op == LESS:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, NUMBER) and isinstance(b, NUMBER)):
+                    raise VM.operandError(lines[ip - 1], NUMBER)
+                stack[-1] = a < b
+            elif op == LOOP:
+                ip -= code[ip] - 1
+            elif op == JUMP:
+                ip += code[ip] + 1
+            elif op == GET_UPVALUE:
+                upvalue: Upvalue = closure.upvalues[code[ip]]
+                push(upvalue.cells[upvalue.index])
+                ip += 1
+            elif op == SET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                upvalue.cells[upvalue.index] = stack[-1]
+                ip += 1
+            elif op == CALL:
+                argCount: int = code[ip]
+                ip += 1
+                callee: any = stack[-1 - argCount]
+                frame.ip = ip
+                if type(callee) is Closure and argCount == callee.prototype.arity and len(frames) < VM.FRAMES_MAX:
+                    frame = CallFrame(callee, len(stack) - argCount - 1)
+                    frames.append(frame)
+                else:
+                    frame = self.callValue(callee, argCount, lines[ip - 1])
+                closure = frame.closure
+                code = closure.prototype.chunk.code
+                constants = closure.prototype.chunk.constants
+                lines = closure.prototype.chunk.lines
+                ip = frame.ip
+                base = frame.base
+            elif op == RETURN:
+                result: any = pop()
+                if frame.instance is not None:
+                    # What an initializer returns is dropped for the new instance
+                    result = frame.instance
+                if self.openUpvalues:
+                    self.closeUpvalues(base)
+                del stack[base:]
+                frames.pop()
+                if len(frames) == exitDepth:
+                    return result
+
+                push(result)
+                frame = frames[-1]
+                closure = frame.closure
+                code = closure.prototype.chunk.code
+                constants = closure.prototype.chunk.constants
+                lines = closure.prototype.chunk.lines
+                ip = frame.ip
+                base = frame.base
+            elif op == GET_PROPERTY:
+                name, cache = constants[code[ip]]
+                ip += 1
+                a = stack[-1]
+                if type(a) is LoxInstance and a.shape is cache.shape and cache.method is None:
+                    stack[-1] = a.values[cache.slot]
+                else:
+                    try:
+                        stack[-1] = getProperty(a, name, cache)
+                    except NativeError as error:
+                        raise VM.error(lines[ip - 1], error.message)
+            elif op == INVOKE:
+                name, cache = constants[code[ip]]
+                argCount = code[ip + 1]
+                ip += 2
+                a = stack[-1 - argCount]
+                if type(a) is LoxInstance and a.shape is cache.shape:
+                    method: any = cache.method
+                else:
+                    try:
+                        method = findMethod(a, name, cache)
+                    except NativeError as error:
+                        raise VM.error(lines[ip - 1], error.message)
+
+                frame.ip = ip
+                if method is None:
+                    # A field holding something to call, which is called like any other value
+                    stack[-1 - argCount] = a.values[cache.slot]
+                    frame = self.callValue(stack[-1 - argCount], argCount, lines[ip - 1])
+                else:
+                    # The method isn't bound, the instance stays in place as its first argument
+                    stack.insert(len(stack) - argCount - 1, method)
+                    if type(method) is Closure and argCount + 1 == method.prototype.arity and len(frames) < VM.FRAMES_MAX:
+                        frame = CallFrame(method, len(stack) - argCount - 2)
+                        frames.append(frame)
+                    else:
+                        frame = self.callValue(method, argCount + 1, lines[ip - 1], 1)
+                closure = frame.closure
+                code = closure.prototype.chunk.code
+                constants = closure.prototype.chunk.constants
+                lines = closure.prototype.chunk.lines
+                ip = frame.ip
+                base = frame.base
+            elif op == NIL:
+                push(None)
+            elif op == TRUE:
+                push(True)
+            elif op == FALSE:
+                push(False)
+            elif op == SET_GLOBAL:
+                symbol, name = constants[code[ip]]
+                ip += 1
+                if symbol not in globals:
+                    raise VM.error(lines[ip - 1], f"Undefined variable: {name}")
+                globals[symbol] = stack[-1]
+            elif op == DEFINE_GLOBAL:
+                globals[constants[code[ip]][0]] = pop()
+                ip += 1
+            elif op == EQUAL:
+                b = pop()
+                stack[-1] = bool(stack[-1] == b)
+            elif op == NOT_EQUAL:
+                b = pop()
+                stack[-1] = bool(stack[-1] != b)
+            elif op == GREATER:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, NUMBER) and isinstance(b, NUMBER)):
+                    raise VM.operandError(lines[ip - 1], NUMBER)
+                stack[-1] = a > b
+            elif op == GREATER_EQUAL:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, NUMBER) and isinstance(b, NUMBER)):
+                    raise VM.operandError(lines[ip - 1], NUMBER)
+                stack[-1] = a >= b
+            elif op == LESS_EQUAL:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, NUMBER) and isinstance(b, NUMBER)):
+                    raise VM.operandError(lines[ip - 1], NUMBER)
+                stack[-1] = a <= b
+            elif op == MULTIPLY:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, NUMBER) and isinstance(b, NUMBER)):
+                    raise VM.operandError(lines[ip - 1], NUMBER)
+                stack[-1] = a * b
+            elif op == DIVIDE:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, NUMBER) and isinstance(b, NUMBER)):
+                    raise VM.operandError(lines[ip - 1], NUMBER)
+                stack[-1] = a / b
+            elif op == POWER:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, int) and isinstance(b, int)):
+                    raise VM.operandError(lines[ip - 1], INTEGER)
+                stack[-1] = a ** b
+            elif op == BIT_AND:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, int) and isinstance(b, int)):
+                    raise VM.operandError(lines[ip - 1], INTEGER)
+                stack[-1] = a & b
+            elif op == BIT_OR:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, int) and isinstance(b, int)):
+                    raise VM.operandError(lines[ip - 1], INTEGER)
+                stack[-1] = a | b
+            elif op == BIT_XOR:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, int) and isinstance(b, int)):
+                    raise VM.operandError(lines[ip - 1], INTEGER)
+                stack[-1] = a ^ b
+            elif op == SHIFT_LEFT:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, int) and isinstance(b, int)):
+                    raise VM.operandError(lines[ip - 1], INTEGER)
+                stack[-1] = a << b
+            elif op == SHIFT_RIGHT:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, int) and isinstance(b, int)):
+                    raise VM.operandError(lines[ip - 1], INTEGER)
+                stack[-1] = a >> b
+            elif op == NOT:
+                stack[-1] = not stack[-1]
+            elif op == NEGATE:
+                a = stack[-1]
+                if not isinstance(a, NUMBER):
+                    raise VM.operandError(lines[ip - 1], NUMBER)
+                stack[-1] = -a
+            elif op == PRINT:
+                self.interpreter.output.write(self.interpreter.stringify(pop()))
+            elif op == CLOSURE:
+                prototype: Prototype = constants[code[ip]]
+                ip += 1
+                upvalues: list[Upvalue] = []
+                for _ in range(prototype.upvalueCount):
+                    if code[ip]:
+                        upvalues.append(self.captureUpvalue(base + code[ip + 1]))
+                    else:
+                        upvalues.append(closure.upvalues[code[ip + 1]])
+                    ip += 2
+                push(Closure(self, prototype, upvalues))
+            elif op == CLOSE_UPVALUE:
+                self.closeUpvalues(len(stack) - 1)
+                pop()
+            elif op == GET_INDEX:
+                index: any = pop()
+                a = stack[-1]
+                if type(a) is LoxArray and type(index) is int and 0 <= index < len(a.items):
+                    stack[-1] = a.items[index]
+                else:
+                    try:
+                        stack[-1] = getIndex(a, index)
+                    except NativeError as error:
+                        raise VM.error(lines[ip - 1], error.message)
+            elif op == SET_INDEX:
+                b = pop()
+                index = pop()
+                try:
+                    stack[-1] = setIndex(stack[-1], index, b)
+                except NativeError as error:
+                    raise VM.error(lines[ip - 1], error.message)
+            elif op == ARRAY:
+                count: int = code[ip]
+                ip += 1
+                elements: list[any] = stack[len(stack) - count:]
+                del stack[len(stack) - count:]
+                push(LoxArray.of(elements))
+            elif op == MAP:
+                count = 2 * code[ip]
+                ip += 1
+                pairs: list[any] = stack[len(stack) - count:]
+                del stack[len(stack) - count:]
+                try:
+                    push(LoxMap.of(pairs))
+                except NativeError as error:
+                    raise VM.error(lines[ip - 1], error.message)
+            elif op == SET_PROPERTY:
+                name, cache = constants[code[ip]]
+                ip += 1
+                b = pop()
+                a = stack[-1]
+                if type(a) is LoxInstance and a.shape is cache.shape and cache.next is None:
+                    a.values[cache.slot] = b
+                else:
+                    try:
+                        setProperty(a, name, b, cache)
+                    except NativeError as error:
+                        raise VM.error(lines[ip - 1], error.message)
+                stack[-1] = b
+            elif op == GET_SUPER:
+                name = constants[code[ip]]
+                ip += 1
+                b = pop()
+                try:
+                    stack[-1] = superMethod(b, stack[-1], name)
+                except NativeError as error:
+                    raise VM.error(lines[ip - 1], error.message)
+            elif op == CLASS:
+                push(LoxClass(constants[code[ip]]))
+                ip += 1
+            elif op == INHERIT:
+                a = pop()
+                if type(stack[-1]) is not LoxClass:
+                    raise VM.error(lines[ip - 1], "Superclass must be a class")
+                a.inherit(stack[-1])
+            elif op == METHOD:
+                method = pop()
+                stack[-1].define(constants[code[ip]], method)
+                ip += 1
+            else:
+                raise Exception(f"Unreachable, opcode: {op}")
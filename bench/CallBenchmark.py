@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import argparse
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from Lox import Lox
+from Session import best, session
+
+ARITIES: tuple[int, ...] = (0, 1, 4, 16)
+
+def script(arity: int | None, calls: int) -> str:
+    """
+    Declares run(), a loop making calls of a function with arity parameters, or the same loop without
+    the call if arity is None
+    """
+    params: list[str] = [f"p{index}" for index in range(arity or 0)]
+    body: str = f"f({', '.join('i' for _ in params)});" if arity is not None else "i;"
+    return (
+        f"fun f({', '.join(params)}) {{ return nil; }}\n"
+        f"fun run() {{ for (var i = 0; i < {calls}; i = i + 1) {{ {body} }} }}\n"
+    )
+
+def time(engine: str, arity: int | None, calls: int, repeat: int) -> float:
+    # Only the calls of run() are timed, in a session which has already declared it
+    return best(session(engine, script(arity, calls)), "run();", repeat)
+
+def main(args) -> int:
+    engines: list[str] = args.engine or list(Lox.ENGINES)
+
+    print(f"Time per call of a function with N arguments over {args.calls} calls, best of {args.repeat}")
+    print(f"{'engine':>12}" + "".join(f"{f'N={arity}':>10}" for arity in ARITIES))
+    for engine in engines:
+        # The loop on its own is taken off, so only the call is left
+        loop: float = time(engine, None, args.calls, args.repeat)
+        times: list[float] = [(time(engine, arity, args.calls, args.repeat) - loop) / args.calls for arity in ARITIES]
+        print(f"{engine:>12}" + "".join(f"{cost * 1e9:>8.0f}ns" for cost in times))
+
+    return 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Measures the overhead of calling lox functions with 0, 1, 4 and 16 arguments")
+    ap.add_argument("--engine", action="append", choices=Lox.ENGINES, help="An engine to time, may be repeated (default: all of them)")
+    ap.add_argument("--calls", type=int, default=20000, help="Number of calls in each run")
+    ap.add_argument("--repeat", type=int, default=3, help="Number of timing runs for each engine")
+    args = ap.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import argparse
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from Lox import Lox
+from Session import best, session
+
+# The same operations on an instance and on a map standing in for one, as the body of the loop
+OPERATIONS: dict[str, dict[str, str]] = {
+    "get": {"class": "s = s + o.x;", "map": "s = s + o[\"x\"];"},
+    "set": {"class": "o.x = i;", "map": "o[\"x\"] = i;"},
+    "call": {"class": "s = s + o.get();", "map": "s = s + get(o);"},
+}
+
+SETUP: dict[str, str] = {
+    "class": (
+        "class Point {\n"
+        "    init(x, y) { this.x = x; this.y = y; }\n"
+        "    get() { return this.x; }\n"
+        "}\n"
+        "var o = Point(1, 2);\n"
+    ),
+    "map": (
+        "fun get(o) { return o[\"x\"]; }\n"
+        "var o = {\"x\": 1, \"y\": 2};\n"
+    ),
+}
+
+def script(layout: str, body: str, iterations: int) -> str:
+    """
+    Declares run(), a loop running body iterations times on an object with the given layout
+    """
+    return SETUP[layout] + f"fun run() {{ var s = 0; for (var i = 0; i < {iterations}; i = i + 1) {{ {body} }} }}\n"
+
+def time(engine: str, layout: str, body: str, iterations: int, repeat: int) -> float:
+    # Only the calls of run() are timed, in a session which has already declared it
+    return best(session(engine, script(layout, body, iterations)), "run();", repeat)
+
+def main(args) -> int:
+    engines: list[str] = args.engine or list(Lox.ENGINES)
+    columns: list[tuple[str, str]] = [(operation, layout) for operation in OPERATIONS for layout in SETUP]
+
+    print(f"Time per property access or method call of an instance, and the same on a map, over {args.iterations} iterations, best of {args.repeat}")
+    print(f"{'engine':>12}" + "".join(f"{f'{operation} {layout}':>12}" for operation, layout in columns))
+    for engine in engines:
+        # The loop on its own is taken off, so only the operation is left
+        loop: float = time(engine, "map", "i;", args.iterations, args.repeat)
+        times: list[float] = [
+            (time(engine, layout, OPERATIONS[operation][layout], args.iterations, args.repeat) - loop) / args.iterations
+            for operation, layout in columns
+        ]
+        print(f"{engine:>12}" + "".join(f"{cost * 1e9:>10.0f}ns" for cost in times))
+
+    return 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Measures property access and method calls on instances against a map based baseline")
+    ap.add_argument("--engine", action="append", choices=Lox.ENGINES, help="An engine to time, may be repeated (default: all of them)")
+    ap.add_argument("--iterations", type=int, default=20000, help="Number of operations in each run")
+    ap.add_argument("--repeat", type=int, default=3, help="Number of timing runs for each engine")
+    args = ap.parse_args()
+    sys.exit(main(args))
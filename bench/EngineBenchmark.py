@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import io
+import pathlib
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from Lox import Lox
+
+def run(engine: str, source: str) -> str:
+    """
+    Run source with a fresh Lox session and return what it printed
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        Lox(engine=engine).run(source)
+    return output.getvalue()
+
+def main(args) -> int:
+    source: str = pathlib.Path(args.file).read_text()
+    engines: list[str] = args.engine or list(Lox.ENGINES)
+
+    expected: str = run(engines[0], source)
+    for engine in engines[1:]:
+        if run(engine, source) != expected:
+            print(f"Output of {engine} differs from {engines[0]}!", file=sys.stderr)
+            return 1
+
+    print(f"Running {args.file}, best of {args.repeat}")
+    results: dict[str, float] = {}
+    for engine in engines:
+        timer = timeit.Timer(lambda: run(engine, source))
+        results[engine] = min(timer.repeat(repeat=args.repeat, number=1))
+        print(f"{engine:>12}: {results[engine]:.4f}s ({results[engines[0]] / results[engine]:.2f}x)")
+
+    return 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compares the execution engines on a lox script, the first engine is the baseline")
+    ap.add_argument("file", nargs="?", default=str(pathlib.Path(__file__).resolve().parent.parent / "test" / "fib.lox"), help="A lox script to run (default: test/fib.lox)")
+    ap.add_argument("--engine", action="append", choices=Lox.ENGINES, help="An engine to time, may be repeated (default: all of them)")
+    ap.add_argument("--repeat", type=int, default=3, help="Number of timing runs for each engine")
+    args = ap.parse_args()
+    sys.exit(main(args))
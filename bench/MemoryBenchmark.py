@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import argparse
+import pathlib
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from Environment import Environment
+from Lox import Lox
+from Session import run
+
+# Loops whose bodies are blocks, most of which declare nothing
+SCRIPT: str = """\
+fun work(n) {
+    var total = 0;
+    var phase = 0;
+    var i = 0;
+    while (i < n) {
+        if (phase == 0) {
+            total = total + i;
+        } else {
+            if (phase == 1) { total = total - 1; } else { { total = total + 2; } }
+        }
+        phase = phase == 2 ? 0 : phase + 1;
+        i = i + 1;
+    }
+    for (var j = 0; j < n; j = j + 1) {
+        var square = j * j;
+        { total = total + (square & 7); }
+    }
+    return total;
+}
+print work(10000);
+"""
+
+def countEnvironments(engine: str, source: str) -> int:
+    """
+    Run source counting the Environments made, the run is slower than usual because of the counting
+    """
+    count: int = 0
+    initialize = Environment.__init__
+
+    def counting(self, *args) -> None:
+        nonlocal count
+        count += 1
+        initialize(self, *args)
+
+    Environment.__init__ = counting
+    try:
+        run(engine, source)
+    finally:
+        Environment.__init__ = initialize
+    return count
+
+def peakMemory(engine: str, source: str) -> int:
+    """
+    Run source returning the peak of memory allocated while it ran
+    """
+    tracemalloc.start()
+    try:
+        run(engine, source)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main(args) -> int:
+    source: str = pathlib.Path(args.file).read_text() if args.file else SCRIPT
+    engines: list[str] = args.engine or ["tree", "stack", "closure"]
+
+    print(f"Running {args.file or 'the built in loop script'}, best of {args.repeat}")
+    print(f"{'engine':>12}  {'environments':>12}  {'peak memory':>12}  {'time':>8}")
+    for engine in engines:
+        environments: int = countEnvironments(engine, source)
+        peak: int = peakMemory(engine, source)
+        # Timed without tracing, which slows allocation down a lot
+        elapsed: float = min(timeit.Timer(lambda: run(engine, source)).repeat(repeat=args.repeat, number=1))
+        print(f"{engine:>12}  {environments:>12}  {peak / 1024:>9.1f}KiB  {elapsed:>7.4f}s")
+
+    return 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Counts the Environments the engines allocate running a loop heavy lox script, and their peak memory use")
+    ap.add_argument("file", nargs="?", help="A lox script to run (default: a built in loop script)")
+    ap.add_argument("--engine", action="append", choices=Lox.ENGINES, help="An engine to measure, may be repeated (default: tree, stack and closure)")
+    ap.add_argument("--repeat", type=int, default=3, help="Number of measured runs for each engine")
+    args = ap.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import pathlib
+import sys
+from typing import Callable
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from Lox import Lox
+from Output import FlushPolicy, MemoryOutput, Output
+from Session import best, session
+
+# Declares report(n), printing n lines of a few fields each
+SCRIPT: str = """\
+fun report(n) {
+    for (var i = 0; i < n; i = i + 1) {
+        print "row " + str(i) + ": " + str(i * 3) + " items, total " + str(i * 2.5);
+    }
+}
+"""
+
+def sinks(bufferSize: int) -> dict[str, Callable[[], Output]]:
+    """
+    Makers of the outputs to compare by name, the stream ones write to the null device
+    """
+    devnull = open(os.devnull, "w")
+    return {
+        "line": lambda: Output(devnull, policy=FlushPolicy.LINE),
+        "full": lambda: Output(devnull, bufferSize, FlushPolicy.FULL),
+        "memory": lambda: MemoryOutput(),
+    }
+
+def main(args) -> int:
+    engines: list[str] = args.engine or list(Lox.ENGINES)
+    outputs: dict[str, Callable[[], Output]] = sinks(args.buffer)
+
+    print(f"Printing {args.lines} lines, thousands of lines per second, best of {args.repeat}")
+    print(f"{'engine':>12}" + "".join(f"{name:>10}" for name in outputs))
+    for engine in engines:
+        rates: list[float] = []
+        for makeOutput in outputs.values():
+            # Only the report is timed, in a session printing to the output which has already declared it
+            elapsed: float = best(session(engine, SCRIPT, makeOutput()), f"report({args.lines});", args.repeat)
+            rates.append(args.lines / elapsed / 1000)
+        print(f"{engine:>12}" + "".join(f"{rate:>9.0f}k" for rate in rates))
+
+    return 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Measures the throughput of print heavy scripts with each flush policy and an in-memory output")
+    ap.add_argument("--engine", action="append", choices=Lox.ENGINES, help="An engine to time, may be repeated (default: all of them)")
+    ap.add_argument("--lines", type=int, default=50000, help="Number of lines the script prints")
+    ap.add_argument("--buffer", type=int, default=Output.BUFFER_SIZE, help="Buffer size of the full policy in characters (default: %(default)s)")
+    ap.add_argument("--repeat", type=int, default=3, help="Number of timing runs for each engine and output")
+    args = ap.parse_args()
+    sys.exit(main(args))
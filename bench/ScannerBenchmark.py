@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import argparse
+import pathlib
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from ErrorManager import ErrorManager
+from Scanner import Scanner
+from FastScanner import FastScanner
+
+SNIPPET: str = """\
+// Generated benchmark input
+fun fib(n) {
+    if (n <= 1) return n;
+    return fib(n-2) + fib(n-1);
+}
+
+/* Block comment
+   spanning lines */
+var total = 0x12 + 0b101 + 0o17;
+for (var i = 0; i < 100; i = i + 1) {
+    total = total + i * 2.5 - (total >> 1) ** 2;
+    if (total >= 1000 and i != 3 or !false) print "total: " + str(total);
+}
+var ternary = total == 0 ? "zero" : total < 0 ? "negative" : "positive";
+"""
+
+def makeSource(size: int) -> str:
+    return SNIPPET * max(1, size // len(SNIPPET))
+
+def tokenStream(scanner: Scanner) -> list[tuple]:
+    return [(t.type, t.lexeme, t.literal, t.line) for t in scanner.scanTokens()]
+
+def main(args) -> int:
+    source: str = makeSource(args.size)
+    if args.file:
+        source = pathlib.Path(args.file).read_text()
+
+    errorManager = ErrorManager()
+    if tokenStream(Scanner(errorManager, source)) != tokenStream(FastScanner(errorManager, source)):
+        print("Token streams differ!", file=sys.stderr)
+        return 1
+
+    print(f"Scanning {len(source)} characters, best of {args.repeat}")
+    results: dict[str, float] = {}
+    for scanner in (Scanner, FastScanner):
+        timer = timeit.Timer(lambda: scanner(errorManager, source).scanTokens())
+        results[scanner.__name__] = min(timer.repeat(repeat=args.repeat, number=1))
+        print(f"{scanner.__name__:>12}: {results[scanner.__name__]:.4f}s")
+
+    print(f"{'speedup':>12}: {results['Scanner'] / results['FastScanner']:.2f}x")
+    return 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compares the character at a time Scanner with the FastScanner")
+    ap.add_argument("file", nargs="?", help="A lox script to scan instead of the generated input")
+    ap.add_argument("--size", type=int, default=2_000_000, help="Approximate size of the generated input in characters")
+    ap.add_argument("--repeat", type=int, default=3, help="Number of timing runs for each scanner")
+    args = ap.parse_args()
+    sys.exit(main(args))
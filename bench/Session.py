@@ -0,0 +1,37 @@
+import timeit
+
+import Stmt
+from FastScanner import FastScanner
+from Lox import Lox
+from Output import MemoryOutput, Output
+
+def check(lox: Lox) -> None:
+    if lox.errorManager.hadError:
+        raise SystemExit(f"The script failed on {type(lox.engine).__name__}")
+
+def session(engine: str, setup: str = "", output: Output | None = None) -> Lox:
+    """
+    A fresh Lox session which has run setup, failing if it reports an error. What is printed goes to
+    output, or is kept in memory.
+    """
+    lox: Lox = Lox(engine=engine, output=output if output is not None else MemoryOutput())
+    lox.run(setup)
+    check(lox)
+    return lox
+
+def run(engine: str, source: str, output: Output | None = None) -> None:
+    """
+    Run source with a fresh Lox session, from scanning it to executing it
+    """
+    session(engine, source, output)
+
+def best(lox: Lox, source: str, repeat: int) -> float:
+    """
+    Best time of running source in the session. It is compiled once up front, so only executing it
+    is timed and not scanning, parsing, resolving or the engine's own compiling of the setup.
+    """
+    statements: list[Stmt.Stmt] | None = lox.compile(FastScanner(lox.errorManager, source, lox.symbols).scanTokenBuffer())
+    check(lox)
+    time: float = min(timeit.Timer(lambda: lox.execute(statements)).repeat(repeat=repeat, number=1))
+    check(lox)
+    return time
@@ -40,14 +40,22 @@ def main(args) -> int:
     defineAst(args.output_dir, "Expr",
        "from Token import Token",
         [
+            ["Array",    "bracket: Token", "elements: list[Expr]"],
             ["Assign",   "name: Token", "value: Expr"],
             ["Binary",   "left: Expr", "operator: Token", "right: Expr"],
             ["Call",     "callee: Expr", "paren: Token", "arguments: list[Expr]"],
+            ["Get",      "object: Expr", "name: Token"],
             ["Grouping", "expression: Expr"],
+            ["Index",    "object: Expr", "bracket: Token", "index: Expr"],
             ["Literal",  "value: any"],
             ["Logical",  "left: Expr", "operator: Token", "right: Expr"],
+            ["Map",      "brace: Token", "keys: list[Expr]", "values: list[Expr]"],
+            ["Set",      "object: Expr", "name: Token", "value: Expr"],
+            ["SetIndex", "object: Expr", "bracket: Token", "index: Expr", "value: Expr"],
             ["String",   "value: str"],
+            ["Super",    "keyword: Token", "method: Token", "receiver: Expr"],
             ["Ternary",  "condition: Expr", "trueExpr: Expr", "falseExpr: Expr"],
+            ["This",     "keyword: Token"],
             ["Unary",    "operator: Token", "right: Expr"],
             ["Variable", "name: Token"],
         ]
@@ -55,14 +63,17 @@ def main(args) -> int:
 
     # Create the AST classes for statements
     defineAst(args.output_dir, "Stmt",
+        # Class refers to Function, which is defined after it
+        "from __future__ import annotations\n"+
         "from Token import Token\n"+
         "from Expr import *",
         [
             ["Block",      "statements: list[Stmt]"],
+            ["Class",      "name: Token", "superclass: Variable", "methods: list[Function]"],
             ["Control",    "control: Token"],
             ["Expression", "expression: Expr"],
             ["For",        "condition: Expr", "initializer: Stmt", "increment: Stmt", "body: Stmt"],
-            ["Function",   "name: Token", "params: list[Token]", "body: list[Stmt]"],
+            ["Function",   "name: Token", "params: list[Token]", "body: list[Stmt]", "annotations: list[Token]"],
             ["If",         "condition: Expr", "thenBranch: Stmt", "elseBranch: Stmt"],
             ["Print",      "expression: Expr"],
             ["Return",     "keyword: Token", "value: Expr"],